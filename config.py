@@ -1,43 +1,69 @@
 # config.py
 import os
-from dotenv import load_dotenv
 
-# プロジェクトのルートディレクトリにある .env ファイルを読み込む
-load_dotenv()
+# プロジェクトのルートディレクトリにある .env ファイル
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
 
 # --- API Keys (必須) ---
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-X_API_KEY = os.getenv("X_API_KEY")
-X_API_SECRET = os.getenv("X_API_SECRET")
-X_ACCESS_TOKEN = os.getenv("X_ACCESS_TOKEN")
-X_ACCESS_TOKEN_SECRET = os.getenv("X_ACCESS_TOKEN_SECRET")
+GEMINI_KEYS = ["GEMINI_API_KEY"]
+X_KEYS = ["X_API_KEY", "X_API_SECRET", "X_ACCESS_TOKEN", "X_ACCESS_TOKEN_SECRET"]
 
 # --- File Paths (任意、デフォルト値あり) ---
-KNOWLEDGE_BASE_DIR = os.getenv("KNOWLEDGE_BASE_DIR", "knowledge_base")
-CLUSTERS_FILE = os.getenv("CLUSTERS_FILE", "data/clusters.json")
-POST_HISTORY_FILE = os.getenv("POST_HISTORY_FILE", "data/post_history.json")
+DEFAULTS = {
+    "KNOWLEDGE_BASE_DIR": "knowledge_base",
+    "CLUSTERS_FILE": "data/clusters.json",
+    "POST_HISTORY_FILE": "data/post_history.json",
+}
+
+_env_loaded = False
+
+
+def load_env() -> None:
+    """
+    .env ファイルがあれば環境変数に読み込む（2回目以降は何もしない）。
+    python-dotenv の読み込みにも時間がかかるため、.env がない環境（GitHub Actionsなど）では読み込まない。
+    """
+    global _env_loaded
+    if _env_loaded:
+        return
+    _env_loaded = True
+    if os.path.exists(ENV_PATH):
+        from dotenv import load_dotenv
+        load_dotenv(ENV_PATH)
+
+
+def __getattr__(name: str):
+    """
+    設定値（config.GEMINI_API_KEY など）は、参照されたときに環境変数から読む。
+    import しただけでは .env の読み込みもキーの検証も行わない。
+    """
+    if name in GEMINI_KEYS or name in X_KEYS or name in DEFAULTS:
+        load_env()
+        return os.getenv(name, DEFAULTS.get(name))
+    raise AttributeError(f"module 'config' has no attribute '{name}'")
+
 
 # --- Validation (推奨) ---
-# 必須のキーが存在するかチェックし、なければエラーを発生させる
-required_keys = [
-    "GEMINI_API_KEY",
-]
-missing_keys = [key for key in required_keys if not globals()[key]]
-if missing_keys:
-    raise ValueError(f"Missing required environment variables in .env file: {', '.join(missing_keys)}")
-
-# X関連のキーが一部でも設定されている場合は、すべて設定されているか確認する
-x_key_map = {
-    "X_API_KEY": X_API_KEY,
-    "X_API_SECRET": X_API_SECRET,
-    "X_ACCESS_TOKEN": X_ACCESS_TOKEN,
-    "X_ACCESS_TOKEN_SECRET": X_ACCESS_TOKEN_SECRET,
-}
+def validate_gemini() -> None:
+    """必須のキーが存在するかチェックし、なければエラーを発生させる（Geminiを呼び出す直前に実行する）"""
+    load_env()
+    missing_keys = [key for key in GEMINI_KEYS if not os.getenv(key)]
+    if missing_keys:
+        raise ValueError(f"Missing required environment variables in .env file: {', '.join(missing_keys)}")
+
+
+def validate_x() -> None:
+    """X関連のキーが一部でも設定されている場合は、すべて設定されているか確認する（Xに接続する直前に実行する）"""
+    load_env()
+    missing_x_keys = [key for key in X_KEYS if not os.getenv(key)]
+    if missing_x_keys and len(missing_x_keys) < len(X_KEYS):
+        raise ValueError(
+            "Some X API keys are set, but not all. "
+            f"Please set all X keys or none of them. Missing: {', '.join(missing_x_keys)}"
+        )
+
 
-x_key_values = x_key_map.values()
-if any(x_key_values) and not all(x_key_values):
-    missing_x_keys = [key for key, value in x_key_map.items() if not value]
-    raise ValueError(
-        "Some X API keys are set, but not all. "
-        f"Please set all X keys or none of them. Missing: {', '.join(missing_x_keys)}"
-    )
+def validate() -> None:
+    """すべてのキーをまとめて検証する"""
+    validate_gemini()
+    validate_x()
@@ -0,0 +1,146 @@
+# src/async_pipeline.py
+import asyncio
+import time
+import threading
+import contextvars
+
+from src import tracing, deadline
+
+
+class StageError(Exception):
+    """パイプラインのステージが失敗（またはタイムアウト）したことを表す例外。"""
+
+    def __init__(self, stage_name: str, cause: BaseException):
+        self.stage_name = stage_name
+        self.cause = cause
+        super().__init__(f"ステージ '{stage_name}' が失敗しました: {cause!r}")
+
+
+class Stage:
+    """
+    パイプラインの1ステージ。
+    func: 依存ステージの結果を deps の順に位置引数として受け取る関数（同期関数はスレッドで実行する）
+    deps: 依存するステージ名のリスト
+    timeout: このステージの制限時間（秒）。Noneなら無制限。制限時間を過ぎると結果を待たずに StageError とし、
+             ステージの中のLLM呼び出し・ファイルの書き込み（llm_gateway / atomic_io）も deadline によって打ち切られる
+    checkpoint: Trueの場合、run_dag に CheckpointStore が渡されていれば結果を入力のハッシュとともに保存し、
+                入力が同じ次回の実行ではステージを実行せずに保存した結果を使う
+    """
+
+    def __init__(self, name: str, func, deps: list[str] | tuple = (), timeout: float | None = None,
+                 checkpoint: bool = False):
+        self.name = name
+        self.func = func
+        self.deps = list(deps)
+        self.timeout = timeout
+        self.checkpoint = checkpoint
+
+
+def _run_in_thread(func, *args) -> asyncio.Future:
+    """
+    同期関数をデーモンスレッドで実行し、結果を待つ Future を返す。
+    asyncio.to_thread と違い、制限時間を過ぎて待つのをやめたスレッドの終了を、asyncio.run やプロセスの終了が待たない。
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    context = contextvars.copy_context()
+
+    def set_result(setter, value):
+        if not future.done():
+            setter(value)
+
+    def worker():
+        try:
+            result = context.run(func, *args)
+        except BaseException as e:
+            callback, value = future.set_exception, e
+        else:
+            callback, value = future.set_result, result
+        try:
+            loop.call_soon_threadsafe(set_result, callback, value)
+        except RuntimeError:
+            pass # 待つのをやめた後にイベントループが閉じられている
+
+    threading.Thread(target=worker, daemon=True).start()
+    return future
+
+
+def _validate(stages: list[Stage]) -> None:
+    """ステージ名の重複・未定義の依存・循環依存がないか確認する。"""
+    names = [s.name for s in stages]
+    if len(names) != len(set(names)):
+        raise ValueError(f"ステージ名が重複しています: {names}")
+    by_name = {s.name: s for s in stages}
+    for stage in stages:
+        for dep in stage.deps:
+            if dep not in by_name:
+                raise ValueError(f"ステージ '{stage.name}' の依存先 '{dep}' が定義されていません。")
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"ステージ '{name}' に循環依存があります。")
+        visiting.add(name)
+        for dep in by_name[name].deps:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for name in names:
+        visit(name)
+
+
+async def run_dag(stages: list[Stage], checkpoints=None) -> dict:
+    """
+    依存関係（DAG）に従ってステージを実行し、{ステージ名: 結果} を返す。
+    依存関係のないステージは同時に実行する。いずれかが失敗すると残りを取り消して StageError を送出する。
+    checkpoints: checkpoint.CheckpointStore。checkpoint=True のステージの結果を保存し、前回の実行から再開する
+    """
+    _validate(stages)
+    tasks: dict[str, asyncio.Task] = {}
+    timings: dict[str, float] = {}
+
+    async def run_stage(stage: Stage):
+        dep_results = [await tasks[dep] for dep in stage.deps]
+        input_hash = None
+        if stage.checkpoint and checkpoints is not None:
+            input_hash = checkpoints.input_hash(stage.name, dep_results)
+            saved = checkpoints.load(stage.name, input_hash)
+            if saved is not None:
+                print(f"[パイプライン] {stage.name} は前回の結果を再利用します（チェックポイント）")
+                return saved
+        start = time.perf_counter()
+        try:
+            # 関数の中のスパン（LLM呼び出しなど）は、このステージのスパンの子として記録される
+            with tracing.span("stage", stage=stage.name), deadline.scope(stage.timeout):
+                if asyncio.iscoroutinefunction(stage.func):
+                    call = stage.func(*dep_results)
+                else:
+                    call = _run_in_thread(stage.func, *dep_results)
+                result = await asyncio.wait_for(call, stage.timeout)
+        except (asyncio.TimeoutError, deadline.DeadlineExceeded) as e:
+            raise StageError(stage.name, TimeoutError(f"{stage.timeout}秒以内に完了しませんでした")) from e
+        except StageError:
+            raise
+        except Exception as e:
+            raise StageError(stage.name, e) from e
+        timings[stage.name] = time.perf_counter() - start
+        print(f"[パイプライン] {stage.name} 完了 ({timings[stage.name]:.2f}秒)")
+        if input_hash is not None:
+            checkpoints.save(stage.name, input_hash, result)
+        return result
+
+    # 依存先のタスクを先に作れるよう、名前の解決は run_stage 内の await で行う
+    for stage in stages:
+        tasks[stage.name] = asyncio.create_task(run_stage(stage))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        # 最初に失敗したステージの例外をそのまま送出し、残りのステージは取り消す
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
+    return {name: task.result() for name, task in tasks.items()}
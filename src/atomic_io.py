@@ -0,0 +1,166 @@
+# src/atomic_io.py
+import os
+import json
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from src import tracing, deadline
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# 一時ファイルの権限（mkstempは0600で作るため、通常のファイルと同じ権限に揃える）
+_umask = os.umask(0)
+os.umask(_umask)
+DEFAULT_MODE = 0o666 & ~_umask
+
+# 同じプロセス内のスレッドどうしの排他（flockはプロセス単位のロックのため、スレッド間では別に排他する）
+_thread_locks: dict[str, threading.RLock] = {}
+_thread_locks_guard = threading.Lock()
+# このスレッドが既にロックを持っているファイル（同じファイルへのflockを入れ子で取ると自分自身を待ってしまうため）
+_held = threading.local()
+
+
+class CorruptFileError(ValueError):
+    """JSONファイルが壊れていて読み込めないことを表す。壊れたファイルを空のデータで上書きしないよう、処理を止める。"""
+
+    def __init__(self, path: str, cause: Exception):
+        self.path = path
+        super().__init__(f"{path} が壊れているため読み込めません（{cause}）。gitの履歴などから復元してください。")
+
+
+def _thread_lock(path: str) -> threading.RLock:
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(os.path.abspath(path), threading.RLock())
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    path に対する排他ロック（path + ".lock" を使う）。他のプロセス・スレッドが同じファイルを
+    読み書きしている間は待つ。読み込み→変更→書き込みの一連の処理を、このロックの中で行う。
+    """
+    key = os.path.abspath(path)
+    held = _held.__dict__.setdefault("paths", set())
+    if key in held:
+        yield
+        return
+    with _thread_lock(path):
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        held.add(key)
+        try:
+            with _flock(path + ".lock"):
+                yield
+        finally:
+            held.discard(key)
+
+
+@contextmanager
+def _flock(lock_path: str):
+    """ロックファイルに対するOSのファイルロック（他のプロセスとの排他）。"""
+    with open(lock_path, "a+b") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _fsync_dir(directory: str) -> None:
+    """置き換え（rename）自体をディスクに反映させる（ディレクトリをfsyncできないOSでは何もしない）。"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_open(path: str, mode: str = "w", encoding: str = "utf-8"):
+    """
+    同じディレクトリの一時ファイルに書き込み、fsyncしてから path に置き換える。
+    書き込み中にプロセスが中断されても、path には書き込み前か書き込み後の内容しか残らない。
+    一時ファイル名は書き込みごとに異なるため、複数の書き込みが同時に行われても一時ファイルを共有しない。
+    制限時間を過ぎたステージの中では（deadline）、置き換えずに DeadlineExceeded を送出する。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with tracing.span("store_write", file=os.path.basename(path)) as s:
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            os.chmod(tmp_path, DEFAULT_MODE)
+            with os.fdopen(fd, mode, encoding=None if "b" in mode else encoding) as f:
+                yield f
+                f.flush()
+                os.fsync(f.fileno())
+                s.set(bytes=os.fstat(f.fileno()).st_size)
+            # 待つのをやめた（タイムアウトした）ステージが、後から出力ファイルを書き換えないようにする
+            deadline.check(f"{os.path.basename(path)} の書き込み")
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        _fsync_dir(directory)
+
+
+def write_text(path: str, text: str) -> None:
+    with atomic_open(path) as f:
+        f.write(text)
+
+
+def write_json(path: str, data, indent: int | None = 2) -> None:
+    with atomic_open(path) as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+
+
+def append_lines(path: str, lines: list[str]) -> None:
+    """
+    行をまとめて追記する（1回のwrite + fsync）。ロックの中で書き込むため、
+    複数のプロセスが同時に追記しても行が混ざらず、ファイル全体を読み直す必要もない。
+    """
+    if not lines:
+        return
+    deadline.check(f"{os.path.basename(path)} への追記")
+    payload = "".join(line if line.endswith("\n") else line + "\n" for line in lines)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with tracing.span("store_append", file=os.path.basename(path), items=len(lines)) as s, file_lock(path):
+        s.set(bytes=len(payload.encode('utf-8')))
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def read_json(path: str, default=None):
+    """
+    JSONファイルを読み込む。ファイルがなければ default を返す。
+    壊れている場合は空のデータとして扱わず（次の書き込みで履歴が失われるため）、CorruptFileError を送出する。
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise CorruptFileError(path, e) from e
@@ -0,0 +1,55 @@
+# src/checkpoint.py
+import os
+import json
+import hashlib
+from datetime import datetime
+from src import atomic_io
+
+
+class CheckpointStore:
+    """
+    パイプラインのステージの結果を、入力（依存ステージの結果）のハッシュとともに保存するストア。
+    checkpoint_dir/<ステージ名>.json に1ステージ1ファイルで保存し、入力が同じであれば次回の実行で結果を再利用する。
+    途中のステージで失敗しても、次回は失敗したステージから再開できる（成功済みのLLM呼び出しをやり直さない）。
+    結果はJSONとして保存できる値（文字列・辞書・リスト）に限る。
+    """
+
+    def __init__(self, checkpoint_dir: str):
+        self.checkpoint_dir = checkpoint_dir
+
+    def _path(self, stage_name: str) -> str:
+        return os.path.join(self.checkpoint_dir, f"{stage_name}.json")
+
+    @staticmethod
+    def input_hash(stage_name: str, inputs: list) -> str:
+        material = json.dumps([stage_name, inputs], ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def load(self, stage_name: str, input_hash: str):
+        """入力のハッシュが一致するチェックポイントがあれば結果を返す（なければNone）。"""
+        try:
+            with open(self._path(stage_name), 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if record.get("input_hash") != input_hash:
+            return None
+        return record.get("result")
+
+    def save(self, stage_name: str, input_hash: str, result) -> None:
+        """結果を一時ファイルに書き出してから置き換える（書き込み中に中断されても壊れたファイルを残さない）。"""
+        if result is None:
+            return
+        atomic_io.write_json(self._path(stage_name), {"stage": stage_name, "input_hash": input_hash,
+                                                      "saved_at": datetime.now().isoformat(), "result": result})
+
+    def clear(self) -> int:
+        """すべてのチェックポイントを削除し、削除した件数を返す（サイクルが最後まで完了したときに呼ぶ）。"""
+        if not os.path.isdir(self.checkpoint_dir):
+            return 0
+        removed = 0
+        for name in os.listdir(self.checkpoint_dir):
+            if name.endswith(".json"):
+                os.remove(os.path.join(self.checkpoint_dir, name))
+                removed += 1
+        return removed
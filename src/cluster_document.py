@@ -1,37 +1,36 @@
 # src/cluster_document.py
 import os
+import re
 import json
-from docx import Document
-from google import genai
 import sys
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-import config
+from src import llm_gateway, token_budget, docx_cache, structured_output, atomic_io
+
+CLUSTER_COUNT = int(os.getenv("CLUSTER_COUNT", "5")) # 最終的に出力するクラスター数
+CLUSTER_WORKERS = int(os.getenv("CLUSTER_WORKERS", "4")) # チャンクを並列にクラスタリングするスレッド数
 
 def read_text_from_docx(file_path: str) -> str:
-    """docxファイルから全てのテキストを抽出し、一つの文字列として結合して返す。"""
+    """docxファイルから全てのテキスト（表・テキストボックスを含む）を抽出し、一つの文字列として結合して返す。"""
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"エラー: ファイルが見つかりません - {file_path}")
     
     try:
-        document = Document(file_path)
-        full_text = "\n".join([para.text for para in document.paragraphs if para.text.strip()])
+        # 解析結果はファイルのハッシュをキーにキャッシュされ、2回目以降はzip/XMLを解析しない
+        full_text = docx_cache.read_text(file_path)
         if not full_text:
             print("警告: ドキュメント内にテキストを含む段落が見つかりませんでした。")
         return full_text
     except Exception as e:
         raise IOError(f"ファイルの読み込み中にエラーが発生しました: {e}")
 
-def get_clustered_json_from_gemini(text: str) -> str:
-    """与えられたテキストをGemini APIを使ってクラスタリングし、結果をJSON形式の文字列で返す。"""
-    api_key = config.GEMINI_API_KEY
-    if not api_key:
-        raise ValueError("環境変数にGEMINI_API_KEYが設定されていません。")
-    client = genai.Client(api_key=api_key)
-
+def _cluster_prompt(text: str, n_clusters: int) -> str:
+    """テキストをn_clusters個のクラスターに分類させるプロンプトを組み立てる。"""
     # Geminiへの指示をJSON形式での出力を要求するように変更
-    prompt = f"""
-    以下のテキストを分析し、主要なトピックやテーマで5つのクラスターに分類してください。
+    return f"""
+    以下のテキストを分析し、主要なトピックやテーマで{n_clusters}つのクラスターに分類してください。
     各クラスターについて、テーマ名、要約、キーワードを抽出し、必ず以下のJSON形式で出力してください。
 
     ```json
@@ -48,43 +47,96 @@ def get_clustered_json_from_gemini(text: str) -> str:
           "theme": "テーマ名2",
           "summary": "要約2",
           "keywords": ["キーワード3", "キーワード4"]
-        }},
-        {{
-          "cluster_id": 3,
-          "theme": "テーマ名3",
-          "summary": "要約3",
-          "keywords": ["キーワード5", "キーワード6"]
-        }},
-        {{
-          "cluster_id": 4,
-          "theme": "テーマ名4",
-          "summary": "要約4",
-          "keywords": ["キーワード7", "キーワード8"]
-        }},
-        {{
-          "cluster_id": 5,
-          "theme": "テーマ名5",
-          "summary": "要約5",
-          "keywords": ["キーワード9", "キーワード10"]
         }}
       ]
     }}
     ```
+    （上記は2つの場合の例です。必ず{n_clusters}つのクラスターを出力してください）
 
     --- テキスト本文 ---
     {text}
     """
 
-    print("\nGeminiによるクラスタリングを開始します...")
+def _generate_clusters(prompt: str, call_site: str) -> list[dict]:
+    """プロンプトを送信し、応答（JSON）からクラスターのリストを取り出す。"""
     try:
-        response = client.models.generate_content(
-            model="gemini-2.0-flash",  # gemini-2.0 シリーズ
-            contents=prompt,
-        )
-        return response.text
+        # モデルは call_site に応じて model_router が選ぶ（cluster: standard / cluster_reduce: fast）
+        return llm_gateway.generate_json(prompt, call_site=call_site)["clusters"]
+    except ValueError:
+        raise
     except Exception as e:
         raise ConnectionError(f"Gemini APIとの通信中にエラーが発生しました: {e}")
 
+def parse_clusters(json_text: str) -> list[dict]:
+    """Geminiの出力（```json ... ``` 形式や前後の説明文を含む）からクラスターのリストを取り出す。"""
+    return structured_output.parse(json_text, "cluster")["clusters"]
+
+def _normalize_theme(theme: str) -> str:
+    """重複判定用に、テーマ名の表記ゆれ（全角/半角・空白・記号）を取り除く。"""
+    normalized = unicodedata.normalize("NFKC", theme or "").lower()
+    return re.sub(r"[\s・、。,.「」『』()（）:：/／-]", "", normalized)
+
+def dedupe_clusters(clusters: list[dict]) -> list[dict]:
+    """
+    テーマ名が同じ（表記ゆれを除く）クラスターを1つにまとめる。
+    キーワードは出現順を保って統合し、要約は長い方を残す。
+    """
+    merged: dict[str, dict] = {}
+    for cluster in clusters:
+        key = _normalize_theme(cluster.get("theme", ""))
+        if key not in merged:
+            merged[key] = {"theme": cluster.get("theme", ""), "summary": cluster.get("summary", ""),
+                           "keywords": list(cluster.get("keywords", []))}
+            continue
+        target = merged[key]
+        target["keywords"] += [k for k in cluster.get("keywords", []) if k not in target["keywords"]]
+        if len(cluster.get("summary", "")) > len(target["summary"]):
+            target["summary"] = cluster["summary"]
+    return list(merged.values())
+
+def _renumber(clusters: list[dict]) -> dict:
+    return {"clusters": [{"cluster_id": i, **{k: v for k, v in c.items() if k != "cluster_id"}}
+                         for i, c in enumerate(clusters, start=1)]}
+
+def _reduce_clusters(clusters: list[dict], n_clusters: int) -> list[dict]:
+    """【reduce】部分ごとのクラスターを、意味の近いものどうし統合してn_clusters個にまとめる。"""
+    partial = json.dumps({"clusters": clusters}, ensure_ascii=False)
+    prompt = f"""
+    以下は、長いテキストを分割してそれぞれクラスタリングした結果です。
+    意味の近いクラスターどうしを統合し、テキスト全体を代表する{n_clusters}つのクラスターにまとめてください。
+    統合したクラスターのキーワードは重要なものを残し、要約は統合後の内容を表すように書き直してください。
+    出力は入力と同じJSON形式（"clusters" のリスト）で、必ず{n_clusters}つのクラスターを出力してください。
+
+    --- 部分ごとのクラスター ---
+    {token_budget.fit_text(partial, "cluster_reduce")}
+    """
+    print(f"{len(clusters)}個の部分クラスターを{n_clusters}個に統合しています...")
+    return _generate_clusters(prompt, "cluster_reduce")
+
+def cluster_text(text: str, n_clusters: int = CLUSTER_COUNT, max_workers: int = CLUSTER_WORKERS) -> dict:
+    """
+    テキストをmap-reduce方式でクラスタリングし、{"clusters": [...]} 形式の辞書を返す。
+    1. トークン予算（token_budget の "cluster"）に収まるチャンクに分割する
+    2. 【map】各チャンクを並列（スレッド）でクラスタリングする
+    3. 【reduce】テーマ名の重複をまとめ、まだ多ければGeminiで n_clusters 個に統合する
+    テキストが1チャンクに収まる場合は、1回の呼び出しで済ませる。
+    """
+    chunks = token_budget.apply_budget(text, "cluster")
+    print(f"\nGeminiによるクラスタリングを開始します...（{len(chunks)}チャンク）")
+    if len(chunks) == 1:
+        return _renumber(_generate_clusters(_cluster_prompt(chunks[0], n_clusters), "cluster"))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(lambda chunk: _generate_clusters(_cluster_prompt(chunk, n_clusters), "cluster"), chunks))
+    partial = dedupe_clusters([c for clusters in results for c in clusters])
+    if len(partial) > n_clusters:
+        partial = dedupe_clusters(_reduce_clusters(partial, n_clusters))
+    return _renumber(partial[:n_clusters])
+
+def get_clustered_json_from_gemini(text: str, n_clusters: int = CLUSTER_COUNT) -> str:
+    """与えられたテキストをGemini APIを使ってクラスタリングし、結果をJSON形式の文字列で返す。"""
+    return json.dumps(cluster_text(text, n_clusters), ensure_ascii=False)
+
 if __name__ == "__main__":
     # 入力ファイルと出力ファイルのパスを定義
     INPUT_DOCX_PATH = "./data/knowledge_base/161217-master-Ryo.docx"
@@ -95,20 +147,12 @@ if __name__ == "__main__":
         document_text = read_text_from_docx(INPUT_DOCX_PATH)
         
         if document_text:
-            # 2. Geminiでクラスタリングし、JSON形式のテキストを取得
-            json_output_text = get_clustered_json_from_gemini(document_text)
-            
-            # 3. Geminiの出力からJSON部分を抽出
-            #    (```json ... ``` のようなマークダウン形式で返されることがあるため)
-            json_str = json_output_text.strip().lstrip("```json").rstrip("```")
-            
-            # 4. JSON文字列をPythonの辞書オブジェクトにパース
-            data = json.loads(json_str)
+            # 2. Geminiでクラスタリングする（応答のJSONは llm_gateway.generate_json で検証済み）
+            data = cluster_text(document_text)
 
-            # 5. 辞書オブジェクトをJSONファイルに保存
-            with open(OUTPUT_JSON_PATH, 'w', encoding='utf-8') as f:
-                # indent=2 で見やすく整形し、ensure_ascii=False で日本語の文字化けを防ぐ
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            # 3. 辞書オブジェクトをJSONファイルに保存
+            # indent=2 で見やすく整形し、ensure_ascii=False で日本語の文字化けを防ぐ
+            atomic_io.write_json(OUTPUT_JSON_PATH, data)
             
             print(f"\nクラスタリング結果を {OUTPUT_JSON_PATH} に保存しました。")
 
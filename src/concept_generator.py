@@ -1,31 +1,43 @@
 # src/concept_generator.py
 import os
 import json
-from dotenv import load_dotenv
-from google import genai
-import config
-
-def _call_gemini(prompt: str) -> str | None:
-    """Gemini APIを呼び出し、テキストを生成する共通関数 (research_topic.py方式)"""
-    api_key = config.GEMINI_API_KEY
-    if not api_key:
-        print("環境変数にGEMINI_API_KEYが設定されていません。")
+from datetime import datetime
+from src import knowledge_store, llm_gateway, token_budget, structured_output, atomic_io
+
+# --- 差分概念化の設定 ---
+# 要約とJSON変換の方式。single: 1回の呼び出しで両方を生成する（検証に失敗した場合だけ2回に分ける） / two_call: 常に2回に分ける
+SUMMARY_MODE = os.getenv("CONCEPT_SUMMARY_MODE", "single")
+INCREMENTAL_CHUNK_SIZE = 10 # 1回の要点抽出で扱うエントリ数
+MAX_FOLD_NOTES_CHARS = 4000 # 1回の統合で概念に取り込む要点メモの最大文字数
+
+def _call_gemini(prompt: str, call_site: str = "concept") -> str | None:
+    """Gemini APIを呼び出し、テキストを生成する共通関数（共有クライアントを利用）"""
+    try:
+        return llm_gateway.generate(prompt, call_site=call_site)
+    except ValueError as e:
+        print(e)
+        return None
+    except Exception as e:
+        print(f"Gemini APIとの通信中にエラーが発生しました: {e}")
         return None
-    client = genai.Client(api_key=api_key)
-    # Gemini-proモデルでチャットを作成し、プロンプトを送信
+
+def _call_gemini_json(prompt: str, call_site: str) -> dict | None:
+    """Gemini APIを呼び出し、応答を call_site のスキーマに従うJSONとして返す共通関数（失敗時はNone）"""
     try:
-        model = client.chats.create(model='gemini-2.0-flash-exp')
-        response = model.send_message(prompt)
-        return response.text
+        return llm_gateway.generate_json(prompt, call_site=call_site)
+    except structured_output.ParseError as e:
+        print(f"エラー: Geminiからの出力が有効なJSON形式ではありません。{e}")
+        return None
+    except ValueError as e:
+        print(e)
+        return None
     except Exception as e:
         print(f"Gemini APIとの通信中にエラーが発生しました: {e}")
         return None
 
-def create_summary_document(knowledge_text: str) -> str | None:
-    """
-    ツイート群から論文形式の要約テキストを生成（背景・目的・方法・結果・課題のフレームワーク）
-    """
-    prompt = f"""あなたは、複数の調査レポートから本質的な洞察を抽出し、学術的な視点で一つの概念を構築する優れた研究者です。
+def _summary_prompt(knowledge_text: str) -> str:
+    """論文形式の要約（背景・目的・方法・結果・課題のフレームワーク）を依頼するプロンプト"""
+    return f"""あなたは、複数の調査レポートから本質的な洞察を抽出し、学術的な視点で一つの概念を構築する優れた研究者です。
 
 以下の複数のレポート群（日々の調査記録）を横断的に分析し、これら全てに共通する中心的な概念を見つけ出してください。
 その概念について、**研究報告書の形式**で、必ず以下の構成で詳細に記述してください。
@@ -54,8 +66,14 @@ def create_summary_document(knowledge_text: str) -> str | None:
 【分析対象のレポート群】
 {knowledge_text}
 """
+
+def create_summary_document(knowledge_text: str) -> str | None:
+    """
+    ツイート群から論文形式の要約テキストを生成（背景・目的・方法・結果・課題のフレームワーク）
+    """
+    prompt = _summary_prompt(token_budget.fit_text(knowledge_text, "summary"))
     print("\n[Gemini] 論文形式の要約を生成中...")
-    summary = _call_gemini(prompt)
+    summary = _call_gemini(prompt, call_site="summary")
     if not summary:
         print("エラー: Geminiによる要約生成に失敗しました。")
         return None
@@ -78,47 +96,253 @@ def structure_document_to_json(summary_document: str) -> dict | None:
 
 ---
 【変換対象の研究報告書】
-{summary_document}
+{token_budget.fit_text(summary_document, "structure")}
 """
     print("[Gemini] 論文をJSON形式に変換中...")
-    json_str = _call_gemini(prompt)
-    if not json_str:
-        print("エラー: GeminiによるJSON変換に失敗しました。")
-        return None
+    return _call_gemini_json(prompt, call_site="structure")
+
+def _parse_structured_summary(text: str | None) -> tuple[str | None, dict | None]:
+    """
+    1回の呼び出しの応答から (要約テキスト, 概念データ) を取り出す。
+    概念データが検証に通らない場合は None にし、要約テキストだけでも取り出せればそれを返す。
+    """
+    try:
+        value = structured_output.parse(text, "summary_structured")
+        if value["report"].strip() and value["concept"]["concept_name"].strip():
+            return value["report"], value["concept"]
+        print("警告: 要約またはJSONの内容が空です。")
+    except structured_output.ParseError as e:
+        print(f"警告: 要約とJSONを同時に生成した応答がスキーマに合いませんでした。{e}")
+    partial = structured_output.try_parse(text, schema=structured_output.REPORT_ONLY_SCHEMA)
+    return (partial["report"] if partial and partial["report"].strip() else None), None
+
+def create_structured_summary(knowledge_text: str) -> tuple[str | None, dict | None] | None:
+    """
+    論文形式の要約と、それを構造化した概念データを、出力をスキーマで制約した1回の呼び出しで生成する。
+    戻り値: (要約テキスト, 概念データ)。検証に通らなかった部分はNone。呼び出し自体に失敗した場合はNone
+    """
+    prompt = _summary_prompt(token_budget.fit_text(knowledge_text, "summary_structured")) + """
+---
+【出力形式】
+上記の研究報告書（Markdown）を "report" に、その内容を次の形式に変換したものを "concept" に入れた、1つのJSONで出力してください。
+- concept_name: 報告書のタイトル
+- summary: 「結果」セクションの要約
+- components: 「結果」で示された主要構成要素のリスト
+- implication: 「考察と今後の課題」セクションの要約
+"""
+    print("\n[Gemini] 論文形式の要約とJSONを1回の呼び出しで生成中...")
     try:
-        clean_json_str = json_str.strip().lstrip("```json").rstrip("```")
-        return json.loads(clean_json_str)
-    except json.JSONDecodeError:
-        print("エラー: Geminiからの出力が有効なJSON形式ではありません。")
+        text = llm_gateway.generate(
+            prompt,
+            generation_config=structured_output.native_config(structured_output.schema_for("summary_structured")),
+            call_site="summary_structured",
+            # 検証に通らない応答はキャッシュしない（次回も2回の呼び出しに切り替えて作り直す）
+            is_valid=lambda t: _parse_structured_summary(t)[1] is not None,
+        )
+    except Exception as e:
+        print(f"Gemini APIとの通信中にエラーが発生しました: {e}")
         return None
+    return _parse_structured_summary(text)
 
-def generate_new_concept(knowledge_file: str, summary_file: str, concept_file: str) -> dict | None:
+def build_knowledge_text(knowledge_file: str) -> str | None:
     """
-    knowledge_file: 入力となるknowledge_entries.jsonのパス
-    summary_file: 中間生成物（論文形式テキスト）のパス
-    concept_file: 出力するconcepts.jsonのパス
-    戻り値: 生成された概念データ（辞書）またはNone（失敗時）
+    knowledge_file のエントリ群を、要約プロンプトに埋め込むテキストに変換する。
+    エントリがない場合はNoneを返す。
     """
-    with open(knowledge_file, 'r', encoding='utf-8') as f:
-        knowledge_data = json.load(f)
+    knowledge_data = knowledge_store.load_knowledge_view(knowledge_file)
     entries = knowledge_data.get('knowledge_entries', [])
     if not entries:
         print("警告: 分析対象の知識がありません。")
         return None
-    knowledge_text = "\n".join([
-        f"テーマ: {e.get('theme', '')}\nツイート: {e.get('generated_tweet', '')}\n詳細: {e.get('details', '')}"
+    return format_entries(entries)
+
+def format_entries(entries: list[dict]) -> str:
+    """エントリ群をプロンプトに埋め込むテキストに変換する。"""
+    return "\n".join([
+        f"テーマ: {e.get('theme', '')}\nツイート: {e.get('tweet') or e.get('generated_tweet', '')}\n詳細: {e.get('details', '')}"
         for e in entries
     ])
+
+def summarize_to_file(knowledge_text: str, summary_file: str) -> str | None:
+    """論文形式の要約を生成して summary_file に保存し、要約テキストを返す。"""
     summary_document = create_summary_document(knowledge_text)
     if not summary_document:
         print("エラー: 論文形式の要約生成に失敗しました。")
         return None
-    with open(summary_file, 'w', encoding='utf-8') as f:
-        f.write(summary_document)
+    atomic_io.write_text(summary_file, summary_document)
+    return summary_document
+
+def structure_to_file(summary_document: str, concept_file: str) -> dict | None:
+    """要約を構造化JSONに変換して concept_file に保存し、概念データを返す。"""
     concepts_json = structure_document_to_json(summary_document)
     if not concepts_json:
         print("エラー: 論文のJSON変換に失敗しました。")
         return None
-    with open(concept_file, 'w', encoding='utf-8') as f:
-        json.dump(concepts_json, f, ensure_ascii=False, indent=2)
+    atomic_io.write_json(concept_file, concepts_json)
     return concepts_json
+
+def summarize_and_structure_to_file(knowledge_text: str, summary_file: str, concept_file: str) -> dict | None:
+    """
+    要約とJSON変換を1回の呼び出しで行い、summary_file と concept_file に保存して概念データを返す。
+    応答の検証に失敗した場合だけ、2回の呼び出し（要約 → JSON変換）に切り替える。
+    要約だけは取り出せた場合は、その要約を使ってJSON変換だけを行う。
+    """
+    result = create_structured_summary(knowledge_text)
+    if result is None:
+        print("エラー: 論文形式の要約生成に失敗しました。")
+        return None
+    summary_document, concepts_json = result
+    if concepts_json is not None:
+        atomic_io.write_text(summary_file, summary_document)
+        atomic_io.write_json(concept_file, concepts_json)
+        return concepts_json
+    print("警告: 要約とJSON変換を2回の呼び出しに分けて行います。")
+    if summary_document:
+        atomic_io.write_text(summary_file, summary_document)
+    else:
+        summary_document = summarize_to_file(knowledge_text, summary_file)
+        if not summary_document:
+            return None
+    return structure_to_file(summary_document, concept_file)
+
+def generate_new_concept(knowledge_file: str, summary_file: str, concept_file: str) -> dict | None:
+    """
+    knowledge_file: 入力となるknowledge_entries.jsonのパス
+    summary_file: 中間生成物（論文形式テキスト）のパス
+    concept_file: 出力するconcepts.jsonのパス
+    戻り値: 生成された概念データ（辞書）またはNone（失敗時）
+    """
+    knowledge_text = build_knowledge_text(knowledge_file)
+    if not knowledge_text:
+        return None
+    if SUMMARY_MODE == "single":
+        return summarize_and_structure_to_file(knowledge_text, summary_file, concept_file)
+    summary_document = summarize_to_file(knowledge_text, summary_file)
+    if not summary_document:
+        return None
+    return structure_to_file(summary_document, concept_file)
+
+# --- 差分概念化（map-reduce方式） ---
+
+def summarize_chunk(entries: list[dict]) -> str | None:
+    """【map】一定件数のエントリから、概念の更新に使う要点メモを作る。"""
+    prompt = f"""あなたは、日々の調査記録から本質的な論点を抜き出す研究アシスタントです。
+以下の調査記録に共通する論点・新しい視点・具体的な事例を、箇条書きで最大5項目に要約してください。
+各項目は1〜2文で簡潔に記述し、前置きや結論は不要です。
+
+【調査記録】
+{token_budget.fit_text(format_entries(entries), "concept_map")}
+"""
+    print(f"[Gemini] {len(entries)}件のエントリから要点を抽出中...")
+    return _call_gemini(prompt, call_site="concept_map")
+
+def fold_notes_into_concept(concept: dict | None, notes: list[str]) -> dict | None:
+    """【reduce】現在の概念に新しい要点メモを取り込み、更新した概念を返す。"""
+    current = json.dumps(concept, ensure_ascii=False, indent=2) if concept else "（まだ概念はありません）"
+    joined_notes = token_budget.fit_text("\n".join(notes), "concept_fold")
+    prompt = f"""あなたは、蓄積された知見から一つの中心的な概念を育てていく研究者です。
+以下の「現在の概念」に「新しい要点メモ」の内容を取り込み、概念を更新してください。
+既存の概念と矛盾する点や新しい構成要素があれば反映し、重要でなくなった要素は整理してください。
+出力は、下記のJSONフォーマットに厳密に従ってください。
+
+【JSONフォーマット】
+{{
+  "concept_name": "（概念を一言で表すタイトル）",
+  "summary": "（概念の全体像の要約）",
+  "components": ["（主要構成要素のリスト）"],
+  "implication": "（考察と今後の課題の要約）"
+}}
+
+---
+【現在の概念】
+{current}
+
+【新しい要点メモ】
+{joined_notes}
+"""
+    print("[Gemini] 要点メモを概念に統合中...")
+    return _call_gemini_json(prompt, call_site="concept_fold")
+
+def load_concept_state(state_file: str, concept_file: str | None = None) -> dict:
+    """
+    差分概念化の状態を読み込む。
+    concept: 現在の概念 / last_entry_id: 概念に取り込み済みの最後のエントリID
+    pending_notes: まだ概念に取り込んでいない要点メモ / mapped_through_id: 要点メモ化済みの最後のエントリID
+    状態ファイルがなければ、既存の概念ファイルを出発点にする（壊れている場合は進捗を失わないよう例外を送出する）。
+    """
+    state = atomic_io.read_json(state_file)
+    if state is not None:
+        return state
+    concept = atomic_io.read_json(concept_file) if concept_file else None
+    return {"concept": concept, "last_entry_id": 0, "pending_notes": [], "mapped_through_id": 0}
+
+def save_concept_state(state_file: str, state: dict):
+    atomic_io.write_json(state_file, state)
+
+def append_concept_history(history_file: str, concept: dict, folded_entries: int):
+    """概念を上書きせず、履歴（JSON Lines）に1行追記する。"""
+    record = {"created_at": datetime.now().isoformat(), "folded_entries": folded_entries, "concept": concept}
+    atomic_io.append_lines(history_file, [json.dumps(record, ensure_ascii=False)])
+
+def render_concept_markdown(concept: dict, notes: list[str]) -> str:
+    """概念と今回取り込んだ要点メモを、研究報告書形式のMarkdownに整形する（LLMは使わない）。"""
+    components = "\n".join(f"- **{c}**" for c in concept.get("components", []))
+    joined_notes = "\n\n".join(notes)
+    return (f"# 研究報告書：{concept.get('concept_name', '')}\n\n"
+            f"## 結果 (Results)\n{concept.get('summary', '')}\n\n{components}\n\n"
+            f"## 考察と今後の課題 (Discussion & Future Issues)\n{concept.get('implication', '')}\n\n"
+            f"## 今回取り込んだ要点\n{joined_notes}\n")
+
+def update_concept_incrementally(new_entries: list[tuple[int, dict]], state_file: str, history_file: str,
+                                 summary_file: str, concept_file: str) -> dict | None:
+    """
+    前回のチェックポイント以降に追加されたエントリだけを、現在の概念に取り込む。
+    new_entries: (エントリID, エントリ) のリスト。取り込み済みのIDは無視される。
+    一定件数ごとに要点メモを作り（map）、メモが一定量たまるごとに概念へ統合する（reduce）ため、
+    1回のプロンプトの大きさは未処理の件数によらず一定に保たれる。
+    途中で失敗しても状態ファイルに進捗が残るため、次回は続きから再開する。
+    戻り値: 更新後の概念データ（辞書）またはNone（失敗時）
+    """
+    state = load_concept_state(state_file, concept_file)
+    pending = [(i, e) for i, e in new_entries if i > state["mapped_through_id"]]
+    if not pending and not state["pending_notes"]:
+        print("警告: 概念に取り込む新しいエントリがありません。")
+        return state["concept"]
+    folded_notes = []
+    folded_entries = 0
+    for start in range(0, len(pending), INCREMENTAL_CHUNK_SIZE):
+        chunk = pending[start:start + INCREMENTAL_CHUNK_SIZE]
+        notes = summarize_chunk([e for _, e in chunk])
+        if not notes:
+            print("エラー: 要点メモの生成に失敗しました。")
+            return None
+        state["pending_notes"].append(notes)
+        state["mapped_through_id"] = chunk[-1][0]
+        save_concept_state(state_file, state)
+        if sum(len(n) for n in state["pending_notes"]) >= MAX_FOLD_NOTES_CHARS:
+            if not _fold_pending_notes(state, state_file, folded_notes):
+                return None
+        folded_entries += len(chunk)
+    if state["pending_notes"] and not _fold_pending_notes(state, state_file, folded_notes):
+        return None
+    concept = state["concept"]
+    atomic_io.write_json(concept_file, concept)
+    atomic_io.write_text(summary_file, render_concept_markdown(concept, folded_notes))
+    append_concept_history(history_file, concept, folded_entries)
+    return concept
+
+def _fold_pending_notes(state: dict, state_file: str, folded_notes: list[str]) -> bool:
+    """状態にたまった要点メモを概念に統合し、チェックポイントを進める。"""
+    concept = fold_notes_into_concept(state["concept"], state["pending_notes"])
+    if not concept:
+        print("エラー: 要点メモの概念への統合に失敗しました。")
+        return False
+    folded_notes.extend(state["pending_notes"])
+    state.update({
+        "concept": concept,
+        "last_entry_id": state["mapped_through_id"],
+        "pending_notes": [],
+        "updated_at": datetime.now().isoformat(),
+    })
+    save_concept_state(state_file, state)
+    return True
@@ -0,0 +1,155 @@
+# src/daemon.py
+import os
+import sys
+import time
+import runpy
+import signal
+import asyncio
+import subprocess
+from datetime import datetime
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+from src import llm_gateway, tracing
+
+GIT_COMMIT_MESSAGE = "🧠 Bot: Update knowledge base" # GitHub Actionsのワークフローと同じメッセージ
+GIT_PATHS = ["data/"]
+
+
+def git_flush(repo_dir: str = project_root, push: bool = True) -> bool:
+    """
+    data/ の変更をまとめて1つのコミットにし、push する。コミットした場合は True を返す。
+    push に失敗しても（ネットワークの一時的な不調など）、コミットは残して次回の flush で一緒に push する。
+    """
+    def git(*args, check=True):
+        return subprocess.run(["git", *args], cwd=repo_dir, capture_output=True, text=True, check=check)
+
+    git("add", *GIT_PATHS)
+    if git("diff", "--staged", "--quiet", check=False).returncode == 0:
+        return False
+    git("commit", "-m", GIT_COMMIT_MESSAGE)
+    print(f"data/ の変更をコミットしました（{datetime.now()}）。")
+    if push:
+        result = git("push", check=False)
+        if result.returncode != 0:
+            print(f"警告: pushに失敗しました。次回の flush で再度 push します: {result.stderr.strip()}")
+    return True
+
+
+class Daemon:
+    """
+    プロセスを起動したまま、interval 秒ごとにサイクルを実行する常駐モード（python src/main.py --daemon で起動する）。
+    Python の起動・モジュールの読み込み・クライアントの生成・状態の読み込みは最初の1回だけで済み、
+    メモリに保持した状態の保存と git へのコミットは flush_every サイクルごとにまとめて行う。
+    SIGTERM / SIGINT を受け取ると、実行中のサイクルが終わるのを待ってから flush して終了する。
+
+    cycle: 1サイクルを実行し、実行したサイクルの名前を返す関数（main.run_scheduled_cycle）
+    report: サイクルの名前を受け取り、実行の記録を書き出す関数（main.report_run）
+    save_state: メモリに保持している状態を保存する関数（main.flush_resident_state）
+    flush: 指定した場合は、save_state と git へのコミットの代わりにこの関数で flush する
+    """
+
+    def __init__(self, cycle, interval: float = 3600, flush_every: int = 6, git_push: bool = False,
+                 report=None, save_state=None, flush=None, max_cycles: int | None = None):
+        self.interval = interval
+        self.flush_every = max(1, flush_every)
+        self.git_push = git_push
+        self.cycle = cycle
+        self.report = report
+        self.save_state = save_state
+        self._flush = flush
+        self.max_cycles = max_cycles
+        self.cycles = 0
+        self.unflushed = 0
+        self._stop: asyncio.Event | None = None
+
+    def stop(self) -> None:
+        """終了を要求する（実行中のサイクルは最後まで実行する）。"""
+        if self._stop is not None and not self._stop.is_set():
+            print("終了の要求を受け取りました。実行中のサイクルが終わりしだい終了します。")
+            self._stop.set()
+
+    def _install_signal_handlers(self, loop: asyncio.AbstractEventLoop) -> list:
+        installed = []
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.stop)
+                installed.append(sig)
+            except (NotImplementedError, RuntimeError):
+                # Windows や、メインスレッド以外で動かす場合は、シグナルで止められない
+                pass
+        return installed
+
+    def run_cycle(self) -> str:
+        """1サイクルを実行して記録する。失敗しても常駐は続け、次のサイクルで再び試す。"""
+        llm_gateway.start_run()
+        tracing.start_run()
+        print(f"======== サイクル開始 ({datetime.now()}) ========")
+        try:
+            run_name = self.cycle()
+        except (Exception, SystemExit) as e:
+            # 概念化サイクルは失敗時に sys.exit(1) するため、SystemExit も受け止めてプロセスは終了させない
+            print(f"エラー: サイクルが失敗しました: {e!r}")
+            run_name = "failed"
+        if self.report is not None:
+            self.report(run_name)
+        print(f"======== サイクル完了 ({datetime.now()}) ========\n")
+        return run_name
+
+    def flush(self) -> None:
+        """メモリに保持している状態を保存し、git_push が有効なら data/ をコミットして push する。"""
+        try:
+            if self._flush is not None:
+                self._flush()
+            else:
+                if self.save_state is not None:
+                    self.save_state()
+                if self.git_push:
+                    git_flush()
+        except Exception as e:
+            # 保存できなかった変更は次回の flush で再び保存する
+            print(f"エラー: 状態の保存に失敗しました: {e!r}")
+            return
+        self.unflushed = 0
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        installed = self._install_signal_handlers(loop)
+        print(f"常駐モードで起動しました（{self.interval:.0f}秒ごとに実行, {self.flush_every}サイクルごとに保存）。")
+        started = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                await asyncio.to_thread(self.run_cycle)
+                self.cycles += 1
+                self.unflushed += 1
+                if self.unflushed >= self.flush_every:
+                    await asyncio.to_thread(self.flush)
+                if self.max_cycles is not None and self.cycles >= self.max_cycles:
+                    break
+                # 開始時刻を基準に間隔を保つ（サイクルが interval より長引いた場合は、過ぎた回を飛ばす）
+                elapsed = time.monotonic() - started
+                delay = self.interval - elapsed % self.interval
+                try:
+                    await asyncio.wait_for(self._stop.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            if self.unflushed:
+                await asyncio.to_thread(self.flush)
+            for sig in installed:
+                loop.remove_signal_handler(sig)
+            print(f"常駐モードを終了しました（{self.cycles}サイクル実行）。")
+
+
+def run(cycle, interval: float = 3600, flush_every: int = 6, git_push: bool = False,
+        report=None, save_state=None) -> None:
+    """常駐モードを起動し、終了を要求されるまで interval 秒ごとに cycle を実行する。"""
+    asyncio.run(Daemon(cycle, interval, flush_every, git_push, report=report, save_state=save_state).run())
+
+
+if __name__ == "__main__":
+    # 使い方: python src/daemon.py  （python src/main.py --daemon と同じ）
+    # main を __main__ として1度だけ読み込み、そこからこのモジュールを使う（src.main として二重に読み込まない）
+    sys.argv = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py"), "--daemon", *sys.argv[1:]]
+    runpy.run_path(sys.argv[0], run_name="__main__")
@@ -0,0 +1,46 @@
+# src/deadline.py
+import time
+import contextvars
+from contextlib import contextmanager
+
+# 現在の処理の期限（time.monotonic() の値）。asyncioのタスクや、コンテキストを引き継いだスレッドにも伝わる
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """ステージの制限時間を過ぎたため、LLMの呼び出しやファイルの書き込みを打ち切ったことを表す。"""
+
+
+@contextmanager
+def scope(seconds: float | None):
+    """
+    with deadline.scope(秒数): ... の中の処理に期限を設ける（Noneなら何もしない）。
+    外側にすでに期限がある場合は、早い方の期限を使う。
+    """
+    if seconds is None:
+        yield
+        return
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(at if outer is None else min(at, outer))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> float | None:
+    """期限までの残り秒数（期限がなければNone、過ぎていれば0以下）。"""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def check(what: str = "処理") -> None:
+    """期限を過ぎていれば DeadlineExceeded を送出する。"""
+    if expired():
+        raise DeadlineExceeded(f"制限時間を過ぎたため、{what}を打ち切りました")
@@ -0,0 +1,144 @@
+# src/docx_cache.py
+import os
+import sys
+import json
+import hashlib
+import threading
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from src import docx_stream, atomic_io
+
+# キャッシュの形式を変えた場合に古いサイドカーを無効にするためのバージョン
+CACHE_VERSION = 3
+# 段落の種類。body: 本文直下 / table: 表のセル内 / textbox: テキストボックス内 / other: 目次などのコンテンツコントロール内
+PARAGRAPH_KINDS = ("body", "table", "textbox", "other")
+
+# このプロセスで確認済みの抽出結果（docxの絶対パス → (更新時刻, サイズ, 抽出結果)）。
+# 更新時刻は git checkout のたびに変わるためサイドカーには保存せず、同じプロセスでの2回目以降の判定にだけ使う
+_verified: dict[str, tuple[float, int, dict]] = {}
+# 別スレッドでサイドカーを作成中のdocx（docxの絶対パス → スレッド）
+_builders: dict[str, threading.Thread] = {}
+
+
+def sidecar_path(docx_path: str) -> str:
+    """docxファイルの抽出結果を保存するサイドカーファイルのパスを返す。"""
+    return docx_path + ".cache.json"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def extract_paragraphs(docx_path: str) -> list[dict]:
+    """
+    docxファイルから、本文・表・テキストボックス内の段落を文書順に抽出する。
+    戻り値: {"kind": 段落の種類, "text": テキスト} のリスト
+    """
+    return [{"kind": kind, "text": text} for kind, text in docx_stream.iter_paragraphs(docx_path)]
+
+
+def _load_sidecar(path: str) -> dict | None:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return data if data.get("version") == CACHE_VERSION else None
+
+
+def _save_sidecar(path: str, data: dict) -> None:
+    atomic_io.write_json(path, data, indent=None)
+
+
+def _valid_sidecar(docx_path: str) -> tuple[dict | None, str | None]:
+    """
+    docxファイルに対応する有効な抽出結果と、計算した場合はSHA-256を返す。
+    サイドカーはサイズとSHA-256で同一性を確認する（内容が同じなら書き換えないため、コミットしても差分が出ない）。
+    同じプロセスで確認済みで、更新時刻とサイズが変わっていなければ、ハッシュを計算せずに使う。
+    """
+    if not os.path.exists(docx_path):
+        raise FileNotFoundError(f"エラー: ファイルが見つかりません - {docx_path}")
+    stat = os.stat(docx_path)
+    key = os.path.abspath(docx_path)
+    verified = _verified.get(key)
+    if verified and verified[:2] == (stat.st_mtime, stat.st_size):
+        return verified[2], None
+    sha256 = file_sha256(docx_path)
+    cached = _load_sidecar(sidecar_path(docx_path))
+    if cached and cached.get("size") == stat.st_size and cached.get("sha256") == sha256:
+        _verified[key] = (stat.st_mtime, stat.st_size, cached)
+        return cached, sha256
+    return None, sha256
+
+
+def _build_sidecar(docx_path: str, sha256: str) -> dict:
+    """docxファイル全体を解析してサイドカーを作り、抽出結果を返す。"""
+    print(f"docxファイルを解析しています: {os.path.basename(docx_path)}")
+    stat = os.stat(docx_path)
+    cached = {
+        "version": CACHE_VERSION,
+        "sha256": sha256,
+        "size": stat.st_size,
+        "paragraphs": extract_paragraphs(docx_path),
+    }
+    _save_sidecar(sidecar_path(docx_path), cached)
+    _verified[os.path.abspath(docx_path)] = (stat.st_mtime, stat.st_size, cached)
+    return cached
+
+
+def _build_sidecar_in_background(docx_path: str, sha256: str) -> None:
+    try:
+        _build_sidecar(docx_path, sha256)
+    except Exception as e:
+        # サイドカーがなくても、次回もう一度作るだけなので処理は止めない
+        print(f"警告: docxファイルのサイドカーを作成できませんでした: {e}")
+
+
+def read_paragraphs(docx_path: str, kinds: tuple = PARAGRAPH_KINDS) -> list[str]:
+    """docxファイルの段落のうち、指定した種類のもののテキストを返す。抽出結果はサイドカーにキャッシュする。"""
+    cached, sha256 = _valid_sidecar(docx_path)
+    if cached is None:
+        cached = _build_sidecar(docx_path, sha256)
+    return [p["text"] for p in cached["paragraphs"] if p["kind"] in kinds]
+
+
+def first_paragraph(docx_path: str, kinds: tuple = ("body",)) -> str:
+    """
+    指定した種類の段落のうち、テキストを含む最初のものを返す（見つからなければ空文字）。
+    有効なサイドカーがなければ、見つけた時点でdocxを読むのをやめて返し、サイドカーは別スレッドで文書全体を解析して作る。
+    """
+    cached, sha256 = _valid_sidecar(docx_path)
+    if cached is not None:
+        texts = [p["text"] for p in cached["paragraphs"] if p["kind"] in kinds]
+    else:
+        key = os.path.abspath(docx_path)
+        if key not in _builders or not _builders[key].is_alive():
+            # デーモンスレッドにはせず、プロセスの終了前にサイドカーを書き終える
+            _builders[key] = threading.Thread(target=_build_sidecar_in_background, args=(docx_path, sha256),
+                                              name="docx_cache")
+            _builders[key].start()
+        texts = docx_stream.first_paragraphs(docx_path, 1, kinds=kinds)
+    return next((text.strip() for text in texts if text.strip()), "")
+
+
+def wait_for_sidecars(timeout: float | None = None) -> None:
+    """別スレッドで作成中のサイドカーが書き終わるのを待つ。"""
+    for builder in list(_builders.values()):
+        builder.join(timeout)
+
+
+def read_text(docx_path: str) -> str:
+    """テキストを含む段落を改行で結合して返す。"""
+    return "\n".join(p for p in read_paragraphs(docx_path) if p.strip())
+
+
+if __name__ == "__main__":
+    # 使い方: python src/docx_cache.py <docxファイル>  （サイドカーを作成・更新する）
+    if len(sys.argv) != 2:
+        print("使い方: python src/docx_cache.py <docxファイル>")
+        sys.exit(1)
+    print(f"{len(read_paragraphs(sys.argv[1]))}段落を {sidecar_path(sys.argv[1])} にキャッシュしました。")
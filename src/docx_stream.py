@@ -0,0 +1,104 @@
+# src/docx_stream.py
+import os
+import sys
+import zipfile
+from itertools import islice
+from xml.etree import ElementTree as ET
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_FALLBACK_TAG = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+_P, _T, _TAB, _BR, _CR = W_NS + "p", W_NS + "t", W_NS + "tab", W_NS + "br", W_NS + "cr"
+_BODY, _TC, _TXBX = W_NS + "body", W_NS + "tc", W_NS + "txbxContent"
+
+
+def iter_paragraphs(docx_path: str, kinds: tuple | None = None):
+    """
+    docx内の word/document.xml を iterparse で先頭から読み、段落を1つずつ返すジェネレータ。
+    戻り値の各要素: (種類, テキスト)。種類は body（本文直下）/ table（表のセル内）/ textbox / other（目次など）
+    kinds: 返す段落の種類（Noneならすべて）
+    文書全体を組み立てないため、途中で読むのをやめればメモリと時間は読んだ分だけで済む。
+    テキストボックスは互換用の代替表示（mc:Fallback）にも同じ内容が入っているため、そちらは除く。
+    """
+    if not os.path.exists(docx_path):
+        raise FileNotFoundError(f"エラー: ファイルが見つかりません - {docx_path}")
+    with zipfile.ZipFile(docx_path) as archive, archive.open("word/document.xml") as xml_file:
+        stack = [] # 開いている要素のタグ
+        buffers = [] # 開いている段落ごとのテキスト（テキストボックスの段落は外側の段落の中に入れ子になる）
+        body = None
+        for event, elem in ET.iterparse(xml_file, events=("start", "end")):
+            tag = elem.tag
+            if event == "start":
+                stack.append(tag)
+                if tag == _BODY:
+                    body = elem
+                elif tag == _P:
+                    buffers.append([])
+                continue
+
+            stack.pop()
+            in_fallback = _FALLBACK_TAG in stack
+            if buffers and not in_fallback:
+                if tag == _T:
+                    buffers[-1].append(elem.text or "")
+                elif tag == _TAB:
+                    buffers[-1].append("\t")
+                elif tag in (_BR, _CR):
+                    buffers[-1].append("\n")
+            if tag == _P:
+                text = "".join(buffers.pop())
+                if not in_fallback:
+                    kind = _kind(stack)
+                    if kinds is None or kind in kinds:
+                        yield kind, text
+            # 読み終えた本文直下の要素は破棄し、メモリ使用量を読んでいる位置の周辺だけに抑える
+            if body is not None and len(stack) == 2 and stack[-1] == _BODY:
+                body.clear()
+
+
+def _kind(stack: list[str]) -> str:
+    if stack and stack[-1] == _BODY:
+        return "body"
+    if _TXBX in stack:
+        return "textbox"
+    if _TC in stack:
+        return "table"
+    return "other"
+
+
+def first_paragraphs(docx_path: str, n: int, kinds: tuple | None = None, skip_empty: bool = True) -> list[str]:
+    """先頭からN個の段落のテキストを返す（skip_emptyなら空の段落は数えない）。"""
+    texts = (text for _, text in iter_paragraphs(docx_path, kinds))
+    if skip_empty:
+        texts = (text for text in texts if text.strip())
+    return list(islice(texts, n))
+
+
+def first_chars(docx_path: str, k: int, kinds: tuple | None = None) -> str:
+    """テキストを含む段落を改行で結合し、先頭からK文字を返す。K文字に達した時点で読むのをやめる。"""
+    parts, length = [], 0
+    for _, text in iter_paragraphs(docx_path, kinds):
+        if not text.strip():
+            continue
+        if parts:
+            parts.append("\n")
+            length += 1
+        parts.append(text)
+        length += len(text)
+        if length >= k:
+            break
+    return "".join(parts)[:k]
+
+
+def paragraphs_matching(docx_path: str, predicate, kinds: tuple | None = None, limit: int | None = None) -> list[str]:
+    """条件（predicate）を満たす段落のテキストを返す。limit件見つかった時点で読むのをやめる。"""
+    matches = (text for _, text in iter_paragraphs(docx_path, kinds) if predicate(text))
+    return list(islice(matches, limit))
+
+
+if __name__ == "__main__":
+    # 使い方: python src/docx_stream.py <docxファイル> [段落数]
+    if len(sys.argv) < 2:
+        print("使い方: python src/docx_stream.py <docxファイル> [段落数]")
+        sys.exit(1)
+    for paragraph in first_paragraphs(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 5):
+        print(paragraph)
@@ -1,8 +1,11 @@
 # src/from_docx_import_Document.py
-from docx import Document
 import os
+import sys
 import json
 
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+from src import docx_cache, docx_stream, tracing
+
 def read_first_text_in_docx(file_path):
     """
     docxファイルを読み込み、最初に見つかったテキストを含む段落から100文字を出力する。
@@ -11,15 +14,11 @@ def read_first_text_in_docx(file_path):
         print(f"エラー: ファイルが見つかりません - {file_path}")
         return
     try:
-        document = Document(file_path)
-        
-        # テキストを含む最初の段落を探す
-        for paragraph in document.paragraphs:
-            # .strip()で空白や改行のみの段落を無視する
-            if paragraph.text.strip():
-                print("最初に見つかったテキスト:")
-                print(paragraph.text[:100])
-                return paragraph.text
+        # テキストを含む最初の段落を探す（見つかった時点で読むのをやめ、文書全体は組み立てない）
+        for paragraph in docx_stream.first_paragraphs(file_path, 1, kinds=("body",)):
+            print("最初に見つかったテキスト:")
+            print(paragraph[:100])
+            return paragraph
 
         print("ドキュメント内にテキストを含む段落が見つかりませんでした。")
         print("原因の可能性: 1. 全て空行である 2. テキストが段落ではなくテキストボックス等に含まれている")
@@ -27,6 +26,47 @@ def read_first_text_in_docx(file_path):
     except Exception as e:
         print(f"ファイルの読み込み中にエラーが発生しました: {e}")
 
+def read_base_docx_text(base_docx_path: str) -> str:
+    """
+    docxファイルから、テキストを含む最初の段落を返す（見つからなければ空文字）。
+    サイドカー（docx_cache）があればそこから返し、なければ最初の段落を見つけた時点で読むのをやめる
+    （サイドカーは別スレッドで作り、docxが変わらない限り次回以降は解析しない）。
+    """
+    if os.path.exists(base_docx_path):
+        with tracing.span("docx_load", file=os.path.basename(base_docx_path)) as s:
+            try:
+                s.set(cached=os.path.exists(docx_cache.sidecar_path(base_docx_path)),
+                      bytes=os.path.getsize(base_docx_path))
+                return docx_cache.first_paragraph(base_docx_path, kinds=("body",))
+            except Exception as e:
+                print(f"docx読み込みエラー: {e}")
+    return ""
+
+def concept_to_texts(data) -> list[str]:
+    """構造化知識（concepts.jsonの内容）から、要約・構成要素・考察のテキストを取り出す。"""
+    texts = []
+    # concepts.jsonがリスト形式か単一オブジェクトか両対応
+    if isinstance(data, dict):
+        # 旧: conceptsキーあり
+        if "concepts" in data and isinstance(data["concepts"], list):
+            for concept in data["concepts"]:
+                texts.append(concept.get("summary", ""))
+                if "components" in concept:
+                    texts.extend([str(c) for c in concept["components"]])
+                texts.append(concept.get("implication", ""))
+        # 新: conceptsキーなし
+        else:
+            texts.append(data.get("summary", ""))
+            if "components" in data:
+                texts.extend([str(c) for c in data["components"]])
+            texts.append(data.get("implication", ""))
+    return texts
+
+def combine_knowledge_texts(base_text: str, concept_data) -> str:
+    """docxの最初のテキストと構造化知識のテキストを結合する。"""
+    texts = [base_text] + concept_to_texts(concept_data)
+    return "\n".join([t for t in texts if t])
+
 def get_combined_knowledge_text(base_docx_path: str, concepts_path: str) -> str:
     """
     base_docx_path: ベースとなるdocxファイルのパス
@@ -35,40 +75,17 @@ def get_combined_knowledge_text(base_docx_path: str, concepts_path: str) -> str:
     2. 構造化知識の要約や要素
     を結合して返す
     """
-    texts = []
     # 1. docxの最初のテキスト
-    if os.path.exists(base_docx_path):
-        try:
-            document = Document(base_docx_path)
-            for paragraph in document.paragraphs:
-                if paragraph.text.strip():
-                    texts.append(paragraph.text.strip())
-                    break
-        except Exception as e:
-            print(f"docx読み込みエラー: {e}")
+    base_text = read_base_docx_text(base_docx_path)
     # 2. 構造化知識の要約や要素
+    concept_data = None
     if os.path.exists(concepts_path):
         try:
             with open(concepts_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-            # concepts.jsonがリスト形式か単一オブジェクトか両対応
-            if isinstance(data, dict):
-                # 旧: conceptsキーあり
-                if "concepts" in data and isinstance(data["concepts"], list):
-                    for concept in data["concepts"]:
-                        texts.append(concept.get("summary", ""))
-                        if "components" in concept:
-                            texts.extend([str(c) for c in concept["components"]])
-                        texts.append(concept.get("implication", ""))
-                # 新: conceptsキーなし
-                else:
-                    texts.append(data.get("summary", ""))
-                    if "components" in data:
-                        texts.extend([str(c) for c in data["components"]])
-                    texts.append(data.get("implication", ""))
+                concept_data = json.load(f)
         except Exception as e:
             print(f"conceptsファイル読み込みエラー: {e}")
-    return "\n".join([t for t in texts if t])
+    return combine_knowledge_texts(base_text, concept_data)
 
 if __name__ == "__main__":
     # ご自身のファイルパスに修正してください
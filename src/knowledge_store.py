@@ -0,0 +1,176 @@
+# src/knowledge_store.py
+import os
+import sys
+import json
+from abc import ABC, abstractmethod
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from src import atomic_io
+
+# 追記用ジャーナルの拡張子（JSON Lines形式）
+JOURNAL_SUFFIX = ".jsonl"
+# 圧縮処理中にジャーナルを退避させておくファイルの接尾辞
+COMPACTING_SUFFIX = ".compacting"
+
+
+class KnowledgeStore(ABC):
+    """
+    知識ログの保存先の共通インターフェース。{"knowledge_entries": [...]} 形式のビューを提供する。
+    append / entries を実装していないサブクラスは、生成した時点で TypeError になる。
+    """
+
+    @abstractmethod
+    def append(self, entry: dict) -> None:
+        ...
+
+    def extend(self, entries: list[dict]) -> None:
+        for entry in entries:
+            self.append(entry)
+
+    @abstractmethod
+    def entries(self) -> list[dict]:
+        ...
+
+    def count(self) -> int:
+        return len(self.entries())
+
+    def latest(self) -> dict | None:
+        entries = self.entries()
+        return entries[-1] if entries else None
+
+    def as_view(self) -> dict:
+        """既存コードが期待する {"knowledge_entries": [...]} 形式で全エントリを返す。"""
+        return {"knowledge_entries": self.entries()}
+
+
+def _read_snapshot(path: str) -> list[dict]:
+    """
+    {"knowledge_entries": [...]} 形式のJSONファイルからエントリ一覧を読み込む。
+    ファイルが壊れている場合は、空として扱って履歴を上書きしないよう atomic_io.CorruptFileError を送出する。
+    """
+    return atomic_io.read_json(path, {}).get("knowledge_entries", [])
+
+
+def _read_journal(path: str) -> list[dict]:
+    """JSON Lines形式のジャーナルを読み込む。書き込み途中で途切れた末尾行は無視する。"""
+    entries = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"警告: ジャーナルの壊れた行をスキップしました ({path})")
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+class JsonKnowledgeStore(KnowledgeStore):
+    """従来方式のストア。追記のたびにJSONファイル全体を読み込み、書き直す。"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def append(self, entry: dict) -> None:
+        self.extend([entry])
+
+    def extend(self, entries: list[dict]) -> None:
+        with atomic_io.file_lock(self.path):
+            all_entries = _read_snapshot(self.path) + list(entries)
+            atomic_io.write_json(self.path, {"knowledge_entries": all_entries})
+
+    def entries(self) -> list[dict]:
+        return _read_snapshot(self.path)
+
+
+class JournalKnowledgeStore(KnowledgeStore):
+    """
+    追記専用のストア。
+    スナップショット（従来のJSONファイル）と、その後の追記分を溜めるジャーナル（JSON Lines）の2段構成にする。
+    追記はジャーナルへの1回のwrite + fsyncだけで済み、ログが増えても書き込みコストは一定になる。
+    compact() でジャーナルの内容をスナップショットに統合する。
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str | None = None):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path or os.path.splitext(snapshot_path)[0] + JOURNAL_SUFFIX
+        self.compacting_path = self.journal_path + COMPACTING_SUFFIX
+        self._recover()
+
+    def _recover(self) -> None:
+        """前回のcompact()が途中で中断されていた場合に、退避済みジャーナルを元に戻す。"""
+        if not os.path.exists(self.compacting_path):
+            return
+        with atomic_io.file_lock(self.journal_path):
+            if os.path.exists(self.compacting_path):
+                self._restore_compacting()
+
+    def _restore_compacting(self) -> None:
+        pending = _read_journal(self.compacting_path)
+        snapshot = _read_snapshot(self.snapshot_path)
+        # スナップショットの置き換えまで完了していれば、退避ファイルを消すだけでよい
+        if pending and len(snapshot) >= len(pending) and snapshot[-len(pending):] == pending:
+            os.remove(self.compacting_path)
+            return
+        # 置き換え前に中断していた場合は、退避分を現在のジャーナルの前に戻す
+        with open(self.compacting_path, 'a', encoding='utf-8') as dst:
+            for entry in _read_journal(self.journal_path):
+                dst.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            dst.flush()
+            os.fsync(dst.fileno())
+        os.replace(self.compacting_path, self.journal_path)
+
+    def append(self, entry: dict) -> None:
+        self.extend([entry])
+
+    def extend(self, entries: list[dict]) -> None:
+        """
+        エントリをジャーナルに追記する。複数件でも書き込みは1回にまとめる。
+        ロックの中で追記するため、複数のワーカーが同時に追記しても行が混ざらない。
+        """
+        atomic_io.append_lines(self.journal_path, [json.dumps(e, ensure_ascii=False) for e in entries])
+
+    def entries(self) -> list[dict]:
+        return _read_snapshot(self.snapshot_path) + _read_journal(self.journal_path)
+
+    def journal_count(self) -> int:
+        """まだスナップショットに統合されていないエントリ数を返す。"""
+        return len(_read_journal(self.journal_path))
+
+    def compact(self) -> int:
+        """ジャーナルをスナップショットに統合し、統合したエントリ数を返す。"""
+        with atomic_io.file_lock(self.journal_path):
+            if not os.path.exists(self.journal_path):
+                return 0
+            # 途中で中断しても _recover() で元に戻せるよう、先にジャーナルを退避させる
+            os.replace(self.journal_path, self.compacting_path)
+            pending = _read_journal(self.compacting_path)
+            all_entries = _read_snapshot(self.snapshot_path) + pending
+            atomic_io.write_json(self.snapshot_path, {"knowledge_entries": all_entries})
+            os.remove(self.compacting_path)
+        return len(pending)
+
+
+def load_knowledge_view(path: str) -> dict:
+    """
+    互換リーダー。pathのJSONファイルと、対応するジャーナル（存在すれば）を合わせた
+    {"knowledge_entries": [...]} 形式のビューを返す。
+    """
+    journal_path = os.path.splitext(path)[0] + JOURNAL_SUFFIX
+    if os.path.exists(journal_path) or os.path.exists(journal_path + COMPACTING_SUFFIX):
+        return JournalKnowledgeStore(path, journal_path).as_view()
+    return {"knowledge_entries": _read_snapshot(path)}
+
+
+if __name__ == "__main__":
+    # 使い方: python src/knowledge_store.py compact data/knowledge_base/all_knowledge_log.json
+    if len(sys.argv) != 3 or sys.argv[1] != "compact":
+        print("使い方: python src/knowledge_store.py compact <スナップショットJSONのパス>")
+        sys.exit(1)
+    store = JournalKnowledgeStore(sys.argv[2])
+    merged = store.compact()
+    print(f"{merged}件のエントリを {store.snapshot_path} に統合しました。")
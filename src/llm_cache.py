@@ -0,0 +1,155 @@
+# src/llm_cache.py
+import os
+import json
+import time
+import hashlib
+import threading
+from src import atomic_io
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# --- キャッシュ設定（環境変数で上書き可能） ---
+CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.join(project_root, 'data', 'llm_cache'))
+MAX_CACHE_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(5 * 1024 * 1024)))
+# 1: キャッシュを参照せずに必ずAPIを呼び出す（応答はキャッシュに保存し直す）
+BYPASS = os.getenv("LLM_CACHE_BYPASS", "") == "1"
+# 1: 有効期限を無視してキャッシュのみから応答する（オフラインでのテスト再生用）
+REPLAY = os.getenv("LLM_CACHE_REPLAY", "") == "1"
+
+# 呼び出し元ごとの有効期限（秒）。0はキャッシュしない。
+# 調査（research）はWeb検索の最新情報が必要なためキャッシュしない。
+CACHE_TTLS = {
+    "research": 0,
+    "summary": 7 * 24 * 3600,
+    "summary_structured": 7 * 24 * 3600,
+    "structure": 30 * 24 * 3600,
+    "cluster": 7 * 24 * 3600,
+    "cluster_reduce": 7 * 24 * 3600,
+    "concept_map": 30 * 24 * 3600,
+    "concept_fold": 7 * 24 * 3600,
+    "json_repair": 7 * 24 * 3600,
+}
+
+
+def cache_key(model: str, prompt: str, generation_config: dict | None = None) -> str:
+    """(モデル, プロンプト, ツール設定) から内容アドレスのキーを作る。"""
+    material = json.dumps([model, prompt, generation_config], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    LLM応答のディスクキャッシュ。1応答を1ファイルとして保存し、最終アクセス時刻の古い順に削除するLRU方式で容量を制限する。
+    最終アクセス時刻はファイルの更新時刻ではなく記録（last_access）に持つ
+    （Actions のキャッシュから復元したり、チェックアウトし直したりすると更新時刻が揃ってしまうため）。
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES, ttls: dict | None = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        # クラスタリングやバッチの並行スレッドが put するたびに evict するため、削除と、
+        # get() での最終アクセス時刻の書き戻し（削除した記録を書き戻して復活させないため）は1スレッドずつ行う
+        self._lock = threading.Lock()
+
+    def ttl_for(self, call_site: str) -> int:
+        return self.ttls.get(call_site, 0)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        """記録を削除する（他のスレッドが先に削除していた場合は何もしない）。"""
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str, call_site: str, ignore_ttl: bool = False) -> str | None:
+        """キャッシュされた応答を返す。存在しないか期限切れの場合はNone。"""
+        with self._lock:
+            return self._get(self._path(key), call_site, ignore_ttl)
+
+    def _get(self, path: str, call_site: str, ignore_ttl: bool) -> str | None:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                record = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if not ignore_ttl and time.time() - record.get("created_at", 0) > self.ttl_for(call_site):
+            self._remove(path)
+            return None
+        # 最終アクセス時刻を更新（LRUの順序に使う）
+        record["last_access"] = time.time()
+        atomic_io.write_json(path, record, indent=None)
+        return record.get("text")
+
+    def put(self, key: str, call_site: str, model: str, text: str) -> None:
+        """応答を保存し、容量上限を超えていれば古いものから削除する。"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        now = time.time()
+        record = {"call_site": call_site, "model": model, "created_at": now, "last_access": now, "text": text}
+        atomic_io.write_json(self._path(key), record, indent=None)
+        self.evict()
+
+    def evict(self) -> int:
+        """最終アクセスが古い順に削除して容量上限内に収める。削除した件数を返す。"""
+        with self._lock:
+            return self._evict()
+
+    def _evict(self) -> int:
+        sizes = {}
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    sizes[path] = os.path.getsize(path)
+                except FileNotFoundError:
+                    # 一覧を取った後に、期限切れとして get() が削除した記録
+                    continue
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return 0
+        # 上限を超えたときだけ、各記録の最終アクセス時刻を読む
+        files = []
+        for path, size in sizes.items():
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    record = json.load(f)
+                last_access = record.get("last_access", record.get("created_at", 0))
+            except (OSError, json.JSONDecodeError):
+                last_access = 0 # 読めない記録は最初に削除する
+            files.append((last_access, size, path))
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self) -> None:
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                self._remove(os.path.join(self.cache_dir, name))
+
+
+_default_cache = None
+
+
+def get_cache() -> ResponseCache:
+    """プロセス共有のキャッシュを返す。"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResponseCache()
+    return _default_cache
+
+
+def set_cache(cache: ResponseCache | None) -> None:
+    """共有キャッシュを差し替える（テスト用）。"""
+    global _default_cache
+    _default_cache = cache
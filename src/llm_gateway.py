@@ -0,0 +1,340 @@
+# src/llm_gateway.py
+import os
+import sys
+import json
+import time
+import threading
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+import config
+from src import llm_cache, token_budget, structured_output, atomic_io, tracing, resilience, model_router, deadline
+
+# 1回のHTTPリクエストの制限時間（秒）。ステージの制限時間（deadline）の中では、残り時間の方が短ければそちらを使う
+HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "300"))
+
+# --- 再試行とサーキットブレーカーの設定 ---
+MAX_ATTEMPTS = 3 # 1回の呼び出しで試行する最大回数（一時的なエラーのみ再試行する）
+RETRY_BASE_DELAY = 2.0 # バックオフの基準秒数
+RETRY_MAX_DELAY = 30.0 # 1回の待機の上限秒数（Retry-After がこれより長ければ再試行しない）
+RUN_RETRY_LIMIT = 5 # 1回の実行全体で再試行できる回数
+RUN_RETRY_MAX_WAIT = 60.0 # 1回の実行全体で再試行のために待てる秒数
+CIRCUIT_FAILURE_THRESHOLD = 2 # 再試行しても失敗した呼び出しがこの回数続いたら、Geminiを呼び出すのを止める
+CIRCUIT_COOLDOWN = 1800.0 # 呼び出しを止める秒数（過ぎたら1回だけ試す）
+CIRCUIT_STATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'gemini_circuit.json')
+
+# プロセス全体で共有するGeminiクライアント（HTTP接続はクライアント内部で再利用される）
+_client = None
+_client_lock = threading.Lock()
+# 呼び出しごとのレイテンシ記録
+_call_stats: list[dict] = []
+# プロセス全体で共有する再試行ポリシー（再試行の予算とサーキットブレーカーを含む）
+_retry_policy = None
+
+
+def __getattr__(name: str):
+    # google.genai は読み込みに時間がかかるため、初めて参照されたときに読み込む（llm_gateway.genai）
+    if name == "genai":
+        from google import genai
+        return genai
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def get_client():
+    """共有のGeminiクライアントを返す。初回呼び出し時にのみ生成する。"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config.validate_gemini()
+                from google import genai
+                _client = genai.Client(api_key=config.GEMINI_API_KEY)
+    return _client
+
+
+def set_client(client) -> None:
+    """共有クライアントを差し替える（テストやオフライン実行用）。Noneを渡すと次回呼び出し時に再生成する。"""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def get_retry_policy() -> resilience.RetryPolicy:
+    """共有の再試行ポリシーを返す。サーキットブレーカーの状態は CIRCUIT_STATE_PATH から読み込む。"""
+    global _retry_policy
+    if _retry_policy is None:
+        with _client_lock:
+            if _retry_policy is None:
+                _retry_policy = resilience.RetryPolicy(
+                    MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY,
+                    budget=resilience.RetryBudget(RUN_RETRY_LIMIT, RUN_RETRY_MAX_WAIT),
+                    breaker=resilience.CircuitBreaker("Gemini", CIRCUIT_STATE_PATH, CIRCUIT_FAILURE_THRESHOLD,
+                                                      CIRCUIT_COOLDOWN),
+                )
+    return _retry_policy
+
+
+def set_retry_policy(policy) -> None:
+    """共有の再試行ポリシーを差し替える（テスト用）。Noneを渡すと次回呼び出し時に再生成する。"""
+    global _retry_policy
+    with _client_lock:
+        _retry_policy = policy
+
+
+def circuit_open() -> bool:
+    """Geminiが不調と判断して呼び出しを止めている間はTrue（実行の最初に確認し、時間を使わずに終える）。"""
+    breaker = get_retry_policy().breaker
+    return breaker is not None and breaker.is_open()
+
+
+def _usage_count(response, field: str) -> int | None:
+    """応答の usage_metadata から実際のトークン数を取り出す（取得できない場合はNone）。"""
+    value = getattr(getattr(response, "usage_metadata", None), field, None)
+    return value if isinstance(value, int) else None
+
+
+def generate(prompt: str, model: str | None = None, generation_config: dict | None = None, call_site: str = "default",
+             use_cache: bool = True, is_valid=None, timeout: float | None = HTTP_TIMEOUT) -> str:
+    """
+    共有クライアントでプロンプトを送信し、応答テキストを返す。
+    model: 使うモデル。省略すると call_site に応じて model_router が選び、呼び出せなかった場合は次の候補のモデルに切り替える
+    generation_config: ツール設定などの生成設定（google_searchなど）
+    call_site: 呼び出し元を表す名前（レイテンシ集計・キャッシュ有効期限・トークン予算のキー）
+    use_cache: Falseの場合は応答キャッシュを使わない
+    is_valid: 応答テキストを受け取り、使える応答かを返す関数。使えない応答はキャッシュに保存せず、キャッシュにあっても使わない
+    timeout: 1回のHTTPリクエストの制限時間（秒）。ステージの制限時間を過ぎた場合は、呼び出さずに DeadlineExceeded を送出する
+    """
+    prompt_tokens = token_budget.estimate_tokens(prompt)
+    if model:
+        models = [model]
+        cache_model = model
+    else:
+        uses_tools = bool((generation_config or {}).get("tools"))
+        models = model_router.candidates(call_site, prompt_tokens, uses_tools)
+        # 選ばれるモデルは記録したレイテンシで入れ替わるため、キャッシュは段階ごとに共有する
+        cache_model = f"tier:{model_router.tier_for(call_site, prompt_tokens, uses_tools)}"
+    with tracing.span("llm", call_site=call_site, model=model or models[0]) as s:
+        max_prompt_tokens = token_budget.budget_for(call_site)["max_prompt_tokens"]
+        if prompt_tokens > max_prompt_tokens:
+            # 本文の調整は呼び出し側で apply_budget / fit_text を使って行う。ここでは見逃しを警告する
+            print(f"警告: {call_site} のプロンプトが予算を超えています（約{prompt_tokens}/{max_prompt_tokens}トークン）。")
+        cache = llm_cache.get_cache()
+        key = None
+        if use_cache and (cache.ttl_for(call_site) > 0 or llm_cache.REPLAY):
+            key = llm_cache.cache_key(cache_model, prompt, generation_config)
+            if not llm_cache.BYPASS:
+                cached = cache.get(key, call_site, ignore_ttl=llm_cache.REPLAY)
+                if cached is not None and (is_valid is None or is_valid(cached)):
+                    _call_stats.append({"call_site": call_site, "model": cache_model, "seconds": 0.0, "ok": True,
+                                        "cached": True, "prompt_tokens": prompt_tokens,
+                                        "response_tokens": token_budget.estimate_tokens(cached)})
+                    s.set(cached=True, bytes=len(cached.encode('utf-8')))
+                    print(f"[LLM] {call_site} ({cache_model}): キャッシュから応答しました")
+                    return cached
+            if llm_cache.REPLAY:
+                raise LookupError(f"リプレイモードですが、キャッシュに応答がありません: {call_site}")
+
+        client = get_client()
+        for i, candidate in enumerate(models):
+            try:
+                response = _call_model(client, candidate, prompt, generation_config, call_site, prompt_tokens, s,
+                                       timeout)
+            except Exception as e:
+                if i + 1 < len(models) and model_router.should_fallback(e):
+                    print(f"警告: {candidate} を呼び出せなかったため、{models[i + 1]} に切り替えます（{e}）。")
+                    continue
+                raise
+            break
+        if key and response.text and (is_valid is None or is_valid(response.text)):
+            cache.put(key, call_site, candidate, response.text)
+        return response.text
+
+
+def _request_config(generation_config: dict | None, timeout: float | None) -> dict | None:
+    """生成設定に、HTTPリクエストの制限時間（ステージの残り時間以内）を加える。"""
+    left = deadline.remaining()
+    if left is not None:
+        timeout = left if timeout is None else min(timeout, left)
+    if timeout is None:
+        return generation_config
+    # google.genai の http_options.timeout はミリ秒
+    return {**(generation_config or {}), "http_options": {"timeout": max(1, int(timeout * 1000))}}
+
+
+def _call_model(client, model: str, prompt: str, generation_config: dict | None, call_site: str,
+                prompt_tokens: int, s, timeout: float | None = HTTP_TIMEOUT):
+    """1つのモデルを呼び出し、所要時間とトークン数を呼び出し元・モデルごとの記録に残す。"""
+    # 待つのをやめた（タイムアウトした）ステージから、新しい呼び出しを始めない
+    deadline.check(f"Gemini ({call_site}) の呼び出し")
+    start = time.perf_counter()
+    ok = False
+    response = None
+    try:
+        # 一時的なエラーはバックオフして再試行し、Geminiが不調な間は呼び出さずに CircuitOpenError を送出する
+        response = get_retry_policy().call(
+            lambda: client.models.generate_content(model=model, contents=prompt,
+                                                   config=_request_config(generation_config, timeout)),
+            name=f"Gemini ({call_site})")
+        ok = True
+    finally:
+        elapsed = time.perf_counter() - start
+        # APIが実際のトークン数を返した場合はそれを、なければ概算値を記録する
+        stat = {
+            "call_site": call_site, "model": model, "seconds": elapsed, "ok": ok, "cached": False,
+            "prompt_tokens": _usage_count(response, "prompt_token_count") or prompt_tokens,
+            "response_tokens": _usage_count(response, "candidates_token_count")
+                               or token_budget.estimate_tokens(response.text if ok else None),
+        }
+        _call_stats.append(stat)
+        model_router.record(model, elapsed, ok)
+        s.set(cached=False, model=model, prompt_tokens=stat["prompt_tokens"], response_tokens=stat["response_tokens"],
+              bytes=len(response.text.encode('utf-8')) if ok and response.text else 0)
+        print(f"[LLM] {call_site} ({model}): {elapsed:.2f}秒{'' if ok else '（失敗）'}")
+    return response
+
+
+def repair_json(text: str, call_site: str, model: str | None = None, schema: dict | None = None):
+    """
+    スキーマに合わなかった応答を、もう一度最初から生成し直すのではなく、JSONへの整形だけをGeminiに依頼して取り出す。
+    それでも取り出せない場合は structured_output.ParseError を送出する。
+    """
+    schema = schema if schema is not None else structured_output.schema_for(call_site)
+    prompt = f"""以下のテキストの内容を、指定のJSONスキーマに従う有効なJSONに変換してください。
+内容は変えず、JSON以外の文字（説明文やコードフェンス）は出力しないでください。
+
+【JSONスキーマ】
+{json.dumps(schema, ensure_ascii=False)}
+
+【テキスト】
+{token_budget.fit_text(text, "json_repair")}
+"""
+    print(f"警告: {call_site} の応答がJSONとして読めなかったため、整形を依頼します。")
+    repaired = generate(prompt, model, structured_output.native_config(schema), call_site="json_repair",
+                        is_valid=lambda t: structured_output.try_parse(t, schema=schema) is not None)
+    return structured_output.parse(repaired, schema=schema)
+
+
+def generate_json(prompt: str, model: str | None = None, call_site: str = "default", schema: dict | None = None,
+                  generation_config: dict | None = None, native: bool = True, use_cache: bool = True):
+    """
+    プロンプトを送信し、応答をスキーマ（schema、なければ call_site のスキーマ）に従うJSONとして返す。
+    native: Trueの場合はGeminiにJSONで直接出力させる（ツールを使う呼び出しでは自動的に無効）
+    応答がスキーマに合わない場合は、整形だけを1回依頼し（repair_json）、それでも合わなければ ParseError を送出する。
+    スキーマに合わない応答はキャッシュしない。
+    """
+    schema = schema if schema is not None else structured_output.schema_for(call_site)
+    if native:
+        generation_config = structured_output.native_config(schema, generation_config)
+    text = generate(prompt, model, generation_config, call_site=call_site, use_cache=use_cache,
+                    is_valid=lambda t: structured_output.try_parse(t, schema=schema) is not None)
+    try:
+        return structured_output.parse(text, schema=schema)
+    except structured_output.ParseError as e:
+        if not text:
+            raise
+        print(f"警告: {e}")
+    return repair_json(text, call_site, model, schema)
+
+
+def start_run() -> None:
+    """呼び出しの記録と、この実行で使った再試行の予算をリセットする（常駐モードでサイクルごとに呼ぶ）。"""
+    _call_stats.clear()
+    if _retry_policy is not None and _retry_policy.budget is not None:
+        _retry_policy.budget.reset()
+
+
+def get_call_stats() -> list[dict]:
+    """このプロセスで行ったLLM呼び出しの記録を返す。"""
+    return list(_call_stats)
+
+
+def summarize_latency() -> dict:
+    """呼び出し元ごとの回数・合計・平均レイテンシを集計する。"""
+    summary = {}
+    for stat in _call_stats:
+        s = summary.setdefault(stat["call_site"], {"calls": 0, "cache_hits": 0, "total_seconds": 0.0})
+        s["calls"] += 1
+        s["cache_hits"] += 1 if stat.get("cached") else 0
+        s["total_seconds"] += stat["seconds"]
+    for s in summary.values():
+        s["avg_seconds"] = s["total_seconds"] / s["calls"]
+    return summary
+
+
+def summarize_tokens() -> dict:
+    """
+    呼び出し元ごとのトークン数を集計する。
+    prompt_tokens / response_tokens はAPIを実際に呼び出した分（キャッシュ応答を除く）の合計、
+    max_prompt_tokens はキャッシュ応答を含めた1回あたりの最大プロンプト長。
+    """
+    summary = {}
+    for stat in _call_stats:
+        s = summary.setdefault(stat["call_site"], {"calls": 0, "prompt_tokens": 0, "response_tokens": 0,
+                                                   "max_prompt_tokens": 0})
+        s["calls"] += 1
+        s["max_prompt_tokens"] = max(s["max_prompt_tokens"], stat.get("prompt_tokens", 0))
+        if not stat.get("cached"):
+            s["prompt_tokens"] += stat.get("prompt_tokens", 0)
+            s["response_tokens"] += stat.get("response_tokens", 0)
+    return summary
+
+
+def summarize_models() -> dict:
+    """
+    モデルごとの回数・失敗回数・成功率・平均レイテンシ・トークン数を集計する（APIを実際に呼び出した分のみ）。
+    """
+    summary = {}
+    for stat in _call_stats:
+        if stat.get("cached"):
+            continue
+        s = summary.setdefault(stat["model"], {"calls": 0, "failures": 0, "total_seconds": 0.0,
+                                               "prompt_tokens": 0, "response_tokens": 0})
+        s["calls"] += 1
+        s["failures"] += 0 if stat["ok"] else 1
+        s["total_seconds"] += stat["seconds"]
+        s["prompt_tokens"] += stat.get("prompt_tokens", 0)
+        s["response_tokens"] += stat.get("response_tokens", 0)
+    for s in summary.values():
+        s["success_rate"] = round((s["calls"] - s["failures"]) / s["calls"], 4)
+        s["avg_seconds"] = round(s["total_seconds"] / s["calls"], 4)
+        s["total_seconds"] = round(s["total_seconds"], 4)
+    return summary
+
+
+def write_token_metrics(metrics_path: str, run_name: str = "") -> dict | None:
+    """
+    今回の実行のトークン数の合計を、メトリクスファイル（JSON Lines）に1行追記する。
+    コミットごとのプロンプトの増え方を追跡できるよう、GITHUB_SHA があれば記録する。
+    """
+    if not _call_stats:
+        return None
+    by_call_site = summarize_tokens()
+    record = {
+        "run_at": datetime.now().isoformat(),
+        "run": run_name,
+        "commit": os.getenv("GITHUB_SHA", ""),
+        "prompt_tokens": sum(s["prompt_tokens"] for s in by_call_site.values()),
+        "response_tokens": sum(s["response_tokens"] for s in by_call_site.values()),
+        "call_sites": by_call_site,
+        "models": summarize_models(),
+    }
+    atomic_io.append_lines(metrics_path, [json.dumps(record, ensure_ascii=False)])
+    print(f"トークン数: 入力{record['prompt_tokens']} / 出力{record['response_tokens']}（{metrics_path} に記録しました）")
+    return record
+
+
+def report_latency() -> None:
+    """LLM呼び出しのレイテンシ集計を表示する。"""
+    if not _call_stats:
+        return
+    print("--- LLM呼び出しのレイテンシ ---")
+    for call_site, s in summarize_latency().items():
+        print(f"{call_site}: {s['calls']}回（キャッシュ{s['cache_hits']}回） 合計{s['total_seconds']:.2f}秒 平均{s['avg_seconds']:.2f}秒")
+    for model, s in summarize_models().items():
+        print(f"[{model}] {s['calls']}回（失敗{s['failures']}回） 平均{s['avg_seconds']:.2f}秒")
+    # 初回呼び出しには接続確立のコストが含まれるため、2回目以降と比較できるよう表示する
+    network_calls = [s for s in _call_stats if not s.get("cached")]
+    if len(network_calls) > 1:
+        first = network_calls[0]["seconds"]
+        rest = sum(s["seconds"] for s in network_calls[1:]) / (len(network_calls) - 1)
+        print(f"初回: {first:.2f}秒 / 2回目以降の平均: {rest:.2f}秒")
@@ -1,21 +1,48 @@
 # src/main.py
 import os
 import sys
-import json
-import random
-import re
-from datetime import datetime
-import time
+import argparse
+from datetime import datetime, timedelta
 
 # --- モジュール検索パスの設定 ---
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 sys.path.append(project_root)
 
+# --- 環境変数の読み込み（.env があれば、以下の設定値を読む前に読み込む） ---
+import config
+config.load_env()
+
 # --- 各機能モジュールのインポート ---
-from src import from_docx_import_Document, cluster_document, research_topic, x_poster, concept_generator
+# 読み込みに時間がかかるモジュール（x_poster: requests / tweet_index: numpy / async_pipeline: asyncio）は、
+# 実行するサイクルで必要になったときに関数の中で読み込む。google.genai は llm_gateway が最初の呼び出し時に読み込む。
+from src import from_docx_import_Document, cluster_document, research_topic, concept_generator, knowledge_store, sqlite_store, llm_gateway, outbox, topic_scheduler, structured_output, checkpoint, atomic_io, tracing, model_router
 
 # --- グローバル設定値 ---
 CONCEPT_GENERATION_THRESHOLD = 20 # この投稿数に達したら概念化サイクルを実行
+BATCH_CONCURRENCY = 3 # バッチモードで同時に実行する調査の上限
+OUTBOX_POSTS_PER_RUN = 1 # 1回の実行でアウトボックスから投稿する件数
+OUTBOX_POST_INTERVAL = 60 # アウトボックスから連続投稿する際の間隔（秒）
+# 重複検出の設定
+DUPLICATE_TWEET_THRESHOLD = 0.7 # 過去のツイートとの類似度がこれ以上なら重複とみなす
+MAX_TWEET_REGENERATIONS = 1 # 重複した場合にツイートを作り直す回数（それでも重複なら投稿しない）
+THEME_RECENT_WINDOW = 20 # テーマの偏りを調べる直近のエントリ数
+THEME_REPEAT_LIMIT = 3 # 直近で同じテーマをこの回数以上調査していたら、別のテーマを選ぶ
+# テーマの選び方。least_recent: 最後の調査から最も時間が経ったもの / round_robin: 重み付きラウンドロビン / bandit: エンゲージメントによるバンディット
+TOPIC_STRATEGY = os.getenv("TOPIC_STRATEGY", "least_recent")
+ENGAGEMENT_DELAY_HOURS = 24 # 投稿からこの時間が経ったツイートの反応を、バンディットの報酬として集計する
+# 概念化の方式。full: 短期記憶全体から毎回作り直す / incremental: 前回以降の差分だけを現在の概念に取り込む
+CONCEPT_MODE = os.getenv("CONCEPT_MODE", "full")
+# 概念化サイクルの各ステージの制限時間（秒）
+CONCEPT_STAGE_TIMEOUTS = {
+    "load_recent": 30,
+    "load_docx": 60,
+    "summary": 300,
+    "structure": 180,
+    "summary_structured": 480, # 検証に失敗した場合は、要約とJSON変換の2回の呼び出しに切り替えるため長めにとる
+    "incremental_concept": 600,
+    "combine": 30,
+    "cluster": 300,
+}
 
 # --- ファイルパス定義 ---
 KNOWLEDGE_BASE_PATH = os.path.join(project_root, 'data', 'knowledge_base', '161217-master-Ryo.docx')
@@ -25,98 +52,558 @@ ACTIVITY_CLUSTERS_PATH = os.path.join(project_root, 'data', 'knowledge_base', 'a
 SUMMARY_MD_PATH = os.path.join(project_root, 'data', 'knowledge_base', 'concept_summary.md')
 ALL_KNOWLEDGE_LOG_PATH = os.path.join(project_root, 'data', 'knowledge_base', 'all_knowledge_log.json')
 RECENT_KNOWLEDGE_PATH = os.path.join(project_root, 'data', 'knowledge_base', 'recent_knowledge.json')
+KNOWLEDGE_DB_PATH = os.path.join(project_root, 'data', 'knowledge_base', 'knowledge.db') # gitで管理せず、JSONファイル群から作り直す
+TOPIC_STATE_PATH = os.path.join(project_root, 'data', 'knowledge_base', 'topic_state.json')
+OUTBOX_PATH = os.path.join(project_root, 'data', 'outbox.jsonl')
+OUTBOX_RATE_LIMIT_PATH = os.path.join(project_root, 'data', 'outbox_rate_limit.json')
+CONCEPT_STATE_PATH = os.path.join(project_root, 'data', 'knowledge_base', 'concept_state.json')
+CONCEPT_HISTORY_PATH = os.path.join(project_root, 'data', 'knowledge_base', 'concept_history.jsonl')
+TWEET_INDEX_PATH = os.path.join(project_root, 'data', 'knowledge_base', 'tweet_index.npy')
+TOKEN_METRICS_PATH = os.path.join(project_root, 'data', 'metrics', 'token_usage.jsonl')
+TRACE_PATH = os.path.join(project_root, 'data', 'metrics', 'trace.jsonl') # BOT_TRACE=1 のときだけ書き出す
+CONCEPT_CHECKPOINT_DIR = os.path.join(project_root, 'data', 'checkpoints', 'conceptualize')
+
+# 常駐モード（src/daemon.py）で、読み込んだ状態をサイクルをまたいで使い回すための保持先（Noneなら毎回読み込む）
+_resident_state: dict | None = None
+
+def get_knowledge_db() -> sqlite_store.SQLiteKnowledgeStore:
+    """
+    知識DBを開く。初回（DBが空）のみ既存のJSONファイル群から取り込む。
+    常駐モードでは開いた接続を使い回す（with を抜けても閉じず、close_resident_state() で閉じる）。
+    """
+    if _resident_state is not None:
+        db = _resident_state.get("db")
+        if db is not None and db.db_path == KNOWLEDGE_DB_PATH:
+            return db
+    db = sqlite_store.SQLiteKnowledgeStore(KNOWLEDGE_DB_PATH, keep_open=_resident_state is not None)
+    imported = db.import_json(ALL_KNOWLEDGE_LOG_PATH, RECENT_KNOWLEDGE_PATH, HIGH_LEVEL_CONCEPTS_PATH, ACTIVITY_CLUSTERS_PATH,
+                              TOPIC_STATE_PATH)
+    if imported:
+        print(f"既存のJSONファイルから{imported}件のエントリを知識DBに取り込みました。")
+    if _resident_state is not None:
+        if _resident_state.get("db") is not None:
+            _resident_state["db"].close()
+        _resident_state["db"] = db
+    return db
 
 def get_current_post_count() -> int:
-    """短期記憶（recent_knowledge.json）の投稿数をカウントする"""
+    """短期記憶（最後の概念化以降）の投稿数を知識DBから取得する"""
+    with get_knowledge_db() as db:
+        return db.count_recent()
+
+def get_all_log_store() -> knowledge_store.JournalKnowledgeStore:
+    """長期記憶（all_knowledge_log.json）の追記専用ストアを返す"""
+    return knowledge_store.JournalKnowledgeStore(ALL_KNOWLEDGE_LOG_PATH)
+
+def extract_tweet(research_result_text: str) -> str:
+    """
+    調査結果のテキストからツイート文を取り出す（見つからなければ空文字）。
+    JSONとして読めない場合は、調査をやり直さずにJSONへの整形だけをGeminiに依頼する。
+    """
     try:
-        with open(RECENT_KNOWLEDGE_PATH, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return len(data.get("knowledge_entries", []))
-    except (FileNotFoundError, json.JSONDecodeError):
-        return 0
+        return structured_output.parse(research_result_text, "research")["tweet"]
+    except structured_output.ParseError as e:
+        print(f"警告: 調査結果からツイートを取り出せませんでした: {e}")
+    try:
+        return llm_gateway.repair_json(research_result_text, "research")["tweet"]
+    except Exception as e:
+        print(f"エラー: 調査結果の整形に失敗しました: {e}")
+        return ""
+
+@tracing.traced()
+def save_entries(entries: list[dict]):
+    """
+    エントリを知識DBと、gitで管理しているJSONファイルにまとめて保存する。
+    常駐モードでは、JSONファイルへの書き出しを flush_resident_state() でまとめて行う。
+    """
+    with get_knowledge_db() as db:
+        db.extend(entries)
+        print(f"{len(entries)}件のエントリを知識DB({KNOWLEDGE_DB_PATH})に保存しました。")
+        if _resident_state is None:
+            write_knowledge_files(db, entries)
+        else:
+            _resident_state.setdefault("pending_log", []).extend(entries)
+
+def write_knowledge_files(db: sqlite_store.SQLiteKnowledgeStore, entries: list[dict]) -> None:
+    """短期ログを知識DBから書き出し、長期ログのジャーナルにエントリを追記する"""
+    # 追記に失敗して書き出しをやり直しても、短期ログは上書きなので二重にならない
+    db.export_recent(RECENT_KNOWLEDGE_PATH)
+    print(f"短期ログを {RECENT_KNOWLEDGE_PATH} に保存しました。")
+    # 長期ログはジャーナルへの追記（1回の書き込み）のみ
+    log_store = get_all_log_store()
+    log_store.extend(entries)
+    print(f"長期ログを {log_store.journal_path} に追記しました。")
+
+def flush_knowledge_files() -> None:
+    """常駐モードで書き出しを保留しているエントリを、短期ログと長期ログに書き出す"""
+    entries = _resident_state.get("pending_log") if _resident_state is not None else None
+    if not entries:
+        return
+    with get_knowledge_db() as db:
+        write_knowledge_files(db, entries)
+    del _resident_state["pending_log"]
+
+def load_clusters() -> dict | None:
+    with get_knowledge_db() as db:
+        return db.current_clusters()
+
+@tracing.traced()
+def get_tweet_index() -> "tweet_index.TweetIndex":
+    """
+    過去のツイートの類似検索用インデックスを、知識DBの新しいエントリで更新してから返す。
+    常駐モードでは読み込んだインデックスを使い回し、保存は flush_resident_state() でまとめて行う。
+    """
+    from src import tweet_index
+    if _resident_state is None:
+        index = tweet_index.TweetIndex(TWEET_INDEX_PATH)
+    else:
+        index = _resident_state.get("tweet_index")
+        if index is None or index.index_path != TWEET_INDEX_PATH:
+            index = _resident_state["tweet_index"] = tweet_index.TweetIndex(TWEET_INDEX_PATH)
+    with get_knowledge_db() as db:
+        added = index.sync(db, save=_resident_state is None)
+    if added:
+        print(f"ツイートインデックスに{added}件を追加しました（合計{len(index)}件）。")
+    return index
+
+def get_outbox() -> outbox.Outbox:
+    """アウトボックスを返す。常駐モードでは項目をメモリに保持し、書き出しは flush_resident_state() でまとめて行う"""
+    if _resident_state is None:
+        return outbox.Outbox(OUTBOX_PATH)
+    box = _resident_state.get("outbox")
+    if box is None or box.path != OUTBOX_PATH:
+        box = _resident_state["outbox"] = outbox.Outbox(OUTBOX_PATH, buffered=True)
+    return box
+
+def collect_engagement(db: sqlite_store.SQLiteKnowledgeStore) -> None:
+    """投稿から時間が経ったツイートの反応を取得し、バンディットの報酬として記録する（失敗しても処理は続ける）"""
+    from src import x_poster
+    posted_before = (datetime.now() - timedelta(hours=ENGAGEMENT_DELAY_HOURS)).isoformat()
+    try:
+        collected = topic_scheduler.collect_engagement(db, x_poster.get_poster().fetch_public_metrics, posted_before)
+    except Exception as e:
+        print(f"警告: ツイートの反応を取得できませんでした: {e}")
+        return
+    if collected:
+        print(f"{collected}件のツイートの反応をテーマ選択に反映しました。")
+
+@tracing.traced()
+def select_topics(clusters: list[dict], count: int, index: "tweet_index.TweetIndex") -> list[dict]:
+    """
+    スケジューラ（TOPIC_STRATEGY）の優先順に、調査するテーマをcount件選び、選んだことを記録する。
+    直近で何度も調査しているテーマは、他に候補がある限り後回しにする。
+    """
+    with get_knowledge_db() as db:
+        scheduler = topic_scheduler.get_scheduler(TOPIC_STRATEGY, db)
+        if TOPIC_STRATEGY == "bandit":
+            collect_engagement(db)
+        ranked = scheduler.rank(clusters)
+        fresh, repeated = [], []
+        for topic in ranked:
+            if index.recent_theme_count(topic.get("theme", ""), THEME_RECENT_WINDOW) < THEME_REPEAT_LIMIT:
+                fresh.append(topic)
+            else:
+                print(f"テーマ「{topic.get('theme')}」は直近で{THEME_REPEAT_LIMIT}回以上調査しているため、後回しにします。")
+                repeated.append(topic)
+        selected = (fresh + repeated)[:count]
+        for topic in selected:
+            scheduler.record(topic, clusters)
+        save_topic_state(db)
+    return selected
+
+def save_topic_state(db: sqlite_store.SQLiteKnowledgeStore) -> None:
+    """
+    テーマ選択の状態（theme_stats / posts）を、gitで管理している TOPIC_STATE_PATH に書き出す。
+    常駐モードでは flush_resident_state() でまとめて書き出す。
+    """
+    if _resident_state is not None:
+        _resident_state["topic_state_dirty"] = True
+        return
+    db.export_topic_state(TOPIC_STATE_PATH)
+
+def record_posted(tweet_id: str | None, theme: str | None) -> None:
+    """投稿したツイートのIDを記録する（反応の集計に使う）"""
+    if tweet_id:
+        with get_knowledge_db() as db:
+            db.record_posts([(tweet_id, theme, datetime.now().isoformat())])
+            save_topic_state(db)
 
+def research_unique_tweet(topic: dict, index: "tweet_index.TweetIndex") -> str:
+    """
+    テーマを調査してツイート文を作る。過去のツイートと重複する場合は、重複を避けるよう指示して作り直す。
+    作り直しても重複する場合は空文字を返す（投稿しない）。
+    """
+    avoid_texts = []
+    for _ in range(MAX_TWEET_REGENERATIONS + 1):
+        research_result_text = research_topic.research_and_summarize_with_gemini(topic, avoid_texts=list(avoid_texts))
+        tweet_text = extract_tweet(research_result_text) if research_result_text else ""
+        if not tweet_text:
+            return ""
+        score, similar = index.most_similar(tweet_text)
+        if score < DUPLICATE_TWEET_THRESHOLD:
+            return tweet_text
+        print(f"警告: 過去のツイートと内容が重複しています（類似度{score:.2f}）: {similar[:40]}")
+        if similar not in avoid_texts:
+            avoid_texts.append(similar)
+    print("重複しないツイートを作れなかったため、今回は投稿しません。")
+    return ""
+
+@tracing.traced()
 def run_normal_cycle():
+    from src import x_poster
     print("\n--- 通常サイクルを実行します ---")
-    try:
-        with open(ACTIVITY_CLUSTERS_PATH, 'r', encoding='utf-8') as f:
-            clustered_data = json.load(f)
-    except FileNotFoundError:
+    clustered_data = load_clusters()
+    if not clustered_data:
         print(f"エラー: 活動計画({ACTIVITY_CLUSTERS_PATH})が見つかりません。先に概念化を実行します。")
         run_conceptualize_cycle()
         return
-    selected_topic = random.choice(clustered_data["clusters"])
+    index = get_tweet_index()
+    selected_topic = select_topics(clustered_data["clusters"], 1, index)[0]
     print(f"調査対象テーマ: {selected_topic['theme']}")
-    research_result_text = research_topic.research_and_summarize_with_gemini(selected_topic)
-    match = re.search(r"\{.*\}", research_result_text, re.DOTALL)
-    if not match: return
-    research_json_data = json.loads(match.group(0))
-    tweet_text = research_json_data.get("tweet", "")
+    tweet_text = research_unique_tweet(selected_topic, index)
     if tweet_text:
         entry = { "theme": selected_topic.get('theme'), "tweet": tweet_text, "created_at": datetime.now().isoformat() }
-        # 長期記憶に追記
-        try:
-            with open(ALL_KNOWLEDGE_LOG_PATH, 'r', encoding='utf-8') as f:
-                all_log = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            all_log = {"knowledge_entries": []}
-        all_log["knowledge_entries"].append(entry)
-        with open(ALL_KNOWLEDGE_LOG_PATH, 'w', encoding='utf-8') as f:
-            json.dump(all_log, f, ensure_ascii=False, indent=2)
-        print(f"長期ログを {ALL_KNOWLEDGE_LOG_PATH} に保存しました。")
-        # 短期記憶に追記
-        try:
-            with open(RECENT_KNOWLEDGE_PATH, 'r', encoding='utf-8') as f:
-                recent_log = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            recent_log = {"knowledge_entries": []}
-        recent_log["knowledge_entries"].append(entry)
-        with open(RECENT_KNOWLEDGE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(recent_log, f, ensure_ascii=False, indent=2)
-        print(f"短期ログを {RECENT_KNOWLEDGE_PATH} に保存しました。")
-        x_poster.post_to_x(tweet_text)
+        save_entries([entry])
+        result = x_poster.publish_to_x(tweet_text)
+        if result.headers:
+            record_rate_limit(result)
+        if result.ok:
+            record_posted(result.tweet_id, entry["theme"])
+        elif result.retryable:
+            # 調査済みのツイートを捨てないよう、アウトボックスに積んで後で再試行する（同じ実行の drain_outbox は、
+            # 429のヘッダから記録したリセット時刻まで待つ）
+            get_outbox().enqueue([{"text": tweet_text, "theme": entry["theme"]}])
+            print(f"投稿できなかったツイートをアウトボックス({OUTBOX_PATH})に保存しました。")
+        else:
+            # 重複（403）や認証エラーなど、再試行しても投稿できない失敗はアウトボックスに積まない
+            print(f"再試行しても投稿できないため、アウトボックスには保存しません（{result.error}）。")
     print("通常サイクル完了。")
 
+async def _research_topics(topics: list[dict], concurrency: int) -> list[str | None]:
+    """複数のテーマを同時実行数の上限つきで調査し、テーマの順に調査結果を返す（失敗したものはNone）"""
+    import asyncio
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def research(topic):
+        async with semaphore:
+            try:
+                return await asyncio.to_thread(research_topic.research_and_summarize_with_gemini, topic)
+            except Exception as e:
+                print(f"エラー: テーマ「{topic.get('theme')}」の調査に失敗しました: {e}")
+                return None
+
+    return await asyncio.gather(*(research(topic) for topic in topics))
+
+@tracing.traced()
+def run_batch_cycle(batch_size: int, concurrency: int = BATCH_CONCURRENCY) -> int:
+    """
+    【バッチモード】複数のクラスタを並行して調査し、結果をまとめて保存する。
+    生成したツイートはすぐには投稿せず、アウトボックスに積んで後から少しずつ投稿する。
+    戻り値: 保存したエントリ数
+    """
+    import asyncio
+    from src import tweet_index
+    print(f"\n--- バッチサイクルを実行します（{batch_size}件, 同時実行数{concurrency}） ---")
+    clustered_data = load_clusters()
+    if not clustered_data:
+        print(f"エラー: 活動計画({ACTIVITY_CLUSTERS_PATH})が見つかりません。先に概念化を実行してください。")
+        return 0
+    clusters = clustered_data["clusters"]
+    if batch_size > len(clusters):
+        print(f"警告: クラスタ数({len(clusters)})がバッチ件数を下回るため、{len(clusters)}件のみ調査します。")
+    index = get_tweet_index()
+    topics = select_topics(clusters, batch_size, index)
+    results = asyncio.run(_research_topics(topics, concurrency))
+    accepted_vectors = []
+    entries = []
+    for topic, research_result_text in zip(topics, results):
+        tweet_text = extract_tweet(research_result_text) if research_result_text else ""
+        if not tweet_text:
+            continue
+        # 過去のツイートとも、同じバッチ内の他のツイートとも重複しないものだけを残す
+        vector = tweet_index.embed(tweet_text)
+        score, _ = index.most_similar(tweet_text)
+        score = max([score] + [float(vector @ v) for v in accepted_vectors])
+        if score >= DUPLICATE_TWEET_THRESHOLD:
+            print(f"警告: テーマ「{topic.get('theme')}」のツイートは既存のものと重複するため保存しません（類似度{score:.2f}）。")
+            continue
+        accepted_vectors.append(vector)
+        entries.append({ "theme": topic.get('theme'), "tweet": tweet_text, "created_at": datetime.now().isoformat() })
+    if entries:
+        save_entries(entries)
+        get_outbox().enqueue([{"text": e["tweet"], "theme": e["theme"]} for e in entries])
+        print(f"{len(entries)}件のツイートをアウトボックス({OUTBOX_PATH})に追加しました。")
+    print("バッチサイクル完了。")
+    return len(entries)
+
+@tracing.traced()
+def record_rate_limit(result) -> None:
+    """投稿の応答ヘッダからレート制限の状態を記録し、アウトボックスの投稿間隔に反映させる。"""
+    scheduler = outbox.RateLimitScheduler(OUTBOX_RATE_LIMIT_PATH, min_interval=OUTBOX_POST_INTERVAL)
+    if result.status == 429:
+        scheduler.mark_rate_limited(result.headers, outbox.backoff_delay(1))
+    else:
+        scheduler.update(result.headers)
+
+def drain_outbox(max_posts: int | None = OUTBOX_POSTS_PER_RUN) -> int:
+    """アウトボックスに溜まったツイートを、レート制限に合わせて投稿間隔を空けながら投稿する"""
+    box = get_outbox()
+    if not box.pending():
+        return 0
+    from src import x_poster
+    scheduler = outbox.RateLimitScheduler(OUTBOX_RATE_LIMIT_PATH, min_interval=OUTBOX_POST_INTERVAL)
+    posted = box.drain(x_poster.send_tweet, scheduler, max_posts=max_posts)
+    print(f"アウトボックスから{posted}件投稿しました（残り{len(box.pending())}件）。")
+    if posted:
+        with get_knowledge_db() as db:
+            db.record_posts([(i["tweet_id"], i.get("theme"), i.get("sent_at")) for i in box.sent() if i.get("tweet_id")])
+            save_topic_state(db)
+    return posted
+
+def _require(value, message: str):
+    """ステージの結果が空の場合に、パイプラインを止めるための例外を送出する"""
+    if not value:
+        raise RuntimeError(message)
+    return value
+
+def build_conceptualize_stages() -> list["async_pipeline.Stage"]:
+    """
+    概念化サイクルの依存関係（DAG）を組み立てる。
+    load_recent → summary_structured ─┐
+    load_docx ────────────────────────┴→ combine → cluster
+    docxの読み込みは要約の生成と並行して実行される。
+    要約とJSON変換は1回の呼び出し（summary_structured）で行い、CONCEPT_SUMMARY_MODE が two_call の場合は
+    summary → structure の2つのステージに分ける。
+    summary / structure / combine / cluster の結果は入力のハッシュとともにチェックポイントに保存され、
+    途中で失敗した場合、次回の実行は失敗したステージから再開する。
+    CONCEPT_MODE が incremental の場合は、load_recent → summary_structured の代わりに
+    incremental_concept（前回以降の差分だけを現在の概念に取り込む）を実行する。
+    """
+    from src import async_pipeline
+    def load_recent():
+        return _require(concept_generator.build_knowledge_text(RECENT_KNOWLEDGE_PATH), "分析対象の知識がありません。")
+
+    def summary(knowledge_text):
+        print("ステップA: 新しい高次概念を生成・保存しています...")
+        return _require(concept_generator.summarize_to_file(knowledge_text, SUMMARY_MD_PATH), "論文形式の要約生成に失敗しました。")
+
+    def structure(summary_document):
+        return _require(concept_generator.structure_to_file(summary_document, HIGH_LEVEL_CONCEPTS_PATH), "論文のJSON変換に失敗しました。")
+
+    def summary_structured(knowledge_text):
+        print("ステップA: 新しい高次概念を生成・保存しています...")
+        return _require(
+            concept_generator.summarize_and_structure_to_file(knowledge_text, SUMMARY_MD_PATH, HIGH_LEVEL_CONCEPTS_PATH),
+            "論文形式の要約またはJSON変換に失敗しました。")
+
+    def load_docx():
+        return from_docx_import_Document.read_base_docx_text(KNOWLEDGE_BASE_PATH)
+
+    def combine(base_text, concept_data):
+        return from_docx_import_Document.combine_knowledge_texts(base_text, concept_data)
+
+    def incremental_concept():
+        print("ステップA: 前回以降の知識を現在の概念に取り込んでいます...")
+        with get_knowledge_db() as db:
+            state = concept_generator.load_concept_state(CONCEPT_STATE_PATH, HIGH_LEVEL_CONCEPTS_PATH)
+            # 状態ファイルがない初回は、既存の概念に未反映の短期記憶から始める
+            new_entries = db.entries_after(state["mapped_through_id"] or db.recent_since_id())
+        return _require(
+            concept_generator.update_concept_incrementally(
+                new_entries, CONCEPT_STATE_PATH, CONCEPT_HISTORY_PATH, SUMMARY_MD_PATH, HIGH_LEVEL_CONCEPTS_PATH),
+            "概念の差分更新に失敗しました。")
+
+    def cluster(knowledge_text):
+        print("ステップB: 新しい活動クラスタを生成しています...")
+        return cluster_document.cluster_text(knowledge_text)
+
+    t = CONCEPT_STAGE_TIMEOUTS
+    if CONCEPT_MODE == "incremental":
+        concept_stages = [
+            async_pipeline.Stage("incremental_concept", incremental_concept, timeout=t.get("incremental_concept")),
+        ]
+        concept_stage_name = "incremental_concept"
+    elif concept_generator.SUMMARY_MODE == "single":
+        concept_stages = [
+            async_pipeline.Stage("load_recent", load_recent, timeout=t.get("load_recent")),
+            async_pipeline.Stage("summary_structured", summary_structured, ["load_recent"],
+                                 timeout=t.get("summary_structured"), checkpoint=True),
+        ]
+        concept_stage_name = "summary_structured"
+    else:
+        concept_stages = [
+            async_pipeline.Stage("load_recent", load_recent, timeout=t.get("load_recent")),
+            async_pipeline.Stage("summary", summary, ["load_recent"], timeout=t.get("summary"), checkpoint=True),
+            async_pipeline.Stage("structure", structure, ["summary"], timeout=t.get("structure"), checkpoint=True),
+        ]
+        concept_stage_name = "structure"
+    return concept_stages + [
+        async_pipeline.Stage("load_docx", load_docx, timeout=t.get("load_docx")),
+        async_pipeline.Stage("combine", combine, ["load_docx", concept_stage_name], timeout=t.get("combine"),
+                             checkpoint=True),
+        async_pipeline.Stage("cluster", cluster, ["combine"], timeout=t.get("cluster"), checkpoint=True),
+    ]
+
+async def run_conceptualize_cycle_async() -> dict:
+    """概念化サイクルの各ステージを依存関係に従って並行実行し、ステージごとの結果を返す"""
+    from src import async_pipeline
+    return await async_pipeline.run_dag(build_conceptualize_stages(), checkpoint.CheckpointStore(CONCEPT_CHECKPOINT_DIR))
+
+@tracing.traced()
 def run_conceptualize_cycle():
+    import asyncio
+    from src import async_pipeline
     print(f"\n--- 概念化サイクルを実行します ---")
-    # ステップA: 高次概念の生成と保存
-    print("ステップA: 新しい高次概念を生成・保存しています...")
-    new_concept_data = concept_generator.generate_new_concept(RECENT_KNOWLEDGE_PATH, SUMMARY_MD_PATH, HIGH_LEVEL_CONCEPTS_PATH)
-    if not new_concept_data:
-        print("エラー: 高次概念の生成に失敗したため、概念化サイクルを中断します。\nエラーが発生したため、処理を異常終了します。")
+    # 短期ログ（recent_knowledge.json）から概念化するため、常駐モードで保留している書き出しを先に行う
+    flush_knowledge_files()
+    try:
+        results = asyncio.run(run_conceptualize_cycle_async())
+    except async_pipeline.StageError as e:
+        print(f"エラー: {e}\n概念化サイクルを中断します。エラーが発生したため、処理を異常終了します。")
+        print(f"完了したステージの結果は {CONCEPT_CHECKPOINT_DIR} に保存されており、次回はその続きから再開します。")
         sys.exit(1)
-    # ステップB: 全知識の統合と再クラスタリング
-    print("ステップB: 新しい活動クラスタを生成しています...")
-    knowledge_text = from_docx_import_Document.get_combined_knowledge_text(KNOWLEDGE_BASE_PATH, HIGH_LEVEL_CONCEPTS_PATH)
-    new_clusters_json_text = cluster_document.get_clustered_json_from_gemini(knowledge_text)
-    json_str = new_clusters_json_text.strip().lstrip("```json").rstrip("```")
-    new_clusters_data = json.loads(json_str)
-    with open(ACTIVITY_CLUSTERS_PATH, 'w', encoding='utf-8') as f:
-        json.dump(new_clusters_data, f, ensure_ascii=False, indent=2)
+    new_concept_data = (results.get("summary_structured") or results.get("structure")
+                        or results.get("incremental_concept"))
+    new_clusters_data = results["cluster"]
+    atomic_io.write_json(ACTIVITY_CLUSTERS_PATH, new_clusters_data)
+    with get_knowledge_db() as db:
+        db.add_concept(new_concept_data)
+        db.replace_clusters(new_clusters_data)
     print(f"新しい活動クラスタを {ACTIVITY_CLUSTERS_PATH} に保存しました。")
+    # サイクルが完了したので、途中経過のチェックポイントは不要
+    checkpoint.CheckpointStore(CONCEPT_CHECKPOINT_DIR).clear()
     print("概念化サイクル完了。")
 
-def main():
-    """このボットのメインコントローラー（1実行1アクションモデル）"""
-    print(f"======== ボット処理開始 ({datetime.now()}) ========")
-    
+def enable_resident_state() -> None:
+    """読み込んだ状態をメモリに保持し、次のサイクルで使い回すようにする（常駐モード用）。"""
+    global _resident_state
+    if _resident_state is None:
+        _resident_state = {}
+
+def flush_resident_state() -> None:
+    """
+    メモリに保持している状態のうち、保存していない変更をディスクに書き出す。
+    （ツイートインデックス・短期ログと長期ログ・テーマ選択の状態・アウトボックス・モデルごとの記録。知識DBは書き込みごとにコミット済み）
+    """
+    if _resident_state is None:
+        return
+    index = _resident_state.get("tweet_index")
+    if index is not None and index.dirty:
+        index.save()
+        print(f"ツイートインデックス（{len(index)}件）を {index.index_path} に保存しました。")
+    flush_knowledge_files()
+    if _resident_state.pop("topic_state_dirty", False):
+        with get_knowledge_db() as db:
+            db.export_topic_state(TOPIC_STATE_PATH)
+    box = _resident_state.get("outbox")
+    if box is not None and box.flush():
+        print(f"アウトボックスを {box.path} に保存しました。")
+    model_router.save_stats()
+
+def close_resident_state() -> None:
+    """常駐モードを終え、使い回していた知識DBの接続を閉じる（保存は flush_resident_state() で済ませておく）。"""
+    global _resident_state
+    if _resident_state is None:
+        return
+    db = _resident_state.get("db")
+    if db is not None:
+        db.close()
+    _resident_state = None
+
+def report_x_stats() -> None:
+    """Xに接続した実行でだけ、投稿リクエストの統計を表示する（投稿しない実行で x_poster を読み込まないため）"""
+    if "src.x_poster" in sys.modules:
+        sys.modules["src.x_poster"].report_stats()
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="自己成長型X投稿ボット")
+    parser.add_argument("--batch", type=int, metavar="N", help="N件のクラスタをまとめて調査し、アウトボックスに積む")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="バッチモードの同時実行数")
+    parser.add_argument("--drain", action="store_true", help="アウトボックスの投稿待ちをすべて投稿する")
+    parser.add_argument("--daemon", action="store_true", help="常駐し、一定間隔でサイクルを実行する（SIGTERMで終了）")
+    parser.add_argument("--interval", type=float, default=3600, help="常駐モードでサイクルを実行する間隔（秒）")
+    parser.add_argument("--flush-every", type=int, default=6, help="常駐モードで、何サイクルごとにgitへコミットするか")
+    parser.add_argument("--git-push", action="store_true", help="常駐モードで、data/ の変更をコミットしてpushする")
+    return parser.parse_args(argv)
+
+def run_scheduled_cycle() -> str:
+    """
+    記録済みの投稿数に応じて、通常サイクルか概念化サイクルのどちらか「一つだけ」を実行し、
+    アウトボックスに溜まったツイートを投稿する。実行したサイクルの名前を返す。
+    """
     # 1. 現在の記録済み投稿数を取得
     post_count = get_current_post_count()
     print(f"現在の記録済み投稿数: {post_count}")
 
     # 2. 条件に応じて、どちらか「一つだけ」のサイクルを実行
-    if post_count >= CONCEPT_GENERATION_THRESHOLD:
+    if llm_gateway.circuit_open():
+        # Geminiが不調と判断している間は、再試行で実行時間を使い切らないよう、調査・概念化を行わない
+        print(">>> Geminiが不調のため、今回は調査・概念化を行いません（アウトボックスの投稿のみ行います）。")
+        run_name = "skipped"
+    elif post_count >= CONCEPT_GENERATION_THRESHOLD:
         print(f">>> 投稿数が閾値({CONCEPT_GENERATION_THRESHOLD})に達しました。")
+        run_name = "conceptualize"
         run_conceptualize_cycle()
         # 概念化後に短期記憶をリセット
-        with open(RECENT_KNOWLEDGE_PATH, 'w') as f:
-             json.dump({"knowledge_entries": []}, f)
+        with get_knowledge_db() as db:
+            db.reset_recent()
+            db.export_recent(RECENT_KNOWLEDGE_PATH)
         print("短期記憶（recent_knowledge.json）をリセットしました。")
+        # 長期記憶のジャーナルをスナップショットに統合
+        merged = get_all_log_store().compact()
+        print(f"長期ログのジャーナル{merged}件を {ALL_KNOWLEDGE_LOG_PATH} に統合しました。")
     else:
         print(">>> 通常サイクルを実行します。")
+        run_name = "normal"
         run_normal_cycle()
-        
+
+    # バッチモードで積まれたツイートがあれば、少しずつ投稿する
+    drain_outbox()
+    return run_name
+
+def report_run(run_name: str) -> None:
+    """今回の実行のレイテンシ・トークン数・処理時間・Xへの接続状況を表示し、記録する。"""
+    llm_gateway.report_latency()
+    llm_gateway.write_token_metrics(TOKEN_METRICS_PATH, run_name=run_name)
+    if _resident_state is None:
+        # 常駐モードでは flush_resident_state() でまとめて保存する
+        model_router.save_stats()
+    tracing.write_run(TRACE_PATH, run_name=run_name)
+    report_x_stats()
+
+def main(argv: list[str] | None = None):
+    """このボットのメインコントローラー（1実行1アクションモデル）"""
+    args = parse_args(argv or [])
+    if args.daemon:
+        from src import daemon
+        enable_resident_state()
+        try:
+            daemon.run(run_scheduled_cycle, args.interval, args.flush_every, args.git_push,
+                       report=report_run, save_state=flush_resident_state)
+        finally:
+            close_resident_state()
+        return
+    print(f"======== ボット処理開始 ({datetime.now()}) ========")
+
+    if args.batch:
+        run_batch_cycle(args.batch, args.concurrency)
+        llm_gateway.report_latency()
+        llm_gateway.write_token_metrics(TOKEN_METRICS_PATH, run_name="batch")
+        model_router.save_stats()
+        tracing.write_run(TRACE_PATH, run_name="batch")
+        print(f"======== 今回の処理は完了しました ({datetime.now()}) ========\n")
+        return
+    if args.drain:
+        drain_outbox(max_posts=None)
+        report_x_stats()
+        tracing.write_run(TRACE_PATH, run_name="drain")
+        print(f"======== 今回の処理は完了しました ({datetime.now()}) ========\n")
+        return
+
+    run_name = run_scheduled_cycle()
+    report_run(run_name)
     print(f"======== 今回の処理は完了しました ({datetime.now()}) ========\n")
 
 # このファイルが直接実行された時だけmain()を呼び出す
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(sys.argv[1:])
\ No newline at end of file
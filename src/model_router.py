@@ -0,0 +1,137 @@
+# src/model_router.py
+import os
+import threading
+from datetime import datetime
+
+from src import atomic_io, resilience
+
+# モデルの段階ごとの候補。先頭から順に試し、呼び出せなかった場合（モデルの廃止・一時的なエラー）は次のモデルに切り替える
+#   deep: 検索を使う調査・長文の要約など、品質を優先する処理
+#   standard: クラスタリング・概念マップなど、中程度の処理
+#   fast: JSONへの整形など、短く機械的な処理（記録したレイテンシの短い順に試す）
+TIERS = {
+    "deep": ["gemini-2.0-flash-exp", "gemini-2.0-flash"],
+    "standard": ["gemini-2.0-flash", "gemini-2.0-flash-lite"],
+    "fast": ["gemini-2.0-flash-lite", "gemini-2.0-flash"],
+}
+# 環境変数（LLM_MODELS_DEEP="model-a,model-b" など）で段階ごとの候補を差し替えられる
+for _tier in TIERS:
+    if os.getenv(f"LLM_MODELS_{_tier.upper()}"):
+        TIERS[_tier] = [m.strip() for m in os.environ[f"LLM_MODELS_{_tier.upper()}"].split(",") if m.strip()]
+
+# 呼び出し元ごとのモデルの段階
+ROUTES = {
+    "research": "deep",
+    "summary": "deep",
+    "summary_structured": "deep",
+    "structure": "fast",
+    "cluster": "standard",
+    "cluster_reduce": "fast",
+    "concept_map": "standard",
+    "concept_fold": "standard",
+    "json_repair": "fast",
+}
+DEFAULT_TIER = "standard"
+# standard の処理でも、プロンプトがこれ以下でツールを使わない場合は fast の段階で処理する
+SHORT_PROMPT_TOKENS = 2_000
+# モデルごとの記録（指数移動平均）で、新しい呼び出しの重み
+EWMA_ALPHA = 0.2
+# 成功率がこれを下回ったモデルは、段階の候補の最後に回す
+MIN_SUCCESS_RATE = 0.5
+STATS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'metrics', 'model_stats.json')
+
+# モデルごとのレイテンシと成功率（実行をまたいで STATS_PATH に保存する）
+_stats: dict[str, dict] | None = None
+_stats_lock = threading.Lock()
+_dirty = False
+
+
+def _load_stats() -> dict[str, dict]:
+    global _stats
+    if _stats is None:
+        try:
+            saved = atomic_io.read_json(STATS_PATH)
+        except atomic_io.CorruptFileError as e:
+            # 記録は失っても設定の順に試せばよいため、処理は止めない
+            print(f"警告: {e}")
+            saved = None
+        _stats = (saved or {}).get("models", {})
+    return _stats
+
+
+def tier_for(call_site: str, prompt_tokens: int = 0, uses_tools: bool = False) -> str:
+    """呼び出し元とプロンプトの長さから、使うモデルの段階を決める。"""
+    tier = ROUTES.get(call_site, DEFAULT_TIER)
+    if tier == "standard" and not uses_tools and 0 < prompt_tokens <= SHORT_PROMPT_TOKENS:
+        return "fast"
+    return tier
+
+
+def candidates(call_site: str, prompt_tokens: int = 0, uses_tools: bool = False) -> list[str]:
+    """
+    呼び出し元に使うモデルを、試す順に返す。
+    成功率の低いモデルは最後に回し、fast の段階では記録したレイテンシの短い順に並べる（記録のないモデルは設定の順）。
+    """
+    tier = tier_for(call_site, prompt_tokens, uses_tools)
+    models = list(TIERS[tier])
+    with _stats_lock:
+        stats = _load_stats()
+
+        def order(indexed):
+            index, model = indexed
+            s = stats.get(model)
+            unhealthy = s is not None and s["success_rate"] < MIN_SUCCESS_RATE
+            latency = s["avg_seconds"] if tier == "fast" and s and s.get("avg_seconds") is not None else None
+            return (unhealthy, latency is None, latency or 0.0, index)
+
+        return [model for _, model in sorted(enumerate(models), key=order)]
+
+
+def should_fallback(error: BaseException) -> bool:
+    """次の候補のモデルに切り替えるべきエラーか（一時的なエラーと、モデルが見つからない・使えない場合）。"""
+    if isinstance(error, resilience.CircuitOpenError):
+        return False
+    return resilience.is_transient(error) or resilience.status_code(error) in (403, 404)
+
+
+def record(model: str, seconds: float, ok: bool) -> None:
+    """APIを実際に呼び出した結果（キャッシュ応答を除く）を、モデルごとの記録に反映する。"""
+    global _dirty
+    with _stats_lock:
+        stats = _load_stats()
+        s = stats.get(model)
+        if s is None:
+            s = stats[model] = {"calls": 0, "failures": 0, "success_rate": 1.0 if ok else 0.0, "avg_seconds": None}
+        s["calls"] += 1
+        s["failures"] += 0 if ok else 1
+        s["success_rate"] = round((1 - EWMA_ALPHA) * s["success_rate"] + EWMA_ALPHA * (1.0 if ok else 0.0), 4)
+        if ok:
+            # 失敗した呼び出しの時間（タイムアウトまでの待ちなど）は、モデルの速さとして扱わない
+            avg = s["avg_seconds"]
+            s["avg_seconds"] = round(seconds if avg is None else (1 - EWMA_ALPHA) * avg + EWMA_ALPHA * seconds, 4)
+        _dirty = True
+
+
+def get_stats() -> dict[str, dict]:
+    """モデルごとの記録（呼び出し回数・失敗回数・成功率・平均レイテンシ）を返す。"""
+    with _stats_lock:
+        return {model: dict(s) for model, s in _load_stats().items()}
+
+
+def save_stats(path: str | None = None) -> bool:
+    """モデルごとの記録を保存する（変更がなければ何もしない）。保存した場合は True を返す。"""
+    global _dirty
+    with _stats_lock:
+        if not _dirty:
+            return False
+        atomic_io.write_json(path or STATS_PATH, {"updated_at": datetime.now().isoformat(), "models": _load_stats()})
+        _dirty = False
+    return True
+
+
+def reset_stats(stats: dict[str, dict] | None = None) -> None:
+    """モデルごとの記録を差し替える（テスト用）。Noneを渡すと次回参照時に STATS_PATH から読み込む。"""
+    global _stats, _dirty
+    with _stats_lock:
+        _stats = stats
+        _dirty = False
@@ -0,0 +1,285 @@
+# src/outbox.py
+import os
+import sys
+import json
+import time
+import hashlib
+from datetime import datetime
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+from src import atomic_io, resilience
+
+DEFAULT_OUTBOX_PATH = os.path.join(project_root, 'data', 'outbox.jsonl')
+
+# --- 再試行の設定 ---
+MAX_ATTEMPTS = 5 # 一時的なエラーで再試行する最大回数
+BACKOFF_BASE = 30 # バックオフの基準秒数
+BACKOFF_CAP = 3600 # バックオフの上限秒数
+SENT_HISTORY_LIMIT = 500 # 二重投稿防止のために残しておく投稿済み件数
+
+
+def idempotency_key(text: str) -> str:
+    """ツイート本文から冪等キーを作る。同じ本文は同じキーになる。"""
+    return hashlib.sha256(text.strip().encode('utf-8')).hexdigest()
+
+
+def backoff_delay(attempt: int, base: float = BACKOFF_BASE, cap: float = BACKOFF_CAP) -> float:
+    """指数バックオフ + ジッター（Full Jitter方式）の待機秒数を返す。"""
+    return resilience.backoff_delay(attempt, base, cap)
+
+
+class RateLimitScheduler:
+    """
+    X APIのレスポンスヘッダ（x-rate-limit-remaining / x-rate-limit-reset）から、次の投稿までの待機時間を決める。
+    残り回数をリセット時刻までの時間に均等に割り振り、枠を使い切らないように投稿間隔を空ける。
+    状態はファイルに保存し、次回の実行に引き継ぐ。
+    """
+
+    def __init__(self, state_path: str | None = None, min_interval: float = 0.0):
+        self.state_path = state_path
+        self.min_interval = min_interval
+        self.remaining = None
+        self.reset_at = None
+        self._load()
+
+    def _load(self) -> None:
+        if not self.state_path:
+            return
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        self.remaining = state.get("remaining")
+        self.reset_at = state.get("reset_at")
+
+    def _save(self) -> None:
+        if not self.state_path:
+            return
+        atomic_io.write_json(self.state_path, {"remaining": self.remaining, "reset_at": self.reset_at}, indent=None)
+
+    def update(self, headers) -> None:
+        """レスポンスヘッダからレート制限の状態を更新する。"""
+        remaining = headers.get("x-rate-limit-remaining")
+        reset = headers.get("x-rate-limit-reset")
+        if remaining is not None:
+            self.remaining = int(remaining)
+        if reset is not None:
+            self.reset_at = float(reset)
+        self._save()
+
+    def mark_rate_limited(self, headers, fallback: float) -> None:
+        """
+        429応答のヘッダから、投稿を再開できる時刻を記録する。
+        x-rate-limit-reset（UNIX時刻）、retry-after（秒数）の順に使い、どちらもなければ fallback 秒後とする。
+        """
+        self.update(headers)
+        if headers.get("x-rate-limit-reset") is None:
+            try:
+                retry_after = float(headers.get("retry-after"))
+            except (TypeError, ValueError):
+                retry_after = fallback
+            self.reset_at = time.time() + retry_after
+        self.remaining = 0
+        self._save()
+
+    def delay(self, now: float | None = None) -> float:
+        """次の投稿まで待つべき秒数を返す。"""
+        now = time.time() if now is None else now
+        if self.reset_at is None or self.remaining is None or now >= self.reset_at:
+            return self.min_interval
+        window = self.reset_at - now
+        if self.remaining <= 0:
+            return window
+        return max(self.min_interval, window / self.remaining)
+
+
+class Outbox:
+    """
+    投稿待ちツイートの永続キュー。JSON Lines形式で1行1件をディスクに保存する。
+    各項目は冪等キーを持ち、同じキーの項目は二度投稿しない。
+    状態: pending（投稿待ち）→ sending（投稿中）→ sent（投稿済み） / failed（恒久的な失敗）
+    buffered=True（常駐モード用）の場合は、読み込んだ項目をメモリに保持して変更を flush() でまとめて書き出す。
+    書き出す前にプロセスが落ちると「投稿中」の記録が残らないが、再投稿はX側で重複として拒否され、投稿済みとして扱われる。
+    """
+
+    def __init__(self, path: str = DEFAULT_OUTBOX_PATH, buffered: bool = False):
+        self.path = path
+        self.buffered = buffered
+        self._items: list[dict] | None = None # buffered の場合に保持している項目
+        self.dirty = False
+
+    def _load(self) -> list[dict]:
+        if not self.buffered:
+            return self._read()
+        if self._items is None:
+            self._items = self._read()
+        return self._items
+
+    def _read(self) -> list[dict]:
+        items = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        try:
+                            items.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            print(f"警告: アウトボックスの壊れた行をスキップしました ({self.path})")
+        except FileNotFoundError:
+            pass
+        return items
+
+    def _save(self, items: list[dict]) -> None:
+        if self.buffered:
+            self._items = items
+            self.dirty = True
+            return
+        self._write(items)
+
+    def _write(self, items: list[dict]) -> list[dict]:
+        """項目をファイルに書き出し、書き出した項目を返す。"""
+        with atomic_io.file_lock(self.path):
+            # 読み込んだ後に他のプロセスが追加した項目を失わないよう、ロックの中で読み直して残す
+            known = {item.get("key") for item in items}
+            items = items + [item for item in self._read() if item.get("key") not in known]
+            # 投稿済みの項目は、二重投稿の判定に必要な直近分だけ残す
+            sent = [i for i in items if i.get("status") == "sent"]
+            drop = {id(i) for i in sent[:-SENT_HISTORY_LIMIT]} if len(sent) > SENT_HISTORY_LIMIT else set()
+            items = [item for item in items if id(item) not in drop]
+            with atomic_io.atomic_open(self.path) as f:
+                for item in items:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+        return items
+
+    def flush(self) -> bool:
+        """buffered の場合に、メモリ上の変更をファイルに書き出す。書き出した場合は True を返す。"""
+        if not self.dirty:
+            return False
+        self._items = self._write(self._items)
+        self.dirty = False
+        return True
+
+    def enqueue(self, items: list[dict]) -> int:
+        """
+        ツイートをまとめてキューに追加し、追加した件数を返す。
+        items: {"text": ..., "theme": ...} のリスト。既に同じ冪等キーの項目があるものは追加しない。
+        """
+        if self.buffered:
+            new_items = self._new_items(self._load(), items)
+            if new_items:
+                self._save(self._items + new_items)
+            return len(new_items)
+        # 重複の確認から追記までをロックの中で行い、同時に追加された同じツイートを二重に積まない
+        with atomic_io.file_lock(self.path):
+            new_items = self._new_items(self._read(), items)
+            atomic_io.append_lines(self.path, [json.dumps(item, ensure_ascii=False) for item in new_items])
+        return len(new_items)
+
+    def _new_items(self, existing: list[dict], items: list[dict]) -> list[dict]:
+        """既存の項目と冪等キーが重複しないものだけを、キューの項目にして返す。"""
+        now = datetime.now().isoformat()
+        known = {item.get("key") for item in existing}
+        new_items = []
+        for item in items:
+            key = item.get("key") or idempotency_key(item["text"])
+            if key in known:
+                continue
+            known.add(key)
+            new_items.append({"key": key, "status": "pending", "attempts": 0, "queued_at": now, **item})
+        return new_items
+
+    def pending(self) -> list[dict]:
+        """投稿待ち（前回の実行で投稿中のまま中断したものを含む）の項目を返す。"""
+        return [item for item in self._load() if item.get("status") in ("pending", "sending")]
+
+    def sent(self) -> list[dict]:
+        """投稿済みとして残している項目（直近 SENT_HISTORY_LIMIT 件まで）を返す。"""
+        return [item for item in self._load() if item.get("status") == "sent"]
+
+    def drain(self, send_func, scheduler: RateLimitScheduler | None = None, max_posts: int | None = None,
+              max_wait: float = 300.0, sleep=time.sleep) -> int:
+        """
+        投稿待ちのツイートを古い順に投稿し、投稿できた件数を返す。
+        send_func: テキストを受け取り、status_code / headers / text を持つレスポンスを返す関数
+        scheduler: レート制限に合わせて投稿間隔を決めるスケジューラ
+        max_wait: 1回の待機がこの秒数を超える場合は、残りを次回の実行に回す
+        """
+        scheduler = scheduler or RateLimitScheduler()
+        items = self._load()
+        posted = 0
+        for item in items:
+            if item.get("status") not in ("pending", "sending"):
+                continue
+            if max_posts is not None and posted >= max_posts:
+                break
+            now = time.time()
+            if item.get("next_attempt_at", 0) > now:
+                continue
+            wait = scheduler.delay(now) if posted or scheduler.remaining == 0 else 0
+            if wait > max_wait:
+                print(f"レート制限のため、残りの投稿は次回に回します（{wait:.0f}秒待ちが必要）。")
+                break
+            if wait > 0:
+                sleep(wait)
+
+            # 投稿前に「投稿中」を記録しておき、中断後の再実行でも状態が分かるようにする
+            item["status"] = "sending"
+            item["attempts"] = item.get("attempts", 0) + 1
+            self._save(items)
+            try:
+                response = send_func(item["text"])
+            except Exception as e:
+                print(f"エラー: アウトボックスからの投稿中にエラーが発生しました: {e}")
+                self._schedule_retry(item)
+                self._save(items)
+                continue
+
+            if response.status_code == 429:
+                scheduler.mark_rate_limited(response.headers, backoff_delay(item["attempts"]))
+            else:
+                scheduler.update(response.headers)
+            if response.status_code == 201:
+                item["status"] = "sent"
+                item["sent_at"] = datetime.now().isoformat()
+                try:
+                    item["tweet_id"] = response.json().get("data", {}).get("id")
+                except ValueError:
+                    pass
+                posted += 1
+            elif response.status_code == 403 and "duplicate" in response.text.lower():
+                # 中断前に投稿済みだった場合など、X側で重複と判定されたものは投稿済みとして扱う
+                print(f"警告: 重複投稿として拒否されたため、投稿済みとして扱います: {item['text'][:30]}")
+                item["status"] = "sent"
+                item["sent_at"] = datetime.now().isoformat()
+            elif response.status_code == 429:
+                item["status"] = "pending"
+                item["next_attempt_at"] = scheduler.reset_at
+                print("警告: X APIのレート制限に達しました。リセット後に再試行します。")
+                self._save(items)
+                break
+            elif 400 <= response.status_code < 500:
+                item["status"] = "failed"
+                item["error"] = f"{response.status_code} {response.text[:200]}"
+                print(f"エラー: 投稿が拒否されました（再試行しません）: {item['error']}")
+            else:
+                print(f"エラー: Xへの投稿に失敗しました: {response.status_code}")
+                self._schedule_retry(item)
+            self._save(items)
+        return posted
+
+    def _schedule_retry(self, item: dict) -> None:
+        """一時的な失敗の後、バックオフ + ジッターで次の試行時刻を決める。"""
+        if item["attempts"] >= MAX_ATTEMPTS:
+            item["status"] = "failed"
+            print(f"エラー: 最大再試行回数に達したため、投稿を諦めます: {item['text'][:30]}")
+            return
+        item["status"] = "pending"
+        item["next_attempt_at"] = time.time() + backoff_delay(item["attempts"])
+
+
+if __name__ == "__main__":
+    # 使い方: python src/outbox.py  （投稿待ちの件数を表示）
+    outbox = Outbox(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_OUTBOX_PATH)
+    print(f"投稿待ち: {len(outbox.pending())}件")
@@ -1,16 +1,12 @@
 # src/cluster_document.py
-import re
 import json
 import random
 import os
 from datetime import datetime
-from google import genai
 import sys
-import time # ★変更点1: timeモジュールをインポート
-from google.genai.errors import ServerError # ★変更点2: ServerErrorをインポート
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-import config
+from src import llm_gateway, structured_output, atomic_io, tracing
 
 def load_json_file(file_path: str) -> dict:
     """JSONファイルを読み込み、Pythonの辞書として返す。"""
@@ -20,20 +16,13 @@ def load_json_file(file_path: str) -> dict:
     with open(file_path, 'r', encoding='utf-8') as f:
         return json.load(f)
 
-# ★★★ ここから関数を丸ごと変更 ★★★
-def research_and_summarize_with_gemini(topic_data: dict):
+@tracing.traced("research")
+def research_and_summarize_with_gemini(topic_data: dict, avoid_texts: list[str] | None = None):
     """
     指定されたトピックについて、GeminiのGoogle Search機能で調査し、要約を生成する。
-    503エラーなどのサーバーエラーが発生した場合、自動でリトライする。
+    503エラーなどのサーバーエラーやレート制限は、llm_gateway が自動で再試行する（Geminiが不調な間は呼び出さない）。
+    avoid_texts: 内容が重複しないようにしたい過去のツイート（重複したツイートを作り直す場合に指定）
     """
-    api_key = config.GEMINI_API_KEY
-    client = genai.Client(api_key=api_key)
-    
-    research_model = client.chats.create(
-        model='gemini-2.0-flash-exp',
-        config={'tools': [{'google_search': {}}]}
-    )
-
     theme = topic_data['theme']
     keywords = ", ".join(topic_data['keywords'])
 
@@ -60,53 +49,34 @@ def research_and_summarize_with_gemini(topic_data: dict):
     "tweet": "(X投稿用の100字程度の要約。あおる表現は使わず丁寧語ですます調。アンケート調査の話題は含めない。ハッシュタグは不要。)"
     }}
     """
+    if avoid_texts:
+        avoid_list = "\n".join(f"    - {t}" for t in avoid_texts)
+        prompt += f"""
+    # 注意
+    以下の過去のツイートと内容や言い回しが重複しないよう、別の切り口・具体例を選んでください。
+{avoid_list}
+    """
 
     print("GeminiによるWeb調査と要約を開始します...")
-    
-    # リトライ処理用の設定
-    max_retries = 3
-    retry_delay = 10  # 待機時間（秒）
-
-    # リトライ処理のループ
-    for attempt in range(max_retries):
-        try:
-            print(f"Geminiに問い合わせています... (試行 {attempt + 1}/{max_retries})")
-            response = research_model.send_message(prompt)
-            print("Geminiからの応答を取得しました。")
-            return response.text  # 成功したら結果を返してループを抜ける
-
-        except ServerError as e:
-            print(f"サーバーエラーが発生しました: {e}")
-            if attempt < max_retries - 1:
-                print(f"{retry_delay}秒待機して再試行します。")
-                time.sleep(retry_delay)
-            else:
-                print("最大再試行回数に達しました。処理を中断します。")
-                # 最終的に失敗した場合、エラーを発生させる
-                raise ConnectionError(f"Gemini APIが繰り返し利用不能でした: {e}")
-        
-        except Exception as e:
-            # ServerError以外の予期せぬエラーは即座に中断
-            raise ConnectionError(f"Gemini APIとの通信中に予期せぬエラーが発生しました: {e}")
-            
-# ★★★ ここまでが変更箇所 ★★★
+    # サーバーエラーやレート制限の再試行（バックオフ + ジッター）と、不調時に呼び出しを止める処理は llm_gateway が行う
+    try:
+        response_text = llm_gateway.generate(
+            prompt,
+            generation_config={'tools': [{'google_search': {}}]},
+            call_site="research",
+        )
+    except Exception as e:
+        raise ConnectionError(f"Gemini APIとの通信中にエラーが発生しました: {e}") from e
+    print("Geminiからの応答を取得しました。")
+    return response_text
 
 
 def save_knowledge_as_json(file_path: str, data_to_add: dict):
-    """生成された知識をJSONファイルに追記する。"""
-    if os.path.exists(file_path):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            try:
-                all_data = json.load(f)
-            except json.JSONDecodeError:
-                all_data = {"knowledge_entries": []}
-    else:
-        all_data = {"knowledge_entries": []}
-    
-    all_data["knowledge_entries"].append(data_to_add)
-    
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(all_data, f, ensure_ascii=False, indent=2)
+    """生成された知識をJSONファイルに追記する（壊れたファイルは空として上書きせず、例外を送出する）。"""
+    with atomic_io.file_lock(file_path):
+        all_data = atomic_io.read_json(file_path, {"knowledge_entries": []})
+        all_data["knowledge_entries"].append(data_to_add)
+        atomic_io.write_json(file_path, all_data)
     
     print(f"知識データを {file_path} に保存しました。")
     
@@ -131,12 +101,9 @@ if __name__ == "__main__":
             print(summary_result)
             print("----------------------\n")
 
-            match = re.search(r"```json\s*(\{.*?\})\s*```", summary_result, re.DOTALL)
+            data = structured_output.try_parse(summary_result, "research")
             
-            if match:
-                json_str = match.group(1)
-                data = json.loads(json_str)
-
+            if data:
                 tweet_text = data.get("tweet", "")
                 if tweet_text:
                     print("--- 抽出されたツイート文 ---")
@@ -0,0 +1,240 @@
+# src/resilience.py
+import re
+import time
+import random
+import threading
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+from src import atomic_io, tracing, deadline
+
+# 再試行する一時的なエラーのステータスコード（レート制限・サーバーエラー）
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(ConnectionError):
+    """サーキットブレーカーが開いている（相手のサービスが不調と判断した）ため、呼び出さなかったことを表す。"""
+
+    def __init__(self, name: str, retry_at: float):
+        self.name = name
+        self.retry_at = retry_at
+        super().__init__(f"{name} は不調のため呼び出しを止めています"
+                         f"（{datetime.fromtimestamp(retry_at).strftime('%H:%M:%S')} 以降に再開します）")
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """指数バックオフ + ジッター（Full Jitter方式）の待機秒数を返す。"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def status_code(error: BaseException) -> int | None:
+    """例外からHTTPステータスコードを取り出す（google.genai の APIError は code、requests / httpx はレスポンスに持つ）。"""
+    code = getattr(error, "code", None)
+    if isinstance(code, int):
+        return code
+    code = getattr(getattr(error, "response", None), "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_transient(error: BaseException) -> bool:
+    """再試行すれば成功する見込みのあるエラー（レート制限・サーバーエラー・接続エラー）か。"""
+    if isinstance(error, (CircuitOpenError, deadline.DeadlineExceeded)):
+        return False
+    code = status_code(error)
+    if code is not None:
+        return code in TRANSIENT_STATUS_CODES
+    # requests / httpx の接続エラー・タイムアウトは、それぞれのライブラリの例外クラスになる
+    module = type(error).__module__.split(".")[0]
+    return isinstance(error, (ConnectionError, TimeoutError)) or module in ("httpx", "httpcore", "requests", "urllib3")
+
+
+def retry_after(error: BaseException, now: float | None = None) -> float | None:
+    """
+    サーバーが指定した待機秒数を返す（指定がなければNone）。
+    Retry-After ヘッダ（秒数またはHTTP日付）と、Gemini APIのエラー詳細の RetryInfo（"retryDelay": "30s"）を見る。
+    """
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                now = time.time() if now is None else now
+                return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+            except (TypeError, ValueError):
+                pass
+    match = re.search(r"""['"]retryDelay['"]\s*:\s*['"](\d+(?:\.\d+)?)s['"]""", str(getattr(error, "details", "")))
+    return float(match.group(1)) if match else None
+
+
+class RetryBudget:
+    """
+    1回の実行全体で使える再試行の回数と待機時間の上限。
+    相手が不調なときに、呼び出しのたびに再試行を繰り返して実行時間を使い切らないようにする。
+    """
+
+    def __init__(self, max_retries: int, max_wait: float):
+        self.max_retries = max_retries
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """使った回数と待機時間を0に戻す（常駐モードでサイクルごとに呼ぶ）。"""
+        with self._lock:
+            self.retries = 0
+            self.waited = 0.0
+
+    def try_spend(self, wait: float) -> bool:
+        """再試行を1回、wait 秒の待機とともに使えれば記録して True を返す。"""
+        with self._lock:
+            if self.retries >= self.max_retries or self.waited + wait > self.max_wait:
+                return False
+            self.retries += 1
+            self.waited += wait
+            return True
+
+
+class CircuitBreaker:
+    """
+    連続した失敗が failure_threshold 回に達したら「開いた」状態になり、cooldown 秒の間は呼び出さずに
+    CircuitOpenError を送出する。cooldown が過ぎたら1回だけ試し（半開）、成功すれば閉じ、失敗すれば再び開く。
+    状態はファイルに保存し、次回の実行に引き継ぐ（毎時の実行をまたいで、不調なサービスを呼び続けない）。
+    """
+
+    def __init__(self, name: str, state_path: str | None = None, failure_threshold: int = 2,
+                 cooldown: float = 1800.0):
+        self.name = name
+        self.state_path = state_path
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self.state = {"state": "closed", "failures": 0, "opened_at": None}
+        self._trial_running = False
+        self._load()
+
+    def _load(self) -> None:
+        if not self.state_path:
+            return
+        try:
+            saved = atomic_io.read_json(self.state_path)
+        except atomic_io.CorruptFileError as e:
+            # ブレーカーの状態は失っても閉じた状態から始め直せばよいため、処理は止めない
+            print(f"警告: {e}")
+            saved = None
+        if saved:
+            self.state.update(saved)
+
+    def _save(self) -> None:
+        if self.state_path:
+            atomic_io.write_json(self.state_path, {**self.state, "updated_at": datetime.now().isoformat()})
+
+    def _retry_at(self) -> float:
+        return (self.state["opened_at"] or 0) + self.cooldown
+
+    @property
+    def testing(self) -> bool:
+        """cooldown 後の試しの呼び出し中か（失敗したら再試行せずに、すぐ開いた状態に戻す）。"""
+        return self.state["state"] == "half_open"
+
+    def is_open(self, now: float | None = None) -> bool:
+        """呼び出しを止めている状態（cooldown 中の開いた状態）か。"""
+        now = time.time() if now is None else now
+        return self.state["state"] == "open" and now < self._retry_at()
+
+    def before_call(self, now: float | None = None) -> None:
+        """呼び出してよいか確認し、止めている場合は CircuitOpenError を送出する。"""
+        with self._lock:
+            if self.state["state"] == "closed":
+                return
+            if self.is_open(now) or self._trial_running:
+                raise CircuitOpenError(self.name, self._retry_at())
+            # cooldown が過ぎたので、1回だけ試しに呼び出す（半開）
+            self.state["state"] = "half_open"
+            self._trial_running = True
+            self._save()
+            print(f"[{self.name}] 前回の不調から{self.cooldown:.0f}秒が経ったため、試しに呼び出します。")
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._trial_running = False
+            if self.state["state"] == "closed" and not self.state["failures"]:
+                return
+            self.state.update({"state": "closed", "failures": 0, "opened_at": None})
+            self._save()
+
+    def record_failure(self, now: float | None = None) -> None:
+        with self._lock:
+            self._trial_running = False
+            self.state["failures"] += 1
+            if self.state["state"] == "half_open" or self.state["failures"] >= self.failure_threshold:
+                self.state.update({"state": "open", "opened_at": time.time() if now is None else now})
+                print(f"警告: {self.name} の呼び出しが{self.state['failures']}回続けて失敗したため、"
+                      f"{self.cooldown:.0f}秒間は呼び出しを止めます。")
+            self._save()
+
+
+class RetryPolicy:
+    """
+    一時的なエラーを指数バックオフ + ジッターで再試行する。
+    サーバーが待機時間を指定した場合（Retry-After）はそれに従い、待機時間が max_delay を超える場合や
+    再試行の予算（RetryBudget）を使い切った場合は、待たずに失敗させる。
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 2.0, max_delay: float = 30.0,
+                 budget: RetryBudget | None = None, breaker: CircuitBreaker | None = None, sleep=time.sleep):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+        self.breaker = breaker
+        self.sleep = sleep
+
+    def call(self, func, name: str = ""):
+        """func() を呼び出し、一時的なエラーなら再試行する。最後のエラーはそのまま送出する。"""
+        for attempt in range(self.max_attempts):
+            if self.breaker is not None:
+                self.breaker.before_call()
+            try:
+                result = func()
+            except Exception as e:
+                if deadline.expired():
+                    # ステージの制限時間で打ち切った呼び出しは、相手の不調としては数えない
+                    raise deadline.DeadlineExceeded(f"制限時間を過ぎたため、{name} の呼び出しを打ち切りました") from e
+                if not is_transient(e):
+                    # リクエストの誤りなど、相手が応答できている場合のエラーは、相手が動いているものとして扱う
+                    if self.breaker is not None:
+                        self.breaker.record_success()
+                    raise
+                wait = None if self.breaker is not None and self.breaker.testing else self._next_delay(e, attempt)
+                if wait is None:
+                    if self.breaker is not None:
+                        self.breaker.record_failure()
+                    raise
+                print(f"警告: {name} の呼び出しに失敗しました（{e}）。{wait:.1f}秒待って再試行します"
+                      f"（{attempt + 2}/{self.max_attempts}回目）。")
+                tracing.current().add("retries")
+                self.sleep(wait)
+                continue
+            if self.breaker is not None:
+                self.breaker.record_success()
+            return result
+
+    def _next_delay(self, error: BaseException, attempt: int) -> float | None:
+        """次の試行までの待機秒数（再試行しない場合はNone）"""
+        if attempt + 1 >= self.max_attempts:
+            return None
+        requested = retry_after(error)
+        if requested is not None and requested > self.max_delay:
+            print(f"警告: 待機時間の指定（{requested:.0f}秒）が長いため、再試行しません。")
+            return None
+        wait = requested if requested is not None else backoff_delay(attempt, self.base_delay, self.max_delay)
+        left = deadline.remaining()
+        if left is not None and wait >= left:
+            print("警告: 再試行を待つとステージの制限時間を過ぎるため、再試行しません。")
+            return None
+        if self.budget is not None and not self.budget.try_spend(wait):
+            print("警告: この実行で使える再試行の回数・待機時間を使い切ったため、再試行しません。")
+            return None
+        return wait
@@ -0,0 +1,343 @@
+# src/sqlite_store.py
+import os
+import sys
+import json
+import sqlite3
+from datetime import datetime
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.knowledge_store import KnowledgeStore, JournalKnowledgeStore, load_knowledge_view
+from src import atomic_io
+
+KNOWLEDGE_BASE_DIR = os.path.join(project_root, 'data', 'knowledge_base')
+DEFAULT_DB_PATH = os.path.join(KNOWLEDGE_BASE_DIR, 'knowledge.db')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    theme TEXT,
+    tweet TEXT,
+    created_at TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_created_at ON entries(created_at);
+CREATE INDEX IF NOT EXISTS idx_entries_theme ON entries(theme);
+
+CREATE TABLE IF NOT EXISTS concepts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    concept_name TEXT,
+    created_at TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_concepts_created_at ON concepts(created_at);
+
+CREATE TABLE IF NOT EXISTS clusters (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    generation INTEGER NOT NULL,
+    cluster_id INTEGER,
+    theme TEXT,
+    created_at TEXT NOT NULL,
+    payload TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_clusters_generation ON clusters(generation);
+CREATE INDEX IF NOT EXISTS idx_clusters_theme ON clusters(theme);
+
+CREATE TABLE IF NOT EXISTS theme_stats (
+    theme TEXT PRIMARY KEY,
+    research_count INTEGER NOT NULL DEFAULT 0,
+    last_researched_at TEXT,
+    reward_sum REAL NOT NULL DEFAULT 0,
+    reward_count INTEGER NOT NULL DEFAULT 0,
+    wrr_current REAL NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS posts (
+    tweet_id TEXT PRIMARY KEY,
+    theme TEXT,
+    posted_at TEXT NOT NULL,
+    rewarded INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_posts_rewarded ON posts(rewarded, posted_at);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+
+class SQLiteKnowledgeStore(KnowledgeStore):
+    """
+    SQLiteによる知識ストア。投稿エントリ・高次概念・活動クラスタをテーブルで管理する。
+    短期記憶（recent）は独立したファイルではなく、「最後の概念化以降のエントリ」として
+    metaテーブルの境界ID（recent_since_id）から求める。
+    keep_open=True（常駐モード用）の場合は、with を抜けても接続を閉じず、スレッドをまたいで使い回す（close() で閉じる）。
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, keep_open: bool = False):
+        self.db_path = db_path
+        self.keep_open = keep_open
+        self.conn = sqlite3.connect(db_path, check_same_thread=not keep_open)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.keep_open:
+            self.close()
+
+    # --- meta ---
+    def _get_meta(self, key: str, default: int = 0) -> int:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return int(row["value"]) if row else default
+
+    def _set_meta(self, key: str, value: int) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
+
+    # --- entries ---
+    def append(self, entry: dict) -> None:
+        self.extend([entry])
+
+    def extend(self, entries: list[dict]) -> None:
+        """エントリを1トランザクションでまとめて追加する。"""
+        rows = [
+            (e.get("theme"), e.get("tweet") or e.get("generated_tweet"),
+             e.get("created_at") or datetime.now().isoformat(), json.dumps(e, ensure_ascii=False))
+            for e in entries
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO entries (theme, tweet, created_at, payload) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def _rows_to_entries(self, rows) -> list[dict]:
+        return [json.loads(row["payload"]) for row in rows]
+
+    def entries(self) -> list[dict]:
+        return self._rows_to_entries(self.conn.execute("SELECT payload FROM entries ORDER BY id"))
+
+    def count(self) -> int:
+        # AUTOINCREMENTの主キーは削除しない限り連番なので、MAX(id)で件数が求まる（インデックス参照のみ）
+        row = self.conn.execute("SELECT COALESCE(MAX(id), 0) AS n FROM entries").fetchone()
+        return row["n"]
+
+    def latest(self) -> dict | None:
+        row = self.conn.execute("SELECT payload FROM entries ORDER BY id DESC LIMIT 1").fetchone()
+        return json.loads(row["payload"]) if row else None
+
+    def is_empty(self) -> bool:
+        return self.conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone() is None
+
+    def entries_between(self, start: str | None = None, end: str | None = None) -> list[dict]:
+        """created_at（ISO形式）が [start, end) の範囲にあるエントリを返す。"""
+        query, params = "SELECT payload FROM entries WHERE 1 = 1", []
+        if start:
+            query += " AND created_at >= ?"
+            params.append(start)
+        if end:
+            query += " AND created_at < ?"
+            params.append(end)
+        return self._rows_to_entries(self.conn.execute(query + " ORDER BY created_at, id", params))
+
+    def entries_by_theme(self, theme: str) -> list[dict]:
+        rows = self.conn.execute("SELECT payload FROM entries WHERE theme = ? ORDER BY id", (theme,))
+        return self._rows_to_entries(rows)
+
+    # --- 短期記憶（最後の概念化以降のエントリ） ---
+    def recent_entries(self) -> list[dict]:
+        rows = self.conn.execute(
+            "SELECT payload FROM entries WHERE id > ? ORDER BY id", (self._get_meta("recent_since_id"),)
+        )
+        return self._rows_to_entries(rows)
+
+    def entries_after(self, entry_id: int) -> list[tuple[int, dict]]:
+        """指定したIDより後に追加されたエントリを (ID, エントリ) のリストで返す（差分概念化用）。"""
+        rows = self.conn.execute("SELECT id, payload FROM entries WHERE id > ? ORDER BY id", (entry_id,))
+        return [(row["id"], json.loads(row["payload"])) for row in rows]
+
+    def recent_since_id(self) -> int:
+        """短期記憶の境界ID（最後の概念化の時点での最後のエントリID）を返す。"""
+        return self._get_meta("recent_since_id")
+
+    def count_recent(self) -> int:
+        return max(0, self.count() - self._get_meta("recent_since_id"))
+
+    def reset_recent(self) -> None:
+        """現在までのエントリを短期記憶の対象外にする（概念化後に呼び出す）。"""
+        with self.conn:
+            self._set_meta("recent_since_id", self.count())
+
+    # --- concepts ---
+    def add_concept(self, concept: dict, created_at: str | None = None) -> None:
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO concepts (concept_name, created_at, payload) VALUES (?, ?, ?)",
+                (concept.get("concept_name"), created_at or datetime.now().isoformat(),
+                 json.dumps(concept, ensure_ascii=False)),
+            )
+
+    def latest_concept(self) -> dict | None:
+        row = self.conn.execute("SELECT payload FROM concepts ORDER BY id DESC LIMIT 1").fetchone()
+        return json.loads(row["payload"]) if row else None
+
+    # --- clusters ---
+    def replace_clusters(self, clusters_data: dict) -> None:
+        """新しい世代として活動クラスタを保存する。過去の世代は履歴として残る。"""
+        generation = self._get_meta("cluster_generation") + 1
+        now = datetime.now().isoformat()
+        rows = [
+            (generation, c.get("cluster_id"), c.get("theme"), now, json.dumps(c, ensure_ascii=False))
+            for c in clusters_data.get("clusters", [])
+        ]
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO clusters (generation, cluster_id, theme, created_at, payload) VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._set_meta("cluster_generation", generation)
+
+    def current_clusters(self) -> dict | None:
+        rows = self.conn.execute(
+            "SELECT payload FROM clusters WHERE generation = ? ORDER BY id", (self._get_meta("cluster_generation"),)
+        ).fetchall()
+        if not rows:
+            return None
+        return {"clusters": self._rows_to_entries(rows)}
+
+    # --- テーマ選択の状態（topic_scheduler 用） ---
+    def theme_stats(self, theme: str) -> dict:
+        """
+        テーマの調査回数・最終調査日時・エンゲージメントの集計を返す（主キー参照のみ）。
+        まだ記録がないテーマは、エントリの中で最後にそのテーマを調査した日時を使う（themeのインデックス参照）。
+        """
+        row = self.conn.execute("SELECT * FROM theme_stats WHERE theme = ?", (theme,)).fetchone()
+        if row:
+            return dict(row)
+        last = self.conn.execute(
+            "SELECT COUNT(*) AS n, MAX(created_at) AS last FROM entries WHERE theme = ?", (theme,)
+        ).fetchone()
+        return {"theme": theme, "research_count": last["n"], "last_researched_at": last["last"],
+                "reward_sum": 0.0, "reward_count": 0, "wrr_current": 0.0}
+
+    def update_theme_stats(self, stats: list[dict]) -> None:
+        """theme_stats() で取得して更新した内容を、まとめて保存する。"""
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO theme_stats "
+                "(theme, research_count, last_researched_at, reward_sum, reward_count, wrr_current) "
+                "VALUES (:theme, :research_count, :last_researched_at, :reward_sum, :reward_count, :wrr_current)",
+                stats,
+            )
+
+    def record_posts(self, posts: list[tuple[str, str, str]]) -> None:
+        """投稿したツイート (ツイートID, テーマ, 投稿日時) を記録する。記録済みのIDは無視する。"""
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO posts (tweet_id, theme, posted_at) VALUES (?, ?, ?)", posts)
+
+    def unrewarded_posts(self, posted_before: str, limit: int = 100) -> list[tuple[str, str]]:
+        """指定日時より前に投稿し、まだエンゲージメントを集計していないツイートの (ツイートID, テーマ) を返す。"""
+        rows = self.conn.execute(
+            "SELECT tweet_id, theme FROM posts WHERE rewarded = 0 AND posted_at < ? ORDER BY posted_at LIMIT ?",
+            (posted_before, limit),
+        )
+        return [(row["tweet_id"], row["theme"]) for row in rows]
+
+    def mark_rewarded(self, tweet_ids: list[str]) -> None:
+        with self.conn:
+            self.conn.executemany("UPDATE posts SET rewarded = 1 WHERE tweet_id = ?", [(i,) for i in tweet_ids])
+
+    # --- JSONファイルとの相互変換 ---
+    def import_json(self, all_log_path: str, recent_path: str, concepts_path: str | None = None,
+                    clusters_path: str | None = None, topic_state_path: str | None = None) -> int:
+        """
+        既存のJSONファイル群を一括で取り込む（初回のみ）。取り込んだエントリ数を返す。
+        短期記憶の件数は recent_knowledge.json の件数から境界IDを決めて再現する。
+        DBファイルはgitで管理しないため、チェックアウトし直した環境ではこれでJSONファイル群からDBを作り直す。
+        """
+        if self._get_meta("json_imported") or not self.is_empty():
+            return 0
+        all_entries = load_knowledge_view(all_log_path)["knowledge_entries"]
+        recent_count = len(load_knowledge_view(recent_path)["knowledge_entries"])
+        self.extend(all_entries)
+        with self.conn:
+            self._set_meta("recent_since_id", max(0, len(all_entries) - recent_count))
+            self._set_meta("json_imported", 1)
+        if concepts_path and os.path.exists(concepts_path):
+            with open(concepts_path, 'r', encoding='utf-8') as f:
+                self.add_concept(json.load(f))
+        if clusters_path and os.path.exists(clusters_path):
+            with open(clusters_path, 'r', encoding='utf-8') as f:
+                self.replace_clusters(json.load(f))
+        if topic_state_path:
+            self.import_topic_state(topic_state_path)
+        return len(all_entries)
+
+    def import_topic_state(self, path: str) -> None:
+        """export_topic_state() で書き出したテーマ選択の状態を取り込む（ファイルがなければ何もしない）。"""
+        state = atomic_io.read_json(path) or {}
+        self.update_theme_stats(state.get("theme_stats", []))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO posts (tweet_id, theme, posted_at, rewarded) "
+                "VALUES (:tweet_id, :theme, :posted_at, :rewarded)",
+                state.get("posts", []),
+            )
+
+    def export_topic_state(self, path: str) -> None:
+        """テーマ選択の状態（theme_stats と、反応を集計する投稿の posts）を、gitで管理するJSONファイルに書き出す。"""
+        atomic_io.write_json(path, {
+            "theme_stats": [dict(row) for row in self.conn.execute("SELECT * FROM theme_stats ORDER BY theme")],
+            "posts": [dict(row) for row in self.conn.execute("SELECT * FROM posts ORDER BY posted_at, tweet_id")],
+        })
+
+    def export_recent(self, recent_path: str) -> None:
+        """短期記憶を recent_knowledge.json 形式で書き出す。"""
+        atomic_io.write_json(recent_path, {"knowledge_entries": self.recent_entries()})
+
+    def export_json(self, all_log_path: str, recent_path: str, concepts_path: str | None = None,
+                    clusters_path: str | None = None, topic_state_path: str | None = None) -> None:
+        """ストアの内容を、gitで管理している既存のJSONファイル群に書き出す。"""
+        log_store = JournalKnowledgeStore(all_log_path)
+        with atomic_io.file_lock(log_store.journal_path):
+            atomic_io.write_json(all_log_path, self.as_view())
+            # ストアの内容で書き出したので、長期ログのジャーナルは不要になる
+            for path in (log_store.journal_path, log_store.compacting_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        self.export_recent(recent_path)
+        concept = self.latest_concept()
+        if concepts_path and concept:
+            atomic_io.write_json(concepts_path, concept)
+        clusters = self.current_clusters()
+        if clusters_path and clusters:
+            atomic_io.write_json(clusters_path, clusters)
+        if topic_state_path:
+            self.export_topic_state(topic_state_path)
+
+
+if __name__ == "__main__":
+    # 使い方: python src/sqlite_store.py import|export
+    paths = (
+        os.path.join(KNOWLEDGE_BASE_DIR, 'all_knowledge_log.json'),
+        os.path.join(KNOWLEDGE_BASE_DIR, 'recent_knowledge.json'),
+        os.path.join(KNOWLEDGE_BASE_DIR, 'high_level_concepts.json'),
+        os.path.join(KNOWLEDGE_BASE_DIR, 'activity_clusters.json'),
+        os.path.join(KNOWLEDGE_BASE_DIR, 'topic_state.json'),
+    )
+    if len(sys.argv) != 2 or sys.argv[1] not in ("import", "export"):
+        print("使い方: python src/sqlite_store.py import|export")
+        sys.exit(1)
+    with SQLiteKnowledgeStore(DEFAULT_DB_PATH) as store:
+        if sys.argv[1] == "import":
+            imported = store.import_json(*paths)
+            print(f"{imported}件のエントリを {DEFAULT_DB_PATH} に取り込みました。")
+        else:
+            store.export_json(*paths)
+            print(f"{DEFAULT_DB_PATH} の内容をJSONファイルに書き出しました。")
@@ -0,0 +1,184 @@
+# src/structured_output.py
+import json
+
+from src import tracing
+
+# 呼び出し元ごとの出力スキーマ（JSON Schemaのサブセット: type / properties / required / items）
+# Geminiの response_schema にもそのまま渡せる形式で書く。
+CONCEPT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "concept_name": {"type": "string"},
+        "summary": {"type": "string"},
+        "components": {"type": "array", "items": {"type": "string"}},
+        "implication": {"type": "string"},
+    },
+    "required": ["concept_name", "summary", "components", "implication"],
+}
+CLUSTERS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "clusters": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "cluster_id": {"type": "integer"},
+                    "theme": {"type": "string"},
+                    "summary": {"type": "string"},
+                    "keywords": {"type": "array", "items": {"type": "string"}},
+                },
+                "required": ["theme"],
+            },
+        },
+    },
+    "required": ["clusters"],
+}
+# 要約（Markdown）と概念データを1回の呼び出しで生成する場合のスキーマ
+SUMMARY_STRUCTURED_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "report": {"type": "string"},
+        "concept": CONCEPT_SCHEMA,
+    },
+    "required": ["report", "concept"],
+}
+# 上のスキーマのうち、要約だけを取り出す場合（概念データが検証に通らなかったとき）
+REPORT_ONLY_SCHEMA = {"type": "object", "properties": {"report": {"type": "string"}}, "required": ["report"]}
+SCHEMAS = {
+    "research": {
+        "type": "object",
+        "properties": {
+            "overview": {"type": "string"},
+            "details": {"type": "string"},
+            "trends": {"type": "string"},
+            "tweet": {"type": "string"},
+        },
+        "required": ["tweet"],
+    },
+    "structure": CONCEPT_SCHEMA,
+    "summary_structured": SUMMARY_STRUCTURED_SCHEMA,
+    "concept_fold": CONCEPT_SCHEMA,
+    "cluster": CLUSTERS_SCHEMA,
+    "cluster_reduce": CLUSTERS_SCHEMA,
+}
+
+_TYPES = {
+    "object": dict,
+    "array": list,
+    "string": str,
+    "integer": int,
+    "number": (int, float),
+    "boolean": bool,
+}
+_decoder = json.JSONDecoder()
+
+
+class ParseError(ValueError):
+    """LLMの応答から、スキーマに合うJSONを取り出せなかったことを表す。"""
+
+    def __init__(self, message: str, text: str = ""):
+        super().__init__(message)
+        self.text = text
+
+
+def schema_for(call_site: str) -> dict | None:
+    return SCHEMAS.get(call_site)
+
+
+def validate(value, schema: dict | None, path: str = "$") -> None:
+    """値がスキーマに従っているか検証し、従っていなければ ParseError を送出する。"""
+    if not schema:
+        return
+    expected = schema.get("type")
+    if expected:
+        types = _TYPES[expected.lower()]
+        # boolはintのサブクラスのため、integer/numberとしては扱わない
+        if not isinstance(value, types) or (isinstance(value, bool) and expected.lower() != "boolean"):
+            raise ParseError(f"{path}: {expected}型ではありません（{type(value).__name__}）")
+    if isinstance(value, dict):
+        for key in schema.get("required", []):
+            if key not in value:
+                raise ParseError(f"{path}: 必須のキー '{key}' がありません")
+        for key, sub_schema in schema.get("properties", {}).items():
+            if key in value:
+                validate(value[key], sub_schema, f"{path}.{key}")
+    elif isinstance(value, list) and "items" in schema:
+        for i, item in enumerate(value):
+            validate(item, schema["items"], f"{path}[{i}]")
+
+
+def iter_json_values(text: str, start_chars: str = "{["):
+    """
+    テキストを先頭から走査し、埋め込まれたJSONの値を出現順に返す。
+    コードフェンス（```json ... ```）や前後の説明文は読み飛ばし、JSONとして読めた範囲の続きから走査を再開する。
+    """
+    pos = 0
+    length = len(text)
+    while pos < length:
+        starts = [i for i in (text.find(ch, pos) for ch in start_chars) if i != -1]
+        if not starts:
+            return
+        pos = min(starts)
+        try:
+            value, end = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            pos += 1
+            continue
+        yield value
+        pos = end
+
+
+def parse(text: str | None, call_site: str | None = None, schema: dict | None = None):
+    """
+    LLMの応答テキストから、スキーマ（schema、なければ call_site のスキーマ）に合う最初のJSONを返す。
+    応答全体がJSONならそのまま読み、そうでなければ説明文やコードフェンスの中から探す。
+    スキーマに合うJSONが見つからない場合は ParseError を送出する。
+    """
+    with tracing.span("json_parse", call_site=call_site, bytes=len(text or "")):
+        return _parse(text, call_site, schema)
+
+
+def _parse(text: str | None, call_site: str | None, schema: dict | None):
+    if schema is None and call_site:
+        schema = schema_for(call_site)
+    if not text:
+        raise ParseError("応答が空です", text or "")
+    # 配列を期待しない場合は、本文中の "[1]" などの引用番号をJSONとして拾わないよう、オブジェクトだけを探す
+    start_chars = "[" if schema and schema.get("type", "").lower() == "array" else "{"
+    last_error = None
+    stripped = text.strip()
+    if stripped[:1] in start_chars:
+        # ネイティブJSON出力（response_mime_type）の場合は、応答全体が1つのJSON
+        try:
+            value = json.loads(stripped)
+            validate(value, schema)
+            return value
+        except (json.JSONDecodeError, ParseError) as e:
+            last_error = e
+    for value in iter_json_values(text, start_chars):
+        try:
+            validate(value, schema)
+            return value
+        except ParseError as e:
+            last_error = e
+    detail = f"（{last_error}）" if last_error else ""
+    raise ParseError(f"応答からJSONを取り出せませんでした{detail}", text)
+
+
+def try_parse(text: str | None, call_site: str | None = None, schema: dict | None = None):
+    """parse() と同じだが、取り出せなかった場合は None を返す。"""
+    try:
+        return parse(text, call_site, schema)
+    except ParseError:
+        return None
+
+
+def native_config(schema: dict | None, generation_config: dict | None = None) -> dict | None:
+    """
+    GeminiにJSONで直接出力させるための生成設定（response_mime_type / response_schema）を返す。
+    google_searchなどのツールを使う呼び出しでは出力形式を指定できないため、元の設定をそのまま返す。
+    """
+    if not schema or (generation_config or {}).get("tools"):
+        return generation_config
+    return {**(generation_config or {}), "response_mime_type": "application/json", "response_schema": schema}
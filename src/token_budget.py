@@ -0,0 +1,103 @@
+# src/token_budget.py
+import os
+import math
+
+# 呼び出し元ごとのプロンプトのトークン上限と、超えた場合の方針
+#   policy: truncate（上限に収まるよう本文を切り詰める） / chunk（上限ごとに分割し、呼び出し側で複数回に分けて送る）
+#   keep: truncate時に残す側。head（先頭）/ tail（末尾 = 新しいエントリ）
+BUDGETS = {
+    "research": {"max_prompt_tokens": 8_000, "policy": "truncate", "keep": "head"},
+    "summary": {"max_prompt_tokens": 100_000, "policy": "truncate", "keep": "tail"},
+    "summary_structured": {"max_prompt_tokens": 100_000, "policy": "truncate", "keep": "tail"},
+    "structure": {"max_prompt_tokens": 30_000, "policy": "truncate", "keep": "head"},
+    "cluster": {"max_prompt_tokens": 60_000, "policy": "chunk", "keep": "head"},
+    "cluster_reduce": {"max_prompt_tokens": 30_000, "policy": "truncate", "keep": "head"},
+    "concept_map": {"max_prompt_tokens": 20_000, "policy": "truncate", "keep": "head"},
+    "concept_fold": {"max_prompt_tokens": 20_000, "policy": "truncate", "keep": "tail"},
+    "json_repair": {"max_prompt_tokens": 20_000, "policy": "truncate", "keep": "head"},
+}
+DEFAULT_BUDGET = {"max_prompt_tokens": int(os.getenv("LLM_DEFAULT_MAX_PROMPT_TOKENS", "100000")),
+                  "policy": "truncate", "keep": "head"}
+# 本文以外（指示文・出力フォーマット）のために上限から差し引いておくトークン数
+PROMPT_RESERVED_TOKENS = 2_000
+
+
+def estimate_tokens(text: str | None) -> int:
+    """
+    テキストのトークン数を概算する（APIを呼び出さない）。
+    英数字は約4文字で1トークン、日本語などの非ASCII文字は1文字で約1トークンとして数える。
+    """
+    if not text:
+        return 0
+    non_ascii = sum(1 for ch in text if ord(ch) > 0x7F)
+    return math.ceil((len(text) - non_ascii) / 4 + non_ascii)
+
+
+def budget_for(call_site: str) -> dict:
+    return BUDGETS.get(call_site, DEFAULT_BUDGET)
+
+
+def _truncate(text: str, max_tokens: int, keep: str) -> str:
+    """行単位で上限に収まるまで切り詰める（1行で上限を超える場合は文字単位で切る）。"""
+    lines = text.split("\n")
+    if keep == "tail":
+        lines.reverse()
+    kept, used = [], 0
+    for line in lines:
+        tokens = estimate_tokens(line) + 1
+        if used + tokens > max_tokens:
+            if not kept:
+                kept.append(line[-max_tokens:] if keep == "tail" else line[:max_tokens])
+            break
+        kept.append(line)
+        used += tokens
+    if keep == "tail":
+        kept.reverse()
+    return "\n".join(kept)
+
+
+def split_text(text: str, max_tokens: int) -> list[str]:
+    """行の境界で、それぞれが上限トークン数に収まるチャンクに分割する。"""
+    chunks, current, used = [], [], 0
+    for line in text.split("\n"):
+        tokens = estimate_tokens(line) + 1
+        if current and used + tokens > max_tokens:
+            chunks.append("\n".join(current))
+            current, used = [], 0
+        # 1行で上限を超える場合は文字単位で分割する
+        while estimate_tokens(line) > max_tokens:
+            chunks.append(line[:max_tokens])
+            line = line[max_tokens:]
+        current.append(line)
+        used += estimate_tokens(line) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def apply_budget(text: str, call_site: str, reserved_tokens: int = PROMPT_RESERVED_TOKENS) -> list[str]:
+    """
+    呼び出し元の予算に合わせて本文を調整し、送信する本文のリストを返す。
+    reserved_tokens: 本文以外のプロンプト（指示文など）のために上限から差し引くトークン数
+    上限内ならそのまま1要素、truncateなら切り詰めた1要素、chunkなら分割した複数要素を返す。
+    """
+    budget = budget_for(call_site)
+    if budget["policy"] != "chunk":
+        return [fit_text(text, call_site, reserved_tokens)]
+    available = max(1, budget["max_prompt_tokens"] - reserved_tokens)
+    tokens = estimate_tokens(text)
+    if tokens <= available:
+        return [text]
+    chunks = split_text(text, available)
+    print(f"警告: {call_site} のプロンプトが予算を超えるため、{len(chunks)}個に分割します（約{tokens}/{available}トークン）。")
+    return chunks
+
+
+def fit_text(text: str, call_site: str, reserved_tokens: int = PROMPT_RESERVED_TOKENS) -> str:
+    """1回の呼び出しで送れるよう、予算に合わせて本文を切り詰める。"""
+    budget = budget_for(call_site)
+    available = max(1, budget["max_prompt_tokens"] - reserved_tokens)
+    if estimate_tokens(text) <= available:
+        return text
+    print(f"警告: {call_site} のプロンプトが予算を超えるため、本文を切り詰めます（約{estimate_tokens(text)}/{available}トークン）。")
+    return _truncate(text, available, budget.get("keep", "head"))
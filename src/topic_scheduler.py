@@ -0,0 +1,132 @@
+# src/topic_scheduler.py
+import math
+import random
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+# エンゲージメントの集計方法: いいね・リポスト・返信・引用の合計
+ENGAGEMENT_FIELDS = ("like_count", "retweet_count", "reply_count", "quote_count")
+
+
+class TopicScheduler(ABC):
+    """
+    調査するテーマ（活動クラスタ）を選ぶスケジューラの基底クラス。
+    状態は知識DB（SQLiteKnowledgeStore）の theme_stats テーブルに保存し、
+    テーマごとの参照は主キー（またはインデックス）で行う。
+    """
+
+    def __init__(self, db, rng: random.Random | None = None):
+        self.db = db
+        self.rng = rng or random.Random()
+
+    def _stats(self, clusters: list[dict]) -> list[dict]:
+        return [self.db.theme_stats(c.get("theme", "")) for c in clusters]
+
+    @abstractmethod
+    def _score(self, cluster: dict, stats: dict, all_stats: list[dict]) -> float:
+        """値が大きいテーマほど優先する。_score を実装していないスケジューラは、生成した時点で TypeError になる。"""
+
+    def rank(self, clusters: list[dict]) -> list[dict]:
+        """テーマを優先順に並べて返す（同点の場合の順序はランダム）。"""
+        all_stats = self._stats(clusters)
+        keyed = [(self._score(c, s, all_stats), self.rng.random(), i) for i, (c, s) in enumerate(zip(clusters, all_stats))]
+        return [clusters[i] for _, _, i in sorted(keyed, reverse=True)]
+
+    def record(self, selected: dict, clusters: list[dict]) -> None:
+        """選んだテーマを調査したことを記録する。"""
+        stats = self.db.theme_stats(selected.get("theme", ""))
+        stats["research_count"] += 1
+        stats["last_researched_at"] = datetime.now().isoformat()
+        self.db.update_theme_stats([stats])
+
+
+class LeastRecentScheduler(TopicScheduler):
+    """最後に調査してから最も時間が経っているテーマ（未調査のテーマを最優先）を選ぶ。"""
+
+    def _score(self, cluster, stats, all_stats):
+        last = stats["last_researched_at"]
+        return -datetime.fromisoformat(last).timestamp() if last else math.inf
+
+
+class WeightedRoundRobinScheduler(TopicScheduler):
+    """
+    重み付きラウンドロビン（smooth weighted round-robin）。
+    各テーマはクラスタの "weight"（なければ1）に比例した頻度で、偏りなく順番に選ばれる。
+    """
+
+    @staticmethod
+    def _weight(cluster: dict) -> float:
+        return float(cluster.get("weight", 1))
+
+    def _score(self, cluster, stats, all_stats):
+        return stats["wrr_current"] + self._weight(cluster)
+
+    def record(self, selected, clusters):
+        all_stats = self._stats(clusters)
+        total = sum(self._weight(c) for c in clusters)
+        now = datetime.now().isoformat()
+        for cluster, stats in zip(clusters, all_stats):
+            stats["wrr_current"] += self._weight(cluster)
+            if cluster.get("theme") == selected.get("theme"):
+                stats["wrr_current"] -= total
+                stats["research_count"] += 1
+                stats["last_researched_at"] = now
+        self.db.update_theme_stats(all_stats)
+
+
+class EngagementBanditScheduler(TopicScheduler):
+    """
+    エンゲージメントを報酬とするバンディット（UCB1）。
+    反応の良かったテーマを多めに選びつつ、試行回数の少ないテーマも一定の割合で試す。
+    報酬は collect_engagement() で、投稿から時間が経ったツイートの反応を集計して記録する。
+    """
+
+    exploration = 1.0
+
+    def _score(self, cluster, stats, all_stats):
+        if not stats["reward_count"]:
+            return math.inf
+        total = sum(s["reward_count"] for s in all_stats)
+        mean = stats["reward_sum"] / stats["reward_count"]
+        return mean + self.exploration * math.sqrt(2 * math.log(total) / stats["reward_count"])
+
+
+STRATEGIES = {
+    "least_recent": LeastRecentScheduler,
+    "round_robin": WeightedRoundRobinScheduler,
+    "bandit": EngagementBanditScheduler,
+}
+
+
+def get_scheduler(name: str, db, rng: random.Random | None = None) -> TopicScheduler:
+    if name not in STRATEGIES:
+        raise ValueError(f"未知のテーマ選択方式です: {name}（{', '.join(STRATEGIES)} から選んでください）")
+    return STRATEGIES[name](db, rng)
+
+
+def engagement_reward(public_metrics: dict) -> float:
+    """ツイートの反応数から報酬を計算する。反応の多いツイートに引きずられないよう対数をとる。"""
+    return math.log1p(sum(public_metrics.get(field, 0) for field in ENGAGEMENT_FIELDS))
+
+
+def collect_engagement(db, fetch_metrics, posted_before: str, limit: int = 100) -> int:
+    """
+    投稿から時間が経ったツイートの反応を取得し、テーマごとの報酬として記録する。集計したツイート数を返す。
+    fetch_metrics: ツイートIDのリストを受け取り、{ツイートID: public_metrics} を返す関数
+    """
+    posts = db.unrewarded_posts(posted_before, limit)
+    if not posts:
+        return 0
+    metrics = fetch_metrics([tweet_id for tweet_id, _ in posts])
+    updated = {}
+    for tweet_id, theme in posts:
+        if tweet_id not in metrics or not theme:
+            continue
+        stats = updated.get(theme) or db.theme_stats(theme)
+        stats["reward_sum"] += engagement_reward(metrics[tweet_id])
+        stats["reward_count"] += 1
+        updated[theme] = stats
+    db.update_theme_stats(list(updated.values()))
+    # 削除済みなどで取得できなかったツイートも、再度問い合わせないよう集計済みにする
+    db.mark_rewarded([tweet_id for tweet_id, _ in posts])
+    return sum(1 for tweet_id, _ in posts if tweet_id in metrics)
@@ -0,0 +1,175 @@
+# src/tracing.py
+import os
+import json
+import time
+import threading
+import contextvars
+import functools
+from datetime import datetime
+
+# 1: 処理ごとの所要時間（スパン）を記録し、実行の終わりに1行のJSONとして書き出す
+ENABLED = os.getenv("BOT_TRACE", "") == "1"
+# スパン名ごとの集計（totals）で合計する数値の属性
+COUNTERS = ("bytes", "retries", "prompt_tokens", "response_tokens", "items")
+
+# 現在開いているスパン（asyncioのタスクや asyncio.to_thread のスレッドにも引き継がれる）
+_current: contextvars.ContextVar["Span | None"] = contextvars.ContextVar("current_span", default=None)
+_spans: list[dict] = []
+_spans_lock = threading.Lock()
+_run_started = time.perf_counter()
+
+
+class Span:
+    """
+    1つの処理の記録。set() で属性（呼び出し元・ステータスなど）を、add() で数値（バイト数・トークン数・リトライ回数など）を足す。
+    """
+    __slots__ = ("name", "attrs", "parent", "id", "start")
+
+    def __init__(self, name: str, attrs: dict, parent: "Span | None"):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.id = None
+        self.start = time.perf_counter()
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount: int | float = 1) -> None:
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+
+class _NoopSpan:
+    """記録が無効なときに返すスパン。何もしない（呼び出し側は有効かどうかを気にせず set / add を呼べる）。"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **attrs) -> None:
+        pass
+
+    def add(self, key: str, amount: int | float = 1) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _SpanContext:
+    __slots__ = ("span", "token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.span = Span(name, attrs, _current.get())
+        self.token = None
+
+    def __enter__(self) -> Span:
+        with _spans_lock:
+            self.span.id = len(_spans)
+            # 開始順に記録枠を確保しておき、終了時に所要時間を書き込む
+            _spans.append(None)
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        span = self.span
+        seconds = time.perf_counter() - span.start
+        _current.reset(self.token)
+        record = {
+            "id": span.id,
+            "name": span.name,
+            "parent": span.parent.id if span.parent is not None else None,
+            "offset": round(span.start - _run_started, 6),
+            "seconds": round(seconds, 6),
+            "ok": exc_type is None,
+        }
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        if span.attrs:
+            record["attrs"] = span.attrs
+        with _spans_lock:
+            _spans[span.id] = record
+        return False
+
+
+def span(name: str, **attrs):
+    """
+    with tracing.span("llm", call_site="summary") as s: ... の形で処理を囲み、所要時間を記録する。
+    記録が無効なときは何もしないスパンを返すだけなので、本番の処理にほとんど負荷をかけない。
+    """
+    if not ENABLED:
+        return _NOOP
+    return _SpanContext(name, attrs)
+
+
+def current():
+    """現在のスパン（なければ何もしないスパン）を返す。内側の処理からリトライ回数などを足すのに使う。"""
+    return (_current.get() if ENABLED else None) or _NOOP
+
+
+def traced(name: str | None = None):
+    """関数の呼び出しをスパンで囲むデコレータ。name を省略すると関数名を使う。"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with _SpanContext(span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_run() -> None:
+    """記録を消し、実行の開始時刻をリセットする（1プロセスで複数回実行する場合やテスト用）。"""
+    global _run_started
+    with _spans_lock:
+        _spans.clear()
+    _run_started = time.perf_counter()
+
+
+def get_spans() -> list[dict]:
+    """終了したスパンの記録を開始順に返す。"""
+    with _spans_lock:
+        return [s for s in _spans if s is not None]
+
+
+def summarize(spans: list[dict]) -> dict:
+    """スパン名ごとの回数・合計時間と、COUNTERS の属性（バイト数・トークン数など）の合計を集計する。"""
+    summary = {}
+    for s in spans:
+        t = summary.setdefault(s["name"], {"count": 0, "seconds": 0.0})
+        t["count"] += 1
+        t["seconds"] = round(t["seconds"] + s["seconds"], 6)
+        attrs = s.get("attrs", {})
+        for key in COUNTERS:
+            if isinstance(attrs.get(key), (int, float)):
+                t[key] = t.get(key, 0) + attrs[key]
+    return summary
+
+
+def write_run(trace_path: str, run_name: str = "") -> dict | None:
+    """
+    今回の実行のスパンを、トレースファイル（JSON Lines）に1行追記する。記録が無効なときは何もしない。
+    GITHUB_SHA があれば記録し、コミットをまたいで各処理の時間の推移を追えるようにする。
+    """
+    if not ENABLED:
+        return None
+    from src import atomic_io # atomic_io は書き込みの記録に tracing を使うため、ここで読み込む
+    spans = get_spans()
+    record = {
+        "run_at": datetime.now().isoformat(),
+        "run": run_name,
+        "commit": os.getenv("GITHUB_SHA", ""),
+        "total_seconds": round(time.perf_counter() - _run_started, 6),
+        "totals": summarize(spans),
+        "spans": spans,
+    }
+    atomic_io.append_lines(trace_path, [json.dumps(record, ensure_ascii=False)])
+    print(f"処理時間の記録（{len(spans)}件）を {trace_path} に追記しました。")
+    return record
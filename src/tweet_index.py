@@ -0,0 +1,145 @@
+# src/tweet_index.py
+import os
+import re
+import sys
+import json
+import zlib
+import unicodedata
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+from src import atomic_io
+
+DEFAULT_INDEX_PATH = os.path.join(project_root, 'data', 'knowledge_base', 'tweet_index.npy')
+
+DIM = 1024 # 埋め込みベクトルの次元数（n-gramをこの数のバケットにハッシュする）
+NGRAM_SIZES = (2, 3) # 文字n-gramの長さ
+
+
+def _normalize(text: str) -> str:
+    """全角/半角・大文字/小文字・空白・句読点の違いを取り除く。"""
+    normalized = unicodedata.normalize("NFKC", text or "").lower()
+    return re.sub(r"[\s、。,.!?！？「」『』()（）]", "", normalized)
+
+
+def embed(text: str, dim: int = DIM) -> np.ndarray:
+    """
+    テキストを文字n-gramのハッシュ埋め込み（L2正規化済み）に変換する。
+    ハッシュにはcrc32を使うため、実行ごとに結果が変わらない。
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    normalized = _normalize(text)
+    for n in NGRAM_SIZES:
+        for i in range(len(normalized) - n + 1):
+            h = zlib.crc32(normalized[i:i + n].encode('utf-8'))
+            # 上位ビットで符号を決め、ハッシュ衝突による偏りを打ち消す
+            vector[h % dim] += 1.0 if h & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class TweetIndex:
+    """
+    過去のツイートの埋め込みを行列（NumPy）としてディスクに保存する近似重複検出用のインデックス。
+    index_path（.npy）に埋め込み行列、同名の .json にエントリID・テーマ・本文を保存する。
+    知識DBから前回以降のエントリだけを取り込んで、差分で更新する。
+    """
+
+    def __init__(self, index_path: str = DEFAULT_INDEX_PATH, dim: int = DIM):
+        self.index_path = index_path
+        self.meta_path = os.path.splitext(index_path)[0] + ".json"
+        self.dim = dim
+        self.matrix = np.zeros((0, dim), dtype=np.float32)
+        self.entry_ids: list[int] = []
+        self.themes: list[str] = []
+        self.texts: list[str] = []
+        self.synced_through_id = 0 # 知識DBから取り込み済みの最後のエントリID
+        self.dirty = False # 保存していない変更があるか
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            matrix = np.load(self.index_path)
+        except (FileNotFoundError, json.JSONDecodeError, ValueError):
+            return
+        # 次元数の変更や書き込みの中断で食い違っている場合は、作り直す
+        if meta.get("dim") != self.dim or matrix.shape != (len(meta.get("entry_ids", [])), self.dim):
+            print(f"警告: ツイートインデックス({self.index_path})が古い形式のため作り直します。")
+            return
+        self.matrix = matrix
+        self.entry_ids = meta["entry_ids"]
+        self.themes = meta["themes"]
+        self.texts = meta["texts"]
+        self.synced_through_id = meta.get("synced_through_id", self.entry_ids[-1] if self.entry_ids else 0)
+
+    def save(self) -> None:
+        # 行列とメタデータの件数が食い違った場合は、読み込み時に検出して作り直す
+        with atomic_io.atomic_open(self.index_path, 'wb') as f:
+            np.save(f, self.matrix)
+        atomic_io.write_json(self.meta_path, {"dim": self.dim, "synced_through_id": self.synced_through_id,
+                                              "entry_ids": self.entry_ids, "themes": self.themes,
+                                              "texts": self.texts}, indent=None)
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.entry_ids)
+
+    def add(self, items: list[tuple[int, str, str]]) -> int:
+        """(エントリID, テーマ, ツイート本文) のリストを追加し、追加した件数を返す。"""
+        items = [item for item in items if item[2]]
+        if not items:
+            return 0
+        vectors = np.stack([embed(text, self.dim) for _, _, text in items])
+        self.matrix = np.vstack([self.matrix, vectors])
+        for entry_id, theme, text in items:
+            self.entry_ids.append(entry_id)
+            self.themes.append(theme or "")
+            self.texts.append(text)
+        return len(items)
+
+    def sync(self, db, save: bool = True) -> int:
+        """
+        知識DBから、インデックスにまだないエントリを取り込んで保存する。取り込んだ件数を返す。
+        save: Falseの場合はメモリ上だけで更新する（常駐モードで、保存をまとめて行う場合）
+        """
+        new_entries = db.entries_after(self.synced_through_id)
+        if not new_entries:
+            return 0
+        added = self.add([
+            (entry_id, e.get("theme"), e.get("tweet") or e.get("generated_tweet", "")) for entry_id, e in new_entries
+        ])
+        self.synced_through_id = new_entries[-1][0]
+        self.dirty = True
+        if save:
+            self.save()
+        return added
+
+    def most_similar(self, text: str) -> tuple[float, str | None]:
+        """最も似ている過去のツイートとのコサイン類似度と、その本文を返す。"""
+        if not len(self):
+            return 0.0, None
+        scores = self.matrix @ embed(text, self.dim)
+        best = int(np.argmax(scores))
+        return float(scores[best]), self.texts[best]
+
+    def recent_theme_count(self, theme: str, window: int, threshold: float = 0.9) -> int:
+        """直近window件のうち、テーマ名がほぼ同じ（類似度threshold以上）エントリの件数を返す。"""
+        recent = self.themes[-window:]
+        if not recent or not theme:
+            return 0
+        target = embed(theme, self.dim)
+        return sum(1 for t in recent if t and float(embed(t, self.dim) @ target) >= threshold)
+
+
+if __name__ == "__main__":
+    # 使い方: python src/tweet_index.py "<ツイート本文>"  （最も似ている過去のツイートを表示する）
+    from src.sqlite_store import SQLiteKnowledgeStore
+    index = TweetIndex()
+    with SQLiteKnowledgeStore() as db:
+        print(f"{index.sync(db)}件をインデックスに追加しました（合計{len(index)}件）。")
+    if len(sys.argv) > 1:
+        score, similar = index.most_similar(sys.argv[1])
+        print(f"類似度 {score:.3f}: {similar}")
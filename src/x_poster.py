@@ -1,17 +1,16 @@
 # src/x_poster.py
 import json
-import requests
-from requests_oauthlib import OAuth1
+import time
+import threading
 import sys
 import os
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 import config
+from src import tracing
 
-api_key = config.X_API_KEY
-api_secret = config.X_API_SECRET
-access_token = config.X_ACCESS_TOKEN
-access_token_secret = config.X_ACCESS_TOKEN_SECRET
+# 投稿先のエンドポイント（テスト時はローカルのスタンドインサーバーに向けられる）
+X_API_URL = os.getenv("X_API_URL", "https://api.twitter.com/2/tweets")
 
 def trim_to_140_chars(text: str) -> str:
     """テキストをXの投稿制限（ここでは全角140字）に合わせて調整する。"""
@@ -22,26 +21,179 @@ def trim_to_140_chars(text: str) -> str:
         return text[:last_period + 1]
     return text[:140]
 
-def post_to_x(text: str):
-    """指定されたテキストをXに投稿する。APIエラーを堅牢にハンドリングする。"""
-    auth = OAuth1(api_key, api_secret, access_token, access_token_secret)
-    url = "https://api.twitter.com/2/tweets"
-    payload = {"text": text}
-    try:
-        response = requests.post(url, auth=auth, json=payload)
-        if response.status_code == 429:
+class PostResult:
+    """
+    1件の投稿の結果。status は応答のステータスコード（接続エラーなどで応答がなかった場合はNone）、
+    headers はレート制限の状態（x-rate-limit-reset / retry-after など）を含む応答ヘッダ。
+    """
+    __slots__ = ("tweet_id", "status", "headers", "error")
+
+    def __init__(self, tweet_id: str | None = None, status: int | None = None, headers=None, error: str = ""):
+        self.tweet_id = tweet_id
+        self.status = status
+        self.headers = headers if headers is not None else {}
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.tweet_id is not None
+
+    @property
+    def retryable(self) -> bool:
+        """時間を置けば投稿できる見込みのある失敗（レート制限・サーバーエラー・接続エラー）か。"""
+        return not self.ok and (self.status is None or self.status == 429 or self.status >= 500)
+
+
+class XPoster:
+    """
+    Xへの投稿クライアント。接続プール付きの requests.Session と OAuth1 の署名器を保持し、
+    複数の投稿（スレッドやアウトボックスの一括投稿）で同じTLS接続を再利用する。
+    requests と requests_oauthlib は、投稿しない実行で読み込まずに済むよう、生成時に読み込む。
+    """
+
+    def __init__(self, url: str | None = None, session: "requests.Session | None" = None):
+        import requests
+        from requests_oauthlib import OAuth1
+        config.validate_x()
+        self.url = url or X_API_URL
+        self.session = session or requests.Session()
+        self.auth = OAuth1(config.X_API_KEY, config.X_API_SECRET, config.X_ACCESS_TOKEN, config.X_ACCESS_TOKEN_SECRET)
+        self.request_count = 0
+        self.latencies: list[float] = []
+        self.last_tweet_id: str | None = None
+
+    def send(self, text: str, reply_to: str | None = None, url: str | None = None) -> "requests.Response":
+        """テキストを送信し、レスポンスをそのまま返す（ステータスの判定は呼び出し側で行う）。"""
+        payload = {"text": text}
+        if reply_to:
+            payload["reply"] = {"in_reply_to_tweet_id": reply_to}
+        start = time.perf_counter()
+        with tracing.span("x_post", reply=bool(reply_to)) as s:
+            try:
+                response = self.session.post(url or self.url, auth=self.auth, json=payload)
+                s.set(status=response.status_code, bytes=len(json.dumps(payload).encode('utf-8')))
+                return response
+            finally:
+                self.request_count += 1
+                self.latencies.append(time.perf_counter() - start)
+
+    def publish(self, text: str, reply_to: str | None = None) -> PostResult:
+        """
+        テキストを投稿し、結果（ツイートID・ステータスコード・応答ヘッダ）を返す。APIエラーは例外にせず結果で返す。
+        呼び出し側は result.retryable で、アウトボックスに積んで後で再試行すべき失敗かを判定する。
+        """
+        import requests
+        try:
+            response = self.send(text, reply_to=reply_to)
+        except requests.exceptions.RequestException as e:
+            print(f"エラー: Xへの投稿中に予期せぬエラーが発生しました: {e}")
+            return PostResult(error=str(e))
+        result = PostResult(status=response.status_code, headers=response.headers,
+                            error=f"{response.status_code} {response.text[:200]}")
+        if response.status_code == 201:
+            print(f"✅ Xに投稿しました: {text}")
+            try:
+                self.last_tweet_id = response.json().get("data", {}).get("id", "")
+            except ValueError:
+                self.last_tweet_id = ""
+            result.tweet_id = self.last_tweet_id
+            result.error = ""
+        elif response.status_code == 429:
             print("警告: X (Twitter) APIのレート制限に達しました。今回の投稿はスキップします。")
-            return
-        if response.status_code == 403:
+        elif response.status_code == 403:
             print(f"警告: 投稿が拒否されました (403 Forbidden): {response.text}")
             print("ツイート内容が直近のものと重複している可能性があります。")
-            return
-        if response.status_code != 201:
-            raise Exception(f"Xへの投稿に失敗しました: {response.status_code} {response.text}")
-        print(f"✅ Xに投稿しました: {text}")
-    except requests.exceptions.RequestException as e:
-        print(f"エラー: Xへの投稿中に予期せぬエラーが発生しました: {e}")
-        # raise e  # 必要に応じて再スロー
+        else:
+            print(f"エラー: Xへの投稿に失敗しました: {result.error}")
+        return result
+
+    def post(self, text: str, reply_to: str | None = None) -> str | None:
+        """テキストを投稿し、成功した場合はツイートIDを返す。APIエラーはハンドリングしてNoneを返す。"""
+        return self.publish(text, reply_to=reply_to).tweet_id
+
+    def fetch_public_metrics(self, tweet_ids: list[str]) -> dict:
+        """ツイートの反応数（public_metrics）を {ツイートID: public_metrics} で返す。一度に100件まで。"""
+        response = self.session.get(self.url, auth=self.auth,
+                                    params={"ids": ",".join(tweet_ids[:100]), "tweet.fields": "public_metrics"})
+        self.request_count += 1
+        if response.status_code != 200:
+            raise Exception(f"ツイートの反応数の取得に失敗しました: {response.status_code} {response.text[:200]}")
+        return {t["id"]: t.get("public_metrics", {}) for t in response.json().get("data", [])}
+
+    def post_thread(self, texts: list[str]) -> list[str]:
+        """複数のテキストを返信でつないだスレッドとして投稿し、投稿できたツイートIDを返す。途中で失敗したら中断する。"""
+        tweet_ids = []
+        for text in texts:
+            tweet_id = self.post(text, reply_to=tweet_ids[-1] if tweet_ids else None)
+            if tweet_id is None:
+                break
+            tweet_ids.append(tweet_id)
+        return tweet_ids
+
+    def post_many(self, texts: list[str]) -> int:
+        """複数のテキストを同じ接続で順に投稿し、投稿できた件数を返す。"""
+        return sum(1 for text in texts if self.post(text) is not None)
+
+    def connections_opened(self) -> int:
+        """このセッションで新しく張ったTCP/TLS接続の数を返す。"""
+        total = 0
+        for adapter in self.session.adapters.values():
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    total += pool.num_connections
+        return total
+
+    def stats(self) -> dict:
+        """リクエスト数・接続数・接続の再利用数・平均レイテンシを返す。"""
+        connections = self.connections_opened()
+        return {
+            "requests": self.request_count,
+            "connections_opened": connections,
+            "connections_reused": max(0, self.request_count - connections),
+            "avg_latency_seconds": sum(self.latencies) / len(self.latencies) if self.latencies else 0.0,
+        }
+
+    def close(self) -> None:
+        self.session.close()
+
+_default_poster = None
+_default_poster_lock = threading.Lock()
+
+def get_poster() -> XPoster:
+    """プロセス共有の投稿クライアントを返す。"""
+    global _default_poster
+    if _default_poster is None:
+        with _default_poster_lock:
+            if _default_poster is None:
+                _default_poster = XPoster()
+    return _default_poster
+
+def report_stats() -> None:
+    """このプロセスでの投稿リクエスト数・接続の再利用状況を表示する。"""
+    if _default_poster is None or not _default_poster.request_count:
+        return
+    s = _default_poster.stats()
+    print(f"--- X API 接続状況 ---\nリクエスト{s['requests']}回 / 新規接続{s['connections_opened']}回 / "
+          f"再利用{s['connections_reused']}回 / 平均{s['avg_latency_seconds']:.2f}秒")
+
+def send_tweet(text: str, url: str | None = None) -> "requests.Response":
+    """指定されたテキストをXに送信し、レスポンスをそのまま返す（ステータスの判定は呼び出し側で行う）。"""
+    return get_poster().send(text, url=url)
+
+def last_posted_id() -> str | None:
+    """このプロセスで最後に投稿したツイートのIDを返す。"""
+    return _default_poster.last_tweet_id if _default_poster is not None else None
+
+def publish_to_x(text: str) -> PostResult:
+    """指定されたテキストをXに投稿し、結果（ステータスコード・応答ヘッダを含む）を返す。"""
+    return get_poster().publish(text)
+
+def post_to_x(text: str) -> bool:
+    """指定されたテキストをXに投稿する。APIエラーを堅牢にハンドリングし、投稿できた場合はTrueを返す。"""
+    return get_poster().post(text) is not None
+
 def run_tests():
     """投稿モジュールの機能をテストする。"""
     print("--- `trim_to_140_chars` 関数のテスト ---")
@@ -66,23 +218,31 @@ def run_tests():
 
 def get_latest_tweet(json_path: str) -> str:
     """
-    指定されたJSONファイルから、最新のツイート文を取得する。
+    指定されたJSONファイル（または知識DB）から、最新のツイート文を取得する。
     """
     if not os.path.exists(json_path):
         raise FileNotFoundError(f"知識ベースファイルが見つかりません: {json_path}")
 
-    with open(json_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    if json_path.endswith(".db"):
+        # 知識DBの場合は、ファイル全体を読まずに最新の1件だけを取得する
+        from src.sqlite_store import SQLiteKnowledgeStore
+        with SQLiteKnowledgeStore(json_path) as store:
+            latest_entry = store.latest()
+        if not latest_entry:
+            raise ValueError("知識ベースに投稿可能なエントリがありません。")
+    else:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
 
-    # データが存在し、'knowledge_entries'リストが空でないことを確認
-    if "knowledge_entries" not in data or not data["knowledge_entries"]:
-        raise ValueError("知識ベースに投稿可能なエントリがありません。")
+        # データが存在し、'knowledge_entries'リストが空でないことを確認
+        if "knowledge_entries" not in data or not data["knowledge_entries"]:
+            raise ValueError("知識ベースに投稿可能なエントリがありません。")
 
-    # リストの最後の要素（最新のエントリ）を取得
-    latest_entry = data["knowledge_entries"][-1]
+        # リストの最後の要素（最新のエントリ）を取得
+        latest_entry = data["knowledge_entries"][-1]
 
-    # 'generated_tweet'キーからツイート文を取得（キーが存在しない場合は空文字）
-    tweet_text = latest_entry.get("generated_tweet", "")
+    # 'generated_tweet'（旧形式）または'tweet'キーからツイート文を取得（キーが存在しない場合は空文字）
+    tweet_text = latest_entry.get("generated_tweet") or latest_entry.get("tweet", "")
     
     if not tweet_text:
         raise ValueError("最新のエントリにツイート文が見つかりませんでした。")
@@ -0,0 +1,295 @@
+# test/benchmark.py
+"""
+パイプラインの性能ベンチマーク。
+実際のAPIの代わりにプロセス内のフェイクGemini（FakeGeminiClient）とローカルのフェイクXサーバー（FakeXServer）を使い、
+合成した知識ログ（既定では1k / 10k / 100k件）に対して、各ステージのスループットとp50/p99を測る。
+
+  python -m test.benchmark                                  # 既定の件数で実行
+  python -m test.benchmark --sizes 1000 --latency 0.2       # Geminiの応答に0.2秒かかる場合
+  python -m test.benchmark --output data/metrics/benchmark.json
+  python -m test.benchmark --baseline data/metrics/benchmark.json  # 前回の結果より遅くなっていたら終了コード1
+
+測定するステージ:
+  log_append          長期ログ（ジャーナル）への1件の追記
+  docx_extract        docxファイルの全段落の抽出（サイドカーのキャッシュなし）
+  docx_extract_cached docxファイルの段落の読み込み（サイドカーのキャッシュあり）
+  normal_cycle        run_normal_cycle（テーマ選択 → 調査 → 重複判定 → 保存 → 投稿）
+  conceptualize_cycle run_conceptualize_cycle（要約と構造化 → クラスタリング）
+"""
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from unittest.mock import patch
+from xml.sax.saxutils import escape
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+for key in ("GEMINI_API_KEY", "X_API_KEY", "X_API_SECRET", "X_ACCESS_TOKEN", "X_ACCESS_TOKEN_SECRET"):
+    os.environ.setdefault(key, "benchmark-key")
+
+from src import main as bot_main
+from src import llm_gateway, llm_cache, knowledge_store, sqlite_store, docx_cache, x_poster, resilience
+from test.fakes import FakeGeminiClient, FakeXServer
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+DEFAULT_ITERATIONS = 10
+# ベースラインと比べて、p50 / p99 がこの割合を超えて遅くなったら退行とみなす
+DEFAULT_TOLERANCE = 0.2
+N_THEMES = 10
+STAGES = ["log_append", "docx_extract", "docx_extract_cached", "normal_cycle", "conceptualize_cycle"]
+
+
+def percentile(values: list[float], p: float) -> float:
+    """最近傍順位法によるパーセンタイル（p: 0〜100）"""
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * p // 100))
+    return ordered[int(rank) - 1]
+
+
+def summarize(seconds: list[float], items_per_call: int = 1) -> dict:
+    """1回ごとの所要時間（秒）から、p50 / p99（ミリ秒）とスループット（件/秒）を求める"""
+    total = sum(seconds)
+    return {
+        "iterations": len(seconds),
+        "p50_ms": percentile(seconds, 50) * 1000,
+        "p99_ms": percentile(seconds, 99) * 1000,
+        "mean_ms": total / len(seconds) * 1000,
+        "throughput_per_sec": len(seconds) * items_per_call / total if total else float("inf"),
+    }
+
+
+def measure(func, iterations: int, setup=None) -> list[float]:
+    """func を iterations 回実行し、1回ごとの所要時間（秒）を返す。setup は毎回の計測前に（計測外で）実行する"""
+    seconds = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        with redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            func()
+            seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def llm_stats(calls: list[dict]) -> dict:
+    """ステージ中のLLM呼び出しを、呼び出し元ごとに集計する"""
+    by_call_site = {}
+    for stat in calls:
+        by_call_site.setdefault(stat["call_site"], []).append(stat["seconds"])
+    return {call_site: {"calls": len(s), "p50_ms": percentile(s, 50) * 1000, "p99_ms": percentile(s, 99) * 1000}
+            for call_site, s in by_call_site.items()}
+
+
+def synthetic_entries(n: int, start: int = 0) -> list[dict]:
+    """合成した知識エントリ（テーマは N_THEMES 個を順に使う）"""
+    base = datetime(2024, 1, 1)
+    return [{
+        "theme": f"テーマ{i % N_THEMES}",
+        "tweet": f"合成ツイート{i}: テーマ{i % N_THEMES}に関する調査の要約です。",
+        "details": f"詳細{i}",
+        "created_at": (base + timedelta(minutes=i)).isoformat(),
+    } for i in range(start, start + n)]
+
+
+def write_docx(path: str, paragraphs: list[str]) -> None:
+    """段落だけからなる最小構成のdocxファイルを書き出す（python-docxで大量の段落を追加すると遅いため）"""
+    body = "".join(f"<w:p><w:r><w:t>{escape(p)}</w:t></w:r></w:p>" for p in paragraphs)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/word/document.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+            '</Types>'))
+        archive.writestr("_rels/.rels", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" Target="word/document.xml" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+            '</Relationships>'))
+        archive.writestr("word/document.xml", (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+            f'<w:body>{body}</w:body></w:document>'))
+
+
+def build_workspace(work_dir: str, size: int) -> dict:
+    """
+    size 件の合成知識ログを持つ作業ディレクトリを作り、main.py が参照するパスの差し替え内容を返す。
+    知識DBと長期ログにはすべてのエントリを、短期記憶には概念化の閾値分だけを入れる。
+    """
+    kb_dir = os.path.join(work_dir, "knowledge_base")
+    os.makedirs(kb_dir)
+    paths = {
+        "KNOWLEDGE_BASE_PATH": os.path.join(kb_dir, "base.docx"),
+        "KNOWLEDGE_ENTRIES_PATH": os.path.join(kb_dir, "knowledge_entries.json"),
+        "HIGH_LEVEL_CONCEPTS_PATH": os.path.join(kb_dir, "high_level_concepts.json"),
+        "ACTIVITY_CLUSTERS_PATH": os.path.join(kb_dir, "activity_clusters.json"),
+        "SUMMARY_MD_PATH": os.path.join(kb_dir, "concept_summary.md"),
+        "ALL_KNOWLEDGE_LOG_PATH": os.path.join(kb_dir, "all_knowledge_log.json"),
+        "RECENT_KNOWLEDGE_PATH": os.path.join(kb_dir, "recent_knowledge.json"),
+        "KNOWLEDGE_DB_PATH": os.path.join(kb_dir, "knowledge.db"),
+        "TOPIC_STATE_PATH": os.path.join(kb_dir, "topic_state.json"),
+        "OUTBOX_PATH": os.path.join(work_dir, "outbox.jsonl"),
+        "OUTBOX_RATE_LIMIT_PATH": os.path.join(work_dir, "outbox_rate_limit.json"),
+        "CONCEPT_STATE_PATH": os.path.join(kb_dir, "concept_state.json"),
+        "CONCEPT_HISTORY_PATH": os.path.join(kb_dir, "concept_history.jsonl"),
+        "TWEET_INDEX_PATH": os.path.join(kb_dir, "tweet_index.npy"),
+        "TOKEN_METRICS_PATH": os.path.join(work_dir, "token_usage.jsonl"),
+        "CONCEPT_CHECKPOINT_DIR": os.path.join(work_dir, "checkpoints"),
+    }
+    recent_count = min(size, bot_main.CONCEPT_GENERATION_THRESHOLD)
+    entries = synthetic_entries(size)
+    with open(paths["ALL_KNOWLEDGE_LOG_PATH"], "w", encoding="utf-8") as f:
+        json.dump({"knowledge_entries": entries}, f, ensure_ascii=False)
+    with sqlite_store.SQLiteKnowledgeStore(paths["KNOWLEDGE_DB_PATH"]) as db:
+        db.extend(entries[:size - recent_count])
+        db.reset_recent()
+        db.extend(entries[size - recent_count:])
+        db.replace_clusters({"clusters": [
+            {"cluster_id": i + 1, "theme": f"テーマ{i}", "summary": f"テーマ{i}の概要", "keywords": [f"キーワード{i}"]}
+            for i in range(N_THEMES)
+        ]})
+        db.export_recent(paths["RECENT_KNOWLEDGE_PATH"])
+    write_docx(paths["KNOWLEDGE_BASE_PATH"], [e["tweet"] for e in entries])
+    return paths
+
+
+def run_size(size: int, iterations: int, latency: float, x_server: FakeXServer) -> dict:
+    """size 件の知識ログに対して各ステージを測り、{ステージ名: 集計} を返す"""
+    work_dir = tempfile.mkdtemp(prefix=f"benchmark_{size}_")
+    try:
+        paths = build_workspace(work_dir, size)
+        poster = x_poster.XPoster(url=x_server.url)
+        with patch.multiple(bot_main, **paths), \
+                patch.object(x_poster, "_default_poster", poster), \
+                patch.object(llm_cache, "BYPASS", True):
+            llm_cache.set_cache(llm_cache.ResponseCache(os.path.join(work_dir, "llm_cache")))
+            llm_gateway.set_client(FakeGeminiClient(latency=latency))
+            llm_gateway.set_retry_policy(resilience.RetryPolicy())
+            try:
+                return _run_stages(paths, iterations)
+            finally:
+                llm_gateway.set_client(None)
+                llm_gateway.set_retry_policy(None)
+                llm_cache.set_cache(None)
+                poster.close()
+    finally:
+        # 概念化サイクルが別スレッドで作成中のサイドカーを書き終えてから、作業ディレクトリを削除する
+        docx_cache.wait_for_sidecars()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _run_stages(paths: dict, iterations: int) -> dict:
+    results = {}
+    log_store = knowledge_store.JournalKnowledgeStore(paths["ALL_KNOWLEDGE_LOG_PATH"])
+    new_entries = iter(synthetic_entries(iterations * 10, start=10**7))
+    results["log_append"] = summarize(measure(lambda: log_store.extend([next(new_entries)]), iterations * 10))
+
+    docx_path = paths["KNOWLEDGE_BASE_PATH"]
+    n_paragraphs = len(docx_cache.extract_paragraphs(docx_path))
+    sidecar = docx_cache.sidecar_path(docx_path)
+    # 毎時の実行と同じ条件にするため、同じプロセスで確認済みの記録（メモリ上）は毎回消してから計測する
+    forget = docx_cache._verified.clear
+    remove_sidecar = lambda: (forget(), os.path.exists(sidecar) and os.remove(sidecar))
+    results["docx_extract"] = summarize(
+        measure(lambda: docx_cache.read_paragraphs(docx_path), iterations, setup=remove_sidecar), n_paragraphs)
+    results["docx_extract_cached"] = summarize(
+        measure(lambda: docx_cache.read_paragraphs(docx_path), iterations, setup=forget), n_paragraphs)
+
+    # 初回だけ行う処理（ツイートインデックスの構築・Xへの接続）は計測から除く
+    for stage, func in (("normal_cycle", bot_main.run_normal_cycle),
+                        ("conceptualize_cycle", bot_main.run_conceptualize_cycle)):
+        with redirect_stdout(io.StringIO()):
+            func()
+        first_call = len(llm_gateway.get_call_stats())
+        results[stage] = summarize(measure(func, iterations))
+        results[stage]["llm_calls"] = llm_stats(llm_gateway.get_call_stats()[first_call:])
+    return results
+
+
+def run_benchmarks(sizes: list[int], iterations: int = DEFAULT_ITERATIONS, latency: float = 0.0) -> dict:
+    """すべての件数でベンチマークを実行し、結果（JSONとして保存できる辞書）を返す"""
+    x_server = FakeXServer().start()
+    try:
+        results = {str(size): run_size(size, iterations, latency, x_server) for size in sizes}
+    finally:
+        x_server.stop()
+    return {
+        "run_at": datetime.now().isoformat(),
+        "commit": os.getenv("GITHUB_SHA", ""),
+        "iterations": iterations,
+        "latency": latency,
+        "posts_received": len(x_server.received),
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float = DEFAULT_TOLERANCE) -> list[str]:
+    """ベースラインより tolerance の割合を超えて遅くなったステージを返す（両方にある件数・ステージだけ比べる）"""
+    regressions = []
+    for size, stages in report["results"].items():
+        for stage, stats in stages.items():
+            base = baseline.get("results", {}).get(size, {}).get(stage)
+            if not base:
+                continue
+            for metric in ("p50_ms", "p99_ms"):
+                if stats[metric] > base[metric] * (1 + tolerance):
+                    regressions.append(f"{size}件 {stage} {metric}: {base[metric]:.2f} → {stats[metric]:.2f}")
+    return regressions
+
+
+def print_report(report: dict) -> None:
+    print(f"--- ベンチマーク結果（各{report['iterations']}回, Geminiの応答時間{report['latency']}秒） ---")
+    print(f"{'件数':>8} {'ステージ':<20} {'p50(ms)':>10} {'p99(ms)':>10} {'件/秒':>12}")
+    for size, stages in report["results"].items():
+        for stage in STAGES:
+            s = stages[stage]
+            print(f"{size:>8} {stage:<20} {s['p50_ms']:>10.2f} {s['p99_ms']:>10.2f} {s['throughput_per_sec']:>12.1f}")
+            for call_site, c in s.get("llm_calls", {}).items():
+                print(f"{'':>8}   └ {call_site:<16} {c['p50_ms']:>10.2f} {c['p99_ms']:>10.2f} {c['calls']:>10}回")
+
+
+def parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="フェイクのGemini / Xを使ったパイプラインのベンチマーク")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="合成する知識ログの件数")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="ステージごとの計測回数")
+    parser.add_argument("--latency", type=float, default=0.0, help="フェイクGeminiの1回あたりの応答時間（秒）")
+    parser.add_argument("--output", help="結果をJSONで保存するパス")
+    parser.add_argument("--baseline", help="比較するベースラインの結果（JSON）")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="退行とみなす遅延の割合")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv if argv is not None else sys.argv[1:])
+    report = run_benchmarks(args.sizes, args.iterations, args.latency)
+    print_report(report)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"結果を {args.output} に保存しました。")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print("ベースラインより遅くなったステージがあります:\n" + "\n".join(regressions))
+            return 1
+        print("ベースラインからの退行はありません。")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
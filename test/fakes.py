@@ -0,0 +1,125 @@
+# test/fakes.py
+"""テスト用のスタンドイン（ローカルで動くX APIのフェイクサーバー、プロセス内で応答するGeminiのフェイククライアント）"""
+import json
+import time
+import random
+import threading
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _FakeXHandler(BaseHTTPRequestHandler):
+    # Keep-Aliveで接続を再利用できるようにする
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        server = self.server
+        with server.lock:
+            server.received.append(json.loads(self.rfile.read(length)))
+            status, headers, *detail = server.responses.pop(0) if server.responses else (201, {})
+            tweet_id = str(len(server.received))
+        body = json.dumps({"data": {"id": tweet_id}} if status == 201 else {"detail": detail[0] if detail else "error"})
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeXServer:
+    """
+    X API（POST /2/tweets）のスタンドイン。
+    responses に (ステータス, ヘッダ[, detail]) を積んでおくと先頭から順に返し、空なら201を返す。
+    received には受け取ったリクエストボディが記録される。
+    """
+
+    def __init__(self):
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _FakeXHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.lock = threading.Lock()
+        self.httpd.received = []
+        self.httpd.responses = []
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/2/tweets"
+
+    @property
+    def received(self) -> list:
+        return self.httpd.received
+
+    @property
+    def responses(self) -> list:
+        return self.httpd.responses
+
+    @responses.setter
+    def responses(self, value: list):
+        self.httpd.responses[:] = value
+
+    def start(self) -> "FakeXServer":
+        threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class FakeGeminiClient:
+    """
+    Geminiクライアント（client.models.generate_content）のスタンドイン。llm_gateway.set_client() に渡して使う。
+    応答は生成設定から決める:
+      response_schema あり → スキーマに従うJSON（concept / clusters など）
+      tools あり（research） → ツイートを含むJSON（毎回異なる本文にし、重複判定に引っかからないようにする）
+      それ以外（summary） → 論文形式のMarkdown
+    latency: 1回の呼び出しにかける時間（秒）。jitter: latency に加える乱数の幅（秒）
+    seed を固定すると、同じ順序の呼び出しには同じ応答を返す。
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.models = self
+        self.calls: list[dict] = []
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, model: str, contents: str, config: dict | None = None):
+        config = config or {}
+        with self._lock:
+            n = len(self.calls) + 1
+            delay = self.latency + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            words = [f"{self._rng.getrandbits(40):010x}" for _ in range(8)]
+            kind = "json" if config.get("response_schema") else "research" if config.get("tools") else "text"
+            self.calls.append({"model": model, "kind": kind, "prompt_chars": len(contents)})
+        if delay:
+            time.sleep(delay)
+        if kind == "json":
+            text = json.dumps(_value_for_schema(config["response_schema"], n), ensure_ascii=False)
+        elif kind == "research":
+            tweet = f"調査{n}の要点です。" + " ".join(words)
+            text = "調査結果です。\n```json\n" + json.dumps(
+                {"overview": "概要", "details": "詳細", "trends": "動向", "tweet": tweet}, ensure_ascii=False) + "\n```"
+        else:
+            text = f"# 要約{n}\n\n## 概要\n" + "\n".join(f"- {w}" for w in words) + "\n"
+        usage = SimpleNamespace(prompt_token_count=len(contents) // 2, candidates_token_count=len(text) // 2)
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+
+def _value_for_schema(schema: dict, n: int, key: str = "value"):
+    """スキーマ（structured_output.SCHEMAS の形式）に従う値を作る"""
+    kind = schema.get("type", "string").lower()
+    if kind == "object":
+        return {k: _value_for_schema(s, n, k) for k, s in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_value_for_schema(schema.get("items", {}), i + 1, key) for i in range(3)]
+    if kind == "integer":
+        return n
+    if kind == "number":
+        return float(n)
+    if kind == "boolean":
+        return True
+    return f"{key}{n}"
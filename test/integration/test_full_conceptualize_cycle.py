@@ -26,6 +26,8 @@ class TestFullConceptualizeCycle(unittest.TestCase):
         bot_main.SUMMARY_MD_PATH = os.path.join(self.test_output_dir, 'test_summary.md') # MDファイルのパスを追加
         bot_main.HIGH_LEVEL_CONCEPTS_PATH = os.path.join(self.test_output_dir, 'test_high_concepts.json')
         bot_main.ACTIVITY_CLUSTERS_PATH = os.path.join(self.test_output_dir, 'test_activity_clusters.json')
+        bot_main.KNOWLEDGE_DB_PATH = os.path.join(self.test_output_dir, 'test_knowledge.db')
+        bot_main.CONCEPT_CHECKPOINT_DIR = os.path.join(self.test_output_dir, 'test_checkpoints')
 
     def test_run_conceptualize_cycle_directly(self):
         """
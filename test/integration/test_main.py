@@ -9,6 +9,7 @@ from unittest.mock import patch
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
 sys.path.append(project_root)
 from src import main as bot_main
+from src import x_poster
 
 class TestMainLifecycle(unittest.TestCase):
     def setUp(self):
@@ -20,6 +21,12 @@ class TestMainLifecycle(unittest.TestCase):
         bot_main.SUMMARY_MD_PATH = os.path.join(self.test_output_dir, 'test_summary.md')
         bot_main.HIGH_LEVEL_CONCEPTS_PATH = os.path.join(self.test_output_dir, 'test_high_concepts.json')
         bot_main.ACTIVITY_CLUSTERS_PATH = os.path.join(self.test_output_dir, 'test_activity_clusters.json')
+        bot_main.KNOWLEDGE_DB_PATH = os.path.join(self.test_output_dir, 'test_knowledge.db')
+        bot_main.TOPIC_STATE_PATH = os.path.join(self.test_output_dir, 'test_topic_state.json')
+        bot_main.OUTBOX_PATH = os.path.join(self.test_output_dir, 'test_outbox.jsonl')
+        bot_main.OUTBOX_RATE_LIMIT_PATH = os.path.join(self.test_output_dir, 'test_outbox_rate_limit.json')
+        bot_main.CONCEPT_CHECKPOINT_DIR = os.path.join(self.test_output_dir, 'test_checkpoints')
+        bot_main.TWEET_INDEX_PATH = os.path.join(self.test_output_dir, 'test_tweet_index.npy')
         # main.pyの設定値をテスト用に差し替える
         self.original_threshold = bot_main.CONCEPT_GENERATION_THRESHOLD
         bot_main.CONCEPT_GENERATION_THRESHOLD = 2 # テスト用に2回で概念化
@@ -27,11 +34,12 @@ class TestMainLifecycle(unittest.TestCase):
         # for f in [bot_main.KNOWLEDGE_ENTRIES_PATH, bot_main.SUMMARY_MD_PATH, bot_main.HIGH_LEVEL_CONCEPTS_PATH, bot_main.ACTIVITY_CLUSTERS_PATH]:
         #     if os.path.exists(f): os.remove(f)
 
-    @patch('src.x_poster.post_to_x')
+    @patch('src.x_poster.publish_to_x')
     @patch('time.sleep') # time.sleepも無効化してテストを高速化
     def test_full_bot_lifecycle(self, mock_sleep, mock_post_to_x):
         """通常サイクル→概念化サイクルという一連のライフサイクルをテスト"""
         print("\n--- ライフサイクル統合テスト開始 ---")
+        mock_post_to_x.return_value = x_poster.PostResult(tweet_id="1", status=201, headers={})
         # 柔軟なテスト: 短期記憶の件数に応じて期待値を計算
         try:
             with open(bot_main.RECENT_KNOWLEDGE_PATH, 'r', encoding='utf-8') as f:
@@ -10,6 +10,7 @@ sys.path.append(project_root)
 
 # テスト対象のモジュールをインポート
 from src import main as bot_main
+from src import x_poster
 from unittest.mock import patch # Xへの実際の投稿を防ぐために使用
 
 class TestNormalCycle(unittest.TestCase):
@@ -27,6 +28,11 @@ class TestNormalCycle(unittest.TestCase):
         # 新しい記憶ファイルのパスをテスト用に差し替え
         bot_main.RECENT_KNOWLEDGE_PATH = os.path.join(self.test_output_dir, 'test_recent_knowledge.json')
         bot_main.ALL_KNOWLEDGE_LOG_PATH = os.path.join(self.test_output_dir, 'test_all_knowledge_log.json')
+        bot_main.KNOWLEDGE_DB_PATH = os.path.join(self.test_output_dir, 'test_knowledge.db')
+        bot_main.TOPIC_STATE_PATH = os.path.join(self.test_output_dir, 'test_topic_state.json')
+        bot_main.OUTBOX_PATH = os.path.join(self.test_output_dir, 'test_outbox.jsonl')
+        bot_main.OUTBOX_RATE_LIMIT_PATH = os.path.join(self.test_output_dir, 'test_outbox_rate_limit.json')
+        bot_main.TWEET_INDEX_PATH = os.path.join(self.test_output_dir, 'test_tweet_index.npy')
         
         # ★★★ 出力ファイル ★★★
         # 通常サイクルの結果（知識記録）の保存先
@@ -46,12 +52,13 @@ class TestNormalCycle(unittest.TestCase):
 
 
     # X投稿をモック化（無効化）してテストを実行
-    @patch('src.x_poster.post_to_x')
+    @patch('src.x_poster.publish_to_x')
     def test_run_normal_cycle_successfully(self, mock_post_to_x):
         """
         【統合テスト】通常サイクルが、ツイート生成→知識記録→投稿関数呼び出し、を正しく行うか
         """
         print("\n--- 統合テスト: 通常サイクルを直接実行 ---")
+        mock_post_to_x.return_value = x_poster.PostResult(tweet_id="1", status=201, headers={})
         
         # テスト開始前のエントリ数を記録
         try:
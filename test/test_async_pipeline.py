@@ -0,0 +1,103 @@
+# test/test_async_pipeline.py
+import os
+import sys
+import time
+import shutil
+import asyncio
+import tempfile
+import unittest
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src import atomic_io
+from src.async_pipeline import Stage, StageError, run_dag
+
+
+class TestAsyncPipeline(unittest.TestCase):
+
+    def test_independent_stages_run_concurrently(self):
+        """依存関係のないステージが同時に実行されること"""
+        def slow(value):
+            def func():
+                time.sleep(0.2)
+                return value
+            return func
+        stages = [
+            Stage("a", slow("A")),
+            Stage("b", slow("B")),
+            Stage("join", lambda a, b: a + b, ["a", "b"]),
+        ]
+        start = time.perf_counter()
+        results = asyncio.run(run_dag(stages))
+        elapsed = time.perf_counter() - start
+        self.assertEqual(results["join"], "AB")
+        self.assertLess(elapsed, 0.35, "独立したステージが直列に実行されています。")
+
+    def test_dependency_results_are_passed_in_order(self):
+        stages = [
+            Stage("sub", lambda x, y: x - y, ["ten", "three"]),
+            Stage("ten", lambda: 10),
+            Stage("three", lambda: 3),
+        ]
+        self.assertEqual(asyncio.run(run_dag(stages))["sub"], 7)
+
+    def test_stage_timeout(self):
+        """制限時間を超えたステージは StageError になること"""
+        stages = [Stage("slow", lambda: time.sleep(0.5), timeout=0.05)]
+        with self.assertRaises(StageError) as ctx:
+            asyncio.run(run_dag(stages))
+        self.assertEqual(ctx.exception.stage_name, "slow")
+        self.assertIsInstance(ctx.exception.cause, TimeoutError)
+
+    def test_timed_out_stage_does_not_block_or_write(self):
+        """制限時間を過ぎたステージを待たずに実行が終わり、そのステージが後から出力ファイルを書き込まないこと"""
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        output = os.path.join(tmp_dir, "summary.md")
+        finished = []
+
+        def slow_summary():
+            time.sleep(0.3)
+            try:
+                atomic_io.write_text(output, "遅れて届いた要約")
+            finally:
+                finished.append(True)
+
+        start = time.perf_counter()
+        with self.assertRaises(StageError) as ctx:
+            asyncio.run(run_dag([Stage("summary", slow_summary, timeout=0.05)]))
+        self.assertLess(time.perf_counter() - start, 0.25, "タイムアウトしたステージの終了を待っています。")
+        self.assertIsInstance(ctx.exception.cause, TimeoutError)
+        # 取り残されたスレッドが書き込もうとするまで待ってから、ファイルがないことを確かめる
+        deadline = time.monotonic() + 2
+        while not finished and time.monotonic() < deadline:
+            time.sleep(0.02)
+        self.assertTrue(finished)
+        self.assertFalse(os.path.exists(output))
+        self.assertEqual([n for n in os.listdir(tmp_dir) if n.endswith(".tmp")], [])
+
+    def test_failure_stops_dependents(self):
+        """失敗したステージに依存するステージは実行されないこと"""
+        called = []
+        def fail():
+            raise ValueError("失敗")
+        stages = [
+            Stage("fail", fail),
+            Stage("after", lambda _: called.append(True), ["fail"]),
+        ]
+        with self.assertRaises(StageError) as ctx:
+            asyncio.run(run_dag(stages))
+        self.assertEqual(ctx.exception.stage_name, "fail")
+        self.assertEqual(called, [])
+
+    def test_invalid_graph(self):
+        with self.assertRaises(ValueError):
+            asyncio.run(run_dag([Stage("a", lambda b: b, ["b"]), Stage("b", lambda a: a, ["a"])]))
+        with self.assertRaises(ValueError):
+            asyncio.run(run_dag([Stage("a", lambda x: x, ["missing"])]))
+
+
+if __name__ == '__main__':
+    unittest.main()
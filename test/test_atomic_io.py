@@ -0,0 +1,69 @@
+# test/test_atomic_io.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src import atomic_io, knowledge_store, outbox
+
+
+def _append_entries(snapshot_path: str, worker: int, count: int) -> None:
+    """別プロセスのワーカーとして、1件ずつジャーナルに追記する"""
+    store = knowledge_store.JournalKnowledgeStore(snapshot_path)
+    for i in range(count):
+        store.append({"theme": f"ワーカー{worker}", "tweet": f"ツイート{i}" * 50})
+
+
+class TestAtomicIO(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp_dir, 'recent_knowledge.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_interrupted_write_keeps_previous_content(self):
+        """書き込みの途中で中断しても、元の内容が残り一時ファイルも残らないこと"""
+        atomic_io.write_json(self.path, {"knowledge_entries": [{"theme": "元"}]})
+        with self.assertRaises(KeyboardInterrupt):
+            with atomic_io.atomic_open(self.path) as f:
+                f.write('{"knowledge_entries": [')
+                raise KeyboardInterrupt
+        self.assertEqual(atomic_io.read_json(self.path), {"knowledge_entries": [{"theme": "元"}]})
+        self.assertEqual(os.listdir(self.tmp_dir), ['recent_knowledge.json'])
+
+    def test_corrupt_file_is_not_reset(self):
+        """壊れたファイルを空として扱って上書きせず、例外を送出すること"""
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('{"knowledge_entries": [{"theme": "途中')
+        store = knowledge_store.JsonKnowledgeStore(self.path)
+        with self.assertRaises(atomic_io.CorruptFileError):
+            store.append({"theme": "新規"})
+        with open(self.path, 'r', encoding='utf-8') as f:
+            self.assertEqual(f.read(), '{"knowledge_entries": [{"theme": "途中')
+
+    def test_concurrent_workers(self):
+        """複数のプロセス・スレッドが同時に書き込んでも、行が混ざらず1件も失われないこと"""
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            list(executor.map(_append_entries, [self.path] * 4, range(4), [25] * 4))
+        store = knowledge_store.JournalKnowledgeStore(self.path)
+        self.assertEqual(store.count(), 100)
+        store.compact()
+        self.assertEqual(len(atomic_io.read_json(self.path)["knowledge_entries"]), 100)
+
+        box = outbox.Outbox(os.path.join(self.tmp_dir, 'outbox.jsonl'))
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(lambda i: box.enqueue([{"text": f"ツイート{i % 10}"}]), range(40)))
+        self.assertEqual(len(box.pending()), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+# test/test_benchmark.py
+import os
+import sys
+import unittest
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from test import benchmark
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_small_run(self):
+        """少ない件数でベンチマークが最後まで実行でき、すべてのステージの集計が得られること"""
+        report = benchmark.run_benchmarks([50], iterations=2)
+        stages = report["results"]["50"]
+        self.assertEqual(set(stages), set(benchmark.STAGES))
+        for stats in stages.values():
+            self.assertLessEqual(stats["p50_ms"], stats["p99_ms"])
+        # 通常サイクルは毎回フェイクのXに投稿し、概念化サイクルは2回LLMを呼び出す（要約とJSON変換は1回にまとめる）
+        self.assertEqual(report["posts_received"], 3)
+        self.assertEqual({k: v["calls"] for k, v in stages["conceptualize_cycle"]["llm_calls"].items()},
+                         {"summary_structured": 2, "cluster": 2})
+
+    def test_compare_detects_regression(self):
+        baseline = {"results": {"1000": {"normal_cycle": {"p50_ms": 10.0, "p99_ms": 20.0}}}}
+        report = {"results": {"1000": {"normal_cycle": {"p50_ms": 11.0, "p99_ms": 30.0},
+                                       "log_append": {"p50_ms": 1.0, "p99_ms": 1.0}}}}
+        regressions = benchmark.compare(report, baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn("p99_ms", regressions[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+# test/test_checkpoint.py
+import os
+import sys
+import shutil
+import asyncio
+import tempfile
+import unittest
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src.async_pipeline import Stage, StageError, run_dag
+from src.checkpoint import CheckpointStore
+
+
+class TestCheckpointResume(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.store = CheckpointStore(os.path.join(self.tmp_dir, 'checkpoints'))
+        self.calls = []
+        self.fail_structure = True
+        self.source = "記録"
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _stages(self):
+        def summary(text):
+            self.calls.append("summary")
+            return f"{text}の要約"
+
+        def structure(summary_text):
+            self.calls.append("structure")
+            if self.fail_structure:
+                raise RuntimeError("JSON変換に失敗")
+            return {"concept_name": summary_text}
+
+        return [
+            Stage("load", lambda: self.source),
+            Stage("summary", summary, ["load"], checkpoint=True),
+            Stage("structure", structure, ["summary"], checkpoint=True),
+        ]
+
+    def test_resume_from_failed_stage(self):
+        """失敗したステージから再開し、完了済みのステージは実行しないこと"""
+        with self.assertRaises(StageError):
+            asyncio.run(run_dag(self._stages(), self.store))
+        self.fail_structure = False
+        self.calls.clear()
+        results = asyncio.run(run_dag(self._stages(), self.store))
+        self.assertEqual(self.calls, ["structure"])
+        self.assertEqual(results["structure"], {"concept_name": "記録の要約"})
+
+    def test_changed_input_invalidates_checkpoint(self):
+        """入力が変わったステージは、チェックポイントを使わずに実行し直すこと"""
+        self.fail_structure = False
+        asyncio.run(run_dag(self._stages(), self.store))
+        self.source = "新しい記録"
+        self.calls.clear()
+        results = asyncio.run(run_dag(self._stages(), self.store))
+        self.assertEqual(self.calls, ["summary", "structure"])
+        self.assertEqual(results["summary"], "新しい記録の要約")
+        self.assertEqual(self.store.clear(), 2)
+        self.assertIsNone(self.store.load("summary", CheckpointStore.input_hash("summary", ["新しい記録"])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# test/test_cluster_map_reduce.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+from src import cluster_document, llm_gateway, llm_cache
+
+SMALL_CLUSTER_BUDGET = {"cluster": {"max_prompt_tokens": 2_100, "policy": "chunk", "keep": "head"}}
+
+
+def _clusters_json(themes):
+    return "```json\n" + json.dumps({"clusters": [
+        {"cluster_id": i, "theme": t, "summary": f"{t}の要約", "keywords": [t]} for i, t in enumerate(themes, 1)
+    ]}, ensure_ascii=False) + "\n```"
+
+
+class TestClusterMapReduce(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        llm_cache.set_cache(llm_cache.ResponseCache(self.tmp_dir))
+        self.client = MagicMock()
+        llm_gateway.set_client(self.client)
+
+    def tearDown(self):
+        llm_gateway.set_client(None)
+        llm_cache.set_cache(None)
+        shutil.rmtree(self.tmp_dir)
+
+    def _respond(self, model, contents, **kwargs):
+        if "部分ごとのクラスター" in contents:
+            return MagicMock(text=_clusters_json(["統合A", "統合B"]))
+        # チャンクごとに、共通のテーマ1つと固有のテーマ1つを返す
+        chunk_id = "前半" if "行000" in contents else "後半"
+        return MagicMock(text=_clusters_json(["共通テーマ", f"{chunk_id}のテーマ"]))
+
+    def test_single_chunk(self):
+        """予算に収まるテキストは1回の呼び出しでクラスタリングすること"""
+        self.client.models.generate_content.side_effect = self._respond
+        result = cluster_document.cluster_text("行000 短いテキスト", n_clusters=2)
+        self.assertEqual([c["theme"] for c in result["clusters"]], ["共通テーマ", "前半のテーマ"])
+        self.client.models.generate_content.assert_called_once()
+
+    @patch.dict('src.token_budget.BUDGETS', SMALL_CLUSTER_BUDGET)
+    def test_chunks_are_merged_and_deduped(self):
+        """チャンクごとの結果を統合し、同じテーマは1つにまとめること"""
+        self.client.models.generate_content.side_effect = self._respond
+        text = "\n".join(f"行{i:03d}" + "あ" * 20 for i in range(8))
+        result = cluster_document.cluster_text(text, n_clusters=3)
+        self.assertEqual(self.client.models.generate_content.call_count, 2)
+        self.assertEqual([c["theme"] for c in result["clusters"]], ["共通テーマ", "前半のテーマ", "後半のテーマ"])
+        self.assertEqual([c["cluster_id"] for c in result["clusters"]], [1, 2, 3])
+
+    @patch.dict('src.token_budget.BUDGETS', SMALL_CLUSTER_BUDGET)
+    def test_reduce_to_configured_size(self):
+        """部分クラスターが指定数より多い場合は、Geminiで指定数に統合すること"""
+        self.client.models.generate_content.side_effect = self._respond
+        text = "\n".join(f"行{i:03d}" + "あ" * 20 for i in range(8))
+        result = cluster_document.cluster_text(text, n_clusters=2)
+        self.assertEqual(self.client.models.generate_content.call_count, 3)
+        self.assertEqual(result, {"clusters": [
+            {"cluster_id": 1, "theme": "統合A", "summary": "統合Aの要約", "keywords": ["統合A"]},
+            {"cluster_id": 2, "theme": "統合B", "summary": "統合Bの要約", "keywords": ["統合B"]},
+        ]})
+
+    def test_dedupe_normalizes_theme(self):
+        """全角/半角や空白の違いだけのテーマ名は同じものとして統合すること"""
+        merged = cluster_document.dedupe_clusters([
+            {"theme": "AI 倫理", "summary": "短い", "keywords": ["a"]},
+            {"theme": "ＡＩ倫理", "summary": "より長い要約", "keywords": ["a", "b"]},
+        ])
+        self.assertEqual(merged, [{"theme": "AI 倫理", "summary": "より長い要約", "keywords": ["a", "b"]}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# test/test_daemon.py
+import os
+import sys
+import json
+import signal
+import asyncio
+import shutil
+import tempfile
+import threading
+import subprocess
+import unittest
+from unittest.mock import patch
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src import daemon
+from src import main as bot_main
+
+
+class TestDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.cycles = []
+        self.flushes = []
+
+    def _daemon(self, **kwargs) -> daemon.Daemon:
+        return daemon.Daemon(cycle=lambda: self.cycles.append(1) or "normal", flush=lambda: self.flushes.append(1),
+                             **kwargs)
+
+    def test_cycles_are_flushed_in_batches(self):
+        """flush_every サイクルごとにまとめて保存し、終了時に残りを保存すること"""
+        asyncio.run(self._daemon(interval=0.01, flush_every=2, max_cycles=5).run())
+        self.assertEqual(len(self.cycles), 5)
+        self.assertEqual(len(self.flushes), 3)
+
+    def test_failed_cycle_does_not_stop_daemon(self):
+        def failing():
+            self.cycles.append(1)
+            sys.exit(1)
+
+        d = daemon.Daemon(interval=0.01, cycle=failing, flush=lambda: self.flushes.append(1), max_cycles=2)
+        asyncio.run(d.run())
+        self.assertEqual(len(self.cycles), 2)
+
+    def test_sigterm_stops_gracefully(self):
+        """SIGTERMを受け取ると、次のサイクルを待たずに保存して終了すること"""
+        async def main():
+            d = self._daemon(interval=3600, flush_every=10)
+            asyncio.get_running_loop().call_later(0.2, os.kill, os.getpid(), signal.SIGTERM)
+            await asyncio.wait_for(d.run(), 5)
+
+        asyncio.run(main())
+        self.assertEqual(len(self.cycles), 1)
+        self.assertEqual(len(self.flushes), 1)
+
+    def test_reports_each_cycle_and_saves_state_on_flush(self):
+        """サイクルごとに report を呼び、状態の保存は flush のときだけ行うこと"""
+        reports, saves = [], []
+        d = daemon.Daemon(lambda: "normal", interval=0.01, flush_every=2, max_cycles=3,
+                          report=reports.append, save_state=lambda: saves.append(1))
+        asyncio.run(d.run())
+        self.assertEqual(reports, ["normal"] * 3)
+        self.assertEqual(len(saves), 2)
+
+    def test_does_not_import_main(self):
+        """daemon は src.main を読み込まない（python src/main.py --daemon で main が二重に読み込まれないよう）"""
+        code = "import sys; from src import daemon; print('src.main' in sys.modules)"
+        result = subprocess.run([sys.executable, "-c", code], cwd=project_root, capture_output=True, text=True,
+                                check=True)
+        self.assertEqual(result.stdout.strip(), "False")
+
+
+@patch('src.model_router.save_stats', lambda path=None: False)
+class TestResidentState(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        kb = os.path.join(self.tmp_dir, 'knowledge_base')
+        os.makedirs(kb)
+        self.paths = patch.multiple(bot_main,
+                                    KNOWLEDGE_DB_PATH=os.path.join(kb, 'knowledge.db'),
+                                    ALL_KNOWLEDGE_LOG_PATH=os.path.join(kb, 'all_knowledge_log.json'),
+                                    RECENT_KNOWLEDGE_PATH=os.path.join(kb, 'recent_knowledge.json'),
+                                    HIGH_LEVEL_CONCEPTS_PATH=os.path.join(kb, 'high_level_concepts.json'),
+                                    ACTIVITY_CLUSTERS_PATH=os.path.join(kb, 'activity_clusters.json'),
+                                    TOPIC_STATE_PATH=os.path.join(kb, 'topic_state.json'),
+                                    OUTBOX_PATH=os.path.join(self.tmp_dir, 'outbox.jsonl'))
+        self.paths.start()
+        bot_main.enable_resident_state()
+
+    def tearDown(self):
+        bot_main.close_resident_state()
+        self.paths.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_db_and_outbox_are_kept_until_flush(self):
+        """常駐モードでは知識DBの接続を使い回し、JSONファイルとアウトボックスは flush でまとめて書き出すこと"""
+        entry = {"theme": "A", "tweet": "ツイート", "created_at": "2024-01-01T00:00:00"}
+        bot_main.save_entries([entry])
+        bot_main.get_outbox().enqueue([{"text": "ツイート", "theme": "A"}])
+        self.assertIs(bot_main.get_knowledge_db(), bot_main.get_knowledge_db())
+        # 別スレッド（サイクルは asyncio.to_thread で実行する）からも同じ接続を使える
+        counts = []
+        thread = threading.Thread(target=lambda: counts.append(bot_main.get_current_post_count()))
+        thread.start()
+        thread.join()
+        self.assertEqual(counts, [1])
+        self.assertFalse(os.path.exists(bot_main.RECENT_KNOWLEDGE_PATH))
+        self.assertFalse(os.path.exists(bot_main.OUTBOX_PATH))
+
+        bot_main.flush_resident_state()
+        with open(bot_main.RECENT_KNOWLEDGE_PATH, encoding='utf-8') as f:
+            self.assertEqual(json.load(f)["knowledge_entries"], [entry])
+        self.assertEqual(bot_main.get_all_log_store().entries(), [entry])
+        self.assertEqual(len(bot_main.outbox.Outbox(bot_main.OUTBOX_PATH).pending()), 1)
+        # 書き出し済みのエントリは、次の flush で二重に追記しない
+        bot_main.flush_resident_state()
+        self.assertEqual(bot_main.get_all_log_store().entries(), [entry])
+
+
+class TestGitFlush(unittest.TestCase):
+
+    def setUp(self):
+        self.repo = tempfile.mkdtemp()
+        self.env = patch.dict(os.environ, {"GIT_AUTHOR_NAME": "bot", "GIT_AUTHOR_EMAIL": "bot@example.com",
+                                           "GIT_COMMITTER_NAME": "bot", "GIT_COMMITTER_EMAIL": "bot@example.com"})
+        self.env.start()
+        subprocess.run(["git", "init", "-q"], cwd=self.repo, check=True)
+
+    def tearDown(self):
+        self.env.stop()
+        shutil.rmtree(self.repo)
+
+    def test_commits_only_when_data_changed(self):
+        os.makedirs(os.path.join(self.repo, "data"))
+        with open(os.path.join(self.repo, "data", "log.json"), "w") as f:
+            f.write("{}")
+        self.assertTrue(daemon.git_flush(self.repo, push=False))
+        self.assertFalse(daemon.git_flush(self.repo, push=False))
+        log = subprocess.run(["git", "log", "--format=%s"], cwd=self.repo, capture_output=True, text=True).stdout
+        self.assertEqual(log.strip(), daemon.GIT_COMMIT_MESSAGE)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+# test/test_docx_cache.py
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from docx import Document
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src import docx_cache, from_docx_import_Document
+
+
+class TestDocxCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.docx_path = os.path.join(self.tmp_dir, 'base.docx')
+        document = Document()
+        document.add_paragraph("")
+        document.add_paragraph("最初の段落")
+        table = document.add_table(rows=1, cols=2)
+        table.cell(0, 0).text = "表のセル1"
+        table.cell(0, 1).text = "表のセル2"
+        document.add_paragraph("最後の段落")
+        document.save(self.docx_path)
+        docx_cache._verified.clear()
+
+    def tearDown(self):
+        docx_cache.wait_for_sidecars()
+        docx_cache._verified.clear()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_extracts_tables(self):
+        """本文だけでなく表の中の段落も文書順に抽出すること"""
+        self.assertEqual(docx_cache.read_text(self.docx_path), "最初の段落\n表のセル1\n表のセル2\n最後の段落")
+        self.assertTrue(os.path.exists(docx_cache.sidecar_path(self.docx_path)))
+        self.assertEqual(docx_cache.read_paragraphs(self.docx_path, kinds=("body",)), ["", "最初の段落", "最後の段落"])
+
+    def test_second_read_uses_sidecar(self):
+        """2回目以降はdocxを解析せず、サイドカーから読み込むこと"""
+        docx_cache.read_paragraphs(self.docx_path)
+        with patch('src.docx_cache.extract_paragraphs') as mock_extract:
+            docx_cache.read_paragraphs(self.docx_path)
+            # 更新時刻だけが変わった場合は、ハッシュで同一と判定して解析しない
+            os.utime(self.docx_path, (0, 0))
+            docx_cache.read_paragraphs(self.docx_path)
+            mock_extract.assert_not_called()
+
+    def test_sidecar_is_stable_across_checkouts(self):
+        """サイドカーに更新時刻を保存せず、チェックアウトし直しても（更新時刻だけ変わっても）書き換えないこと"""
+        docx_cache.read_paragraphs(self.docx_path)
+        sidecar = docx_cache.sidecar_path(self.docx_path)
+        with open(sidecar, encoding='utf-8') as f:
+            saved = f.read()
+        self.assertNotIn("mtime", saved)
+        # 別のプロセスでチェックアウトし直した場合
+        docx_cache._verified.clear()
+        os.utime(self.docx_path, (0, 0))
+        os.utime(sidecar, (0, 0))
+        docx_cache.read_paragraphs(self.docx_path)
+        self.assertEqual(os.stat(sidecar).st_mtime, 0)
+        # 同じプロセスでは、更新時刻とサイズが変わらなければハッシュも計算しない
+        with patch('src.docx_cache.file_sha256') as mock_hash:
+            docx_cache.read_paragraphs(self.docx_path)
+            mock_hash.assert_not_called()
+
+    def test_first_paragraph_stops_early_without_sidecar(self):
+        """サイドカーがなければ、文書全体の解析を待たずに最初の段落を返し、サイドカーは別スレッドで作ること"""
+        sidecar = docx_cache.sidecar_path(self.docx_path)
+        release = threading.Event()
+        extract = docx_cache.extract_paragraphs
+
+        def slow_extract(path):
+            release.wait(5)
+            return extract(path)
+
+        with patch('src.docx_cache.extract_paragraphs', side_effect=slow_extract):
+            self.assertEqual(from_docx_import_Document.read_base_docx_text(self.docx_path), "最初の段落")
+            self.assertFalse(os.path.exists(sidecar))
+            release.set()
+            docx_cache.wait_for_sidecars()
+        self.assertTrue(os.path.exists(sidecar))
+        # サイドカーができた後は、docxを読まずにサイドカーから返す
+        with patch('src.docx_cache.docx_stream.first_paragraphs') as mock_stream:
+            self.assertEqual(from_docx_import_Document.read_base_docx_text(self.docx_path), "最初の段落")
+            mock_stream.assert_not_called()
+
+    def test_changed_file_is_reparsed(self):
+        """内容が変わった場合は解析し直すこと"""
+        docx_cache.read_paragraphs(self.docx_path)
+        document = Document()
+        document.add_paragraph("新しい段落")
+        document.save(self.docx_path)
+        self.assertEqual(docx_cache.read_text(self.docx_path), "新しい段落")
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            docx_cache.read_paragraphs(os.path.join(self.tmp_dir, 'missing.docx'))
+
+
+if __name__ == '__main__':
+    unittest.main()
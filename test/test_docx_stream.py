@@ -0,0 +1,58 @@
+# test/test_docx_stream.py
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from docx import Document
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src import docx_stream
+
+
+class TestDocxStream(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.docx_path = os.path.join(self.tmp_dir, 'base.docx')
+        document = Document()
+        document.add_paragraph("")
+        document.add_paragraph("はじめに")
+        document.add_table(rows=1, cols=1).cell(0, 0).text = "表のセル"
+        for i in range(1000):
+            document.add_paragraph(f"第{i}段落の本文")
+        document.save(self.docx_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_kinds(self):
+        """段落の種類（本文・表）を区別して返すこと"""
+        paragraphs = list(docx_stream.iter_paragraphs(self.docx_path))
+        self.assertEqual(paragraphs[:3], [("body", ""), ("body", "はじめに"), ("table", "表のセル")])
+        self.assertEqual(len(paragraphs), 1003)
+
+    def test_first_paragraphs(self):
+        """空の段落を飛ばして先頭のN段落を返すこと"""
+        self.assertEqual(docx_stream.first_paragraphs(self.docx_path, 2), ["はじめに", "表のセル"])
+        self.assertEqual(docx_stream.first_paragraphs(self.docx_path, 2, kinds=("body",)), ["はじめに", "第0段落の本文"])
+
+    def test_first_chars(self):
+        text = docx_stream.first_chars(self.docx_path, 10)
+        self.assertEqual(text, "はじめに\n表のセル\n")
+
+    def test_paragraphs_matching(self):
+        """条件に合う段落をlimit件まで返すこと"""
+        matches = docx_stream.paragraphs_matching(self.docx_path, lambda t: t.startswith("第99"), limit=3)
+        self.assertEqual(matches, ["第99段落の本文", "第990段落の本文", "第991段落の本文"])
+
+    def test_missing_file(self):
+        with self.assertRaises(FileNotFoundError):
+            docx_stream.first_paragraphs(os.path.join(self.tmp_dir, 'missing.docx'), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# test/test_import_time.py
+import os
+import re
+import sys
+import json
+import subprocess
+import unittest
+from unittest.mock import patch
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+import config
+
+# `import src.main` にかけてよい時間（ミリ秒）。遅延読み込みを導入する前は約900ms、導入後は約50ms。
+IMPORT_TIME_BUDGET_MS = 300
+# src.main を読み込んだだけでは読み込まれてはいけない重いモジュール
+HEAVY_MODULES = ["google.genai", "requests", "requests_oauthlib", "numpy", "docx", "dotenv", "asyncio"]
+
+
+def _run_python(code: str, *args: str) -> subprocess.CompletedProcess:
+    """APIキーを設定していない環境で、新しいPythonプロセスとしてコードを実行する"""
+    env = {k: v for k, v in os.environ.items() if k not in config.GEMINI_KEYS + config.X_KEYS}
+    return subprocess.run([sys.executable, *args, "-c", code], cwd=project_root, env=env,
+                          capture_output=True, text=True, timeout=60)
+
+
+class TestImportTime(unittest.TestCase):
+
+    def test_import_does_not_load_heavy_modules(self):
+        """APIキーがなくても src.main を読み込め、重いモジュールは読み込まないこと"""
+        result = _run_python(f"import sys, json, src.main; print(json.dumps(sorted(set({HEAVY_MODULES!r}) & set(sys.modules))))")
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(json.loads(result.stdout.strip().splitlines()[-1]), [])
+
+    def test_cold_start_within_budget(self):
+        """src.main のコールドスタート時間（-X importtime の累積値）が予算内であること"""
+        timings = []
+        for _ in range(3):
+            result = _run_python("import src.main", "-X", "importtime")
+            self.assertEqual(result.returncode, 0, result.stderr)
+            match = re.search(r"^import time:\s*\d+ \|\s*(\d+) \| src\.main$", result.stderr, re.MULTILINE)
+            timings.append(int(match.group(1)) / 1000)
+        self.assertLess(min(timings), IMPORT_TIME_BUDGET_MS, f"import src.main: {min(timings):.1f}ms")
+
+
+class TestConfigValidation(unittest.TestCase):
+
+    @patch('config._env_loaded', True)
+    def test_validation_runs_only_when_called(self):
+        with patch.dict(os.environ, {"X_API_KEY": "key"}, clear=True):
+            self.assertIsNone(config.GEMINI_API_KEY)
+            with self.assertRaises(ValueError):
+                config.validate_gemini()
+            with self.assertRaises(ValueError):
+                config.validate_x()
+        with patch.dict(os.environ, {"GEMINI_API_KEY": "key"}, clear=True):
+            config.validate()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# test/test_incremental_concept.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+from src import concept_generator, llm_gateway, llm_cache
+
+CONCEPT = {"concept_name": "概念", "summary": "要約", "components": ["要素A"], "implication": "課題"}
+
+
+def _fake_response(prompt):
+    if "【新しい要点メモ】" in prompt:
+        return MagicMock(text="```json\n" + json.dumps(CONCEPT, ensure_ascii=False) + "\n```")
+    return MagicMock(text="- 要点")
+
+
+class TestIncrementalConcept(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        llm_cache.set_cache(llm_cache.ResponseCache(os.path.join(self.tmp_dir, 'cache')))
+        self.client = MagicMock()
+        self.client.models.generate_content.side_effect = lambda model, contents, **kw: _fake_response(contents)
+        llm_gateway.set_client(self.client)
+        self.paths = {name: os.path.join(self.tmp_dir, name) for name in
+                      ("state.json", "history.jsonl", "summary.md", "concept.json")}
+
+    def tearDown(self):
+        llm_gateway.set_client(None)
+        llm_cache.set_cache(None)
+        shutil.rmtree(self.tmp_dir)
+
+    def _update(self, entries):
+        p = self.paths
+        return concept_generator.update_concept_incrementally(
+            entries, p["state.json"], p["history.jsonl"], p["summary.md"], p["concept.json"])
+
+    def _entries(self, start, end):
+        return [(i, {"theme": f"テーマ{i}", "tweet": f"ツイート{i}"}) for i in range(start, end)]
+
+    @patch('src.concept_generator.INCREMENTAL_CHUNK_SIZE', 10)
+    def test_chunks_and_checkpoint(self):
+        """一定件数ごとに要点を抽出し、取り込み済みのIDを状態ファイルに記録すること"""
+        self.assertEqual(self._update(self._entries(1, 26)), CONCEPT)
+        # 25件 → 要点抽出3回 + 統合1回
+        self.assertEqual(self.client.models.generate_content.call_count, 4)
+        with open(self.paths["state.json"], encoding='utf-8') as f:
+            state = json.load(f)
+        self.assertEqual(state["last_entry_id"], 25)
+        self.assertEqual(state["pending_notes"], [])
+
+    @patch('src.concept_generator.INCREMENTAL_CHUNK_SIZE', 10)
+    def test_only_new_entries_are_folded(self):
+        """2回目は前回以降のエントリだけを処理し、概念の履歴が追記されること"""
+        self._update(self._entries(1, 11))
+        self.client.models.generate_content.reset_mock()
+        self._update(self._entries(1, 16))
+        prompts = [c.kwargs["contents"] for c in self.client.models.generate_content.call_args_list]
+        self.assertEqual(len(prompts), 2)
+        self.assertIn("ツイート11", prompts[0])
+        self.assertNotIn("ツイート10\n", prompts[0])
+        with open(self.paths["history.jsonl"], encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    @patch('src.concept_generator.INCREMENTAL_CHUNK_SIZE', 10)
+    def test_resume_after_failed_fold(self):
+        """統合に失敗しても要点メモは保存され、次回は要点抽出をやり直さないこと"""
+        self.client.models.generate_content.side_effect = lambda model, contents, **kw: (
+            MagicMock(text="JSONではない") if "【新しい要点メモ】" in contents else _fake_response(contents))
+        self.assertIsNone(self._update(self._entries(1, 11)))
+        self.client.models.generate_content.side_effect = lambda model, contents, **kw: _fake_response(contents)
+        self.client.models.generate_content.reset_mock()
+        self.assertEqual(self._update(self._entries(1, 11)), CONCEPT)
+        self.assertEqual(self.client.models.generate_content.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
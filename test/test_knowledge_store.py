@@ -0,0 +1,83 @@
+# test/test_knowledge_store.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src import knowledge_store
+
+
+class TestKnowledgeStoreInterface(unittest.TestCase):
+
+    def test_incomplete_store_cannot_be_instantiated(self):
+        """append / entries を実装していない保存先は、使う前（生成時）にエラーになること"""
+        class AppendOnlyStore(knowledge_store.KnowledgeStore):
+            def append(self, entry: dict) -> None:
+                pass
+
+        with self.assertRaises(TypeError):
+            AppendOnlyStore()
+
+
+class TestJournalKnowledgeStore(unittest.TestCase):
+
+    def setUp(self):
+        """テスト用の一時ディレクトリに、既存形式のスナップショットを用意する"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.snapshot_path = os.path.join(self.tmp_dir, 'all_knowledge_log.json')
+        with open(self.snapshot_path, 'w', encoding='utf-8') as f:
+            json.dump({"knowledge_entries": [{"theme": "既存", "tweet": "既存のツイート"}]}, f, ensure_ascii=False)
+        self.store = knowledge_store.JournalKnowledgeStore(self.snapshot_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_append_does_not_rewrite_snapshot(self):
+        """追記はジャーナルにのみ行われ、スナップショットは変更されないこと"""
+        before = os.path.getmtime(self.snapshot_path)
+        self.store.append({"theme": "新規", "tweet": "新しいツイート"})
+        self.assertEqual(os.path.getmtime(self.snapshot_path), before)
+        with open(self.store.journal_path, 'r', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 1)
+        self.assertEqual(self.store.count(), 2)
+        self.assertEqual(self.store.latest()["theme"], "新規")
+
+    def test_compatibility_view(self):
+        """互換リーダーがスナップショットとジャーナルを合わせたビューを返すこと"""
+        self.store.extend([{"theme": "A"}, {"theme": "B"}])
+        view = knowledge_store.load_knowledge_view(self.snapshot_path)
+        self.assertEqual([e["theme"] for e in view["knowledge_entries"]], ["既存", "A", "B"])
+
+    def test_truncated_journal_line_is_ignored(self):
+        """書き込み途中で途切れた末尾行があっても読み込めること"""
+        self.store.append({"theme": "A"})
+        with open(self.store.journal_path, 'a', encoding='utf-8') as f:
+            f.write('{"theme": "途中')
+        self.assertEqual(self.store.count(), 2)
+
+    def test_compact(self):
+        """compact()でジャーナルがスナップショットに統合されること"""
+        self.store.extend([{"theme": "A"}, {"theme": "B"}])
+        self.assertEqual(self.store.compact(), 2)
+        self.assertFalse(os.path.exists(self.store.journal_path))
+        with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        self.assertEqual(len(data["knowledge_entries"]), 3)
+
+    def test_recover_interrupted_compaction(self):
+        """compact()がスナップショット置き換え前に中断されても、エントリが失われないこと"""
+        self.store.append({"theme": "A"})
+        os.replace(self.store.journal_path, self.store.compacting_path)
+        self.store.append({"theme": "B"})
+        recovered = knowledge_store.JournalKnowledgeStore(self.snapshot_path)
+        self.assertEqual([e["theme"] for e in recovered.entries()], ["既存", "A", "B"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+# test/test_llm_cache.py
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src import llm_cache
+
+
+class TestResponseCache(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache = llm_cache.ResponseCache(self.cache_dir, max_bytes=10_000, ttls={"cluster": 60, "short": 1})
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_key_depends_on_model_prompt_and_config(self):
+        """モデル・プロンプト・ツール設定のいずれかが違えば別のキーになること"""
+        base = llm_cache.cache_key("m", "p", None)
+        self.assertEqual(base, llm_cache.cache_key("m", "p", None))
+        self.assertNotEqual(base, llm_cache.cache_key("m2", "p", None))
+        self.assertNotEqual(base, llm_cache.cache_key("m", "p2", None))
+        self.assertNotEqual(base, llm_cache.cache_key("m", "p", {"tools": [{"google_search": {}}]}))
+
+    def test_put_and_get(self):
+        key = llm_cache.cache_key("m", "p")
+        self.cache.put(key, "cluster", "m", "応答")
+        self.assertEqual(self.cache.get(key, "cluster"), "応答")
+
+    def test_ttl_expiry(self):
+        """呼び出し元ごとの有効期限を過ぎた応答は返さないこと"""
+        key = llm_cache.cache_key("m", "p")
+        self.cache.put(key, "short", "m", "応答")
+        real_time = time.time
+        with patch('src.llm_cache.time.time', lambda: real_time() + 5):
+            self.assertIsNone(self.cache.get(key, "short"))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, f"{key}.json")))
+
+    def test_lru_eviction(self):
+        """容量上限を超えると、最終アクセスが最も古い応答から削除されること"""
+        keys = [llm_cache.cache_key("m", f"p{i}") for i in range(3)]
+        now = time.time()
+        for i, key in enumerate(keys):
+            with patch('src.llm_cache.time.time', lambda: now + i):
+                self.cache.put(key, "cluster", "m", "x" * 3000)
+        # keys[0]に最近アクセスしたことにする
+        with patch('src.llm_cache.time.time', lambda: now + 10):
+            self.cache.get(keys[0], "cluster")
+        # チェックアウトし直した場合のように、ファイルの更新時刻はアクセス順と逆にしておく
+        for i, key in enumerate(keys):
+            os.utime(os.path.join(self.cache_dir, f"{key}.json"), (now - i, now - i))
+        with patch('src.llm_cache.time.time', lambda: now + 20):
+            self.cache.put(llm_cache.cache_key("m", "p3"), "cluster", "m", "x" * 3000)
+        self.assertIsNotNone(self.cache.get(keys[0], "cluster"))
+        self.assertIsNone(self.cache.get(keys[1], "cluster"))
+
+    def test_eviction_tolerates_removed_files(self):
+        """一覧を取った後に他のスレッドが削除した記録があっても、evict が失敗しないこと"""
+        for i in range(2):
+            self.cache.put(llm_cache.cache_key("m", f"p{i}"), "cluster", "m", "x" * 3000)
+        self.cache.max_bytes = 0
+        listed = os.listdir(self.cache_dir) + ["removed.json"]
+        with patch('src.llm_cache.os.listdir', lambda path: listed):
+            self.assertEqual(self.cache.evict(), 2)
+
+    def test_concurrent_puts_over_limit(self):
+        """並行スレッドからの put で容量上限を超え続けても、例外にならず上限内に収まること"""
+        def put(i):
+            key = llm_cache.cache_key("m", f"p{i}")
+            self.cache.put(key, "cluster", "m", "x" * 3000)
+            self.cache.get(key, "cluster")
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(put, range(40)))
+        total = sum(os.path.getsize(os.path.join(self.cache_dir, n)) for n in os.listdir(self.cache_dir))
+        self.assertLessEqual(total, self.cache.max_bytes)
+
+
+if __name__ == '__main__':
+    unittest.main()
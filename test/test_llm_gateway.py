@@ -0,0 +1,118 @@
+# test/test_llm_gateway.py
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+from src import llm_gateway, llm_cache, resilience, deadline
+
+
+class TestLLMGateway(unittest.TestCase):
+
+    def setUp(self):
+        llm_gateway.set_client(None)
+        self.cache_dir = tempfile.mkdtemp()
+        llm_cache.set_cache(llm_cache.ResponseCache(self.cache_dir))
+        # data/ のサーキットブレーカーの状態に左右されないよう、状態を保存しないポリシーを使う
+        llm_gateway.set_retry_policy(resilience.RetryPolicy(sleep=lambda s: None))
+
+    def tearDown(self):
+        llm_gateway.set_client(None)
+        llm_gateway.set_retry_policy(None)
+        llm_cache.set_cache(None)
+        shutil.rmtree(self.cache_dir)
+
+    @patch('src.llm_gateway.genai.Client')
+    def test_client_is_created_once(self, mock_client_cls):
+        """複数回呼び出しても、クライアントは1度しか生成されないこと"""
+        mock_client_cls.return_value.models.generate_content.return_value = MagicMock(text="応答")
+        self.assertEqual(llm_gateway.generate("質問1", model="m", call_site="research"), "応答")
+        self.assertEqual(llm_gateway.generate("質問2", model="m", call_site="summary"), "応答")
+        mock_client_cls.assert_called_once()
+
+    def test_latency_is_recorded(self):
+        """呼び出しごとのレイテンシが呼び出し元ごとに集計されること"""
+        fake_client = MagicMock()
+        fake_client.models.generate_content.return_value = MagicMock(text="{}")
+        llm_gateway.set_client(fake_client)
+        before = len(llm_gateway.get_call_stats())
+        llm_gateway.generate("プロンプト", model="m", call_site="cluster")
+        stats = llm_gateway.get_call_stats()[before:]
+        self.assertEqual(len(stats), 1)
+        self.assertEqual(stats[0]["call_site"], "cluster")
+        self.assertTrue(stats[0]["ok"])
+        self.assertIn("cluster", llm_gateway.summarize_latency())
+
+    def test_failed_call_is_recorded(self):
+        """失敗した呼び出しも記録され、例外は呼び出し元に伝わること"""
+        fake_client = MagicMock()
+        fake_client.models.generate_content.side_effect = RuntimeError("boom")
+        llm_gateway.set_client(fake_client)
+        with self.assertRaises(RuntimeError):
+            llm_gateway.generate("プロンプト", model="m", call_site="structure")
+        self.assertFalse(llm_gateway.get_call_stats()[-1]["ok"])
+
+    def test_cache_hit_skips_network(self):
+        """同じプロンプトの2回目はキャッシュから応答し、APIを呼び出さないこと"""
+        fake_client = MagicMock()
+        fake_client.models.generate_content.return_value = MagicMock(text="クラスタ")
+        llm_gateway.set_client(fake_client)
+        for _ in range(2):
+            self.assertEqual(llm_gateway.generate("同じ本文", model="m", call_site="cluster"), "クラスタ")
+        fake_client.models.generate_content.assert_called_once()
+        self.assertTrue(llm_gateway.get_call_stats()[-1]["cached"])
+
+    def test_uncached_call_site(self):
+        """有効期限0の呼び出し元（research）は毎回APIを呼び出すこと"""
+        fake_client = MagicMock()
+        fake_client.models.generate_content.return_value = MagicMock(text="調査結果")
+        llm_gateway.set_client(fake_client)
+        for _ in range(2):
+            llm_gateway.generate("同じ調査", model="m", call_site="research")
+        self.assertEqual(fake_client.models.generate_content.call_count, 2)
+
+    @patch('src.llm_cache.BYPASS', True)
+    def test_bypass(self):
+        """バイパス指定時はキャッシュがあってもAPIを呼び出すこと"""
+        fake_client = MagicMock()
+        fake_client.models.generate_content.return_value = MagicMock(text="クラスタ")
+        llm_gateway.set_client(fake_client)
+        for _ in range(2):
+            llm_gateway.generate("同じ本文", model="m", call_site="cluster")
+        self.assertEqual(fake_client.models.generate_content.call_count, 2)
+
+    @patch('src.llm_cache.REPLAY', True)
+    def test_replay_without_client(self):
+        """リプレイモードではキャッシュのみから応答し、クライアントを生成しないこと"""
+        key = llm_cache.cache_key("m", "記録済み", None)
+        llm_cache.get_cache().put(key, "research", "m", "記録済みの応答")
+        with patch('src.llm_gateway.genai.Client') as mock_client_cls:
+            self.assertEqual(llm_gateway.generate("記録済み", model="m", call_site="research"), "記録済みの応答")
+            with self.assertRaises(LookupError):
+                llm_gateway.generate("未記録", model="m", call_site="research")
+            mock_client_cls.assert_not_called()
+
+    def test_http_timeout_follows_stage_deadline(self):
+        """HTTPの制限時間はステージの残り時間以内にし、期限を過ぎたら呼び出さないこと"""
+        fake_client = MagicMock()
+        fake_client.models.generate_content.return_value = MagicMock(text="応答")
+        llm_gateway.set_client(fake_client)
+        with deadline.scope(5):
+            llm_gateway.generate("プロンプト", model="m", call_site="research")
+        timeout_ms = fake_client.models.generate_content.call_args.kwargs["config"]["http_options"]["timeout"]
+        self.assertLessEqual(timeout_ms, 5000)
+        with deadline.scope(0):
+            with self.assertRaises(deadline.DeadlineExceeded):
+                llm_gateway.generate("プロンプト2", model="m", call_site="research")
+        self.assertEqual(fake_client.models.generate_content.call_count, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+# test/test_model_router.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+from src import model_router, llm_gateway, llm_cache, resilience
+
+
+class APIError(Exception):
+    def __init__(self, code):
+        self.code = code
+        super().__init__(f"{code} error")
+
+
+@patch.dict(model_router.TIERS, {"deep": ["deep-a", "deep-b"], "standard": ["std-a", "std-b"],
+                                 "fast": ["fast-a", "fast-b"]})
+class TestModelRouter(unittest.TestCase):
+
+    def setUp(self):
+        # data/metrics のモデルの記録に左右されないよう、空の記録から始める
+        model_router.reset_stats({})
+        self.tmp_dir = tempfile.mkdtemp()
+        llm_gateway.set_client(None)
+        llm_cache.set_cache(llm_cache.ResponseCache(os.path.join(self.tmp_dir, "cache")))
+        llm_gateway.set_retry_policy(resilience.RetryPolicy(sleep=lambda s: None))
+
+    def tearDown(self):
+        model_router.reset_stats(None)
+        llm_gateway.set_client(None)
+        llm_gateway.set_retry_policy(None)
+        llm_cache.set_cache(None)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_routes_by_call_site_and_prompt_length(self):
+        """整形の処理は fast、短い standard の処理も fast に回り、ツールを使う処理は段階を変えないこと"""
+        self.assertEqual(model_router.candidates("structure", 20_000), ["fast-a", "fast-b"])
+        self.assertEqual(model_router.candidates("research", 100, uses_tools=True), ["deep-a", "deep-b"])
+        self.assertEqual(model_router.tier_for("cluster", 50_000), "standard")
+        self.assertEqual(model_router.tier_for("cluster", 500), "fast")
+        self.assertEqual(model_router.tier_for("cluster", 500, uses_tools=True), "standard")
+
+    def test_orders_by_latency_and_success_rate(self):
+        """fast の段階は記録したレイテンシの短い順に、成功率の低いモデルはどの段階でも最後に回ること"""
+        for _ in range(3):
+            model_router.record("fast-a", 2.0, True)
+            model_router.record("fast-b", 0.5, True)
+        self.assertEqual(model_router.candidates("json_repair"), ["fast-b", "fast-a"])
+        # deep の段階はレイテンシでは並べ替えない
+        model_router.record("deep-a", 9.0, True)
+        self.assertEqual(model_router.candidates("summary"), ["deep-a", "deep-b"])
+        for _ in range(5):
+            model_router.record("deep-a", 1.0, False)
+        self.assertLess(model_router.get_stats()["deep-a"]["success_rate"], model_router.MIN_SUCCESS_RATE)
+        self.assertEqual(model_router.candidates("summary"), ["deep-b", "deep-a"])
+
+    def test_gateway_falls_back_to_next_model(self):
+        """モデルが見つからない場合は次の候補のモデルで応答し、モデルごとの記録に失敗と成功が残ること"""
+        fake_client = MagicMock()
+
+        def generate_content(model, contents, config):
+            if model == "deep-a":
+                raise APIError(404)
+            return MagicMock(text=f"{model}の応答", usage_metadata=None)
+        fake_client.models.generate_content.side_effect = generate_content
+        llm_gateway.set_client(fake_client)
+        llm_gateway.start_run()
+
+        self.assertEqual(llm_gateway.generate("要約して", call_site="summary"), "deep-bの応答")
+        by_model = llm_gateway.summarize_models()
+        self.assertEqual(by_model["deep-a"]["failures"], 1)
+        self.assertEqual(by_model["deep-b"]["success_rate"], 1.0)
+        self.assertEqual(model_router.get_stats()["deep-a"]["failures"], 1)
+        # 次の呼び出しはキャッシュから応答する（選ばれたモデルが変わっても同じキャッシュを使う）
+        self.assertEqual(llm_gateway.generate("要約して", call_site="summary"), "deep-bの応答")
+        self.assertEqual(fake_client.models.generate_content.call_count, 2)
+
+    def test_request_errors_do_not_fall_back(self):
+        """リクエストの誤り（400）は、別のモデルでも同じ結果になるため切り替えないこと"""
+        fake_client = MagicMock()
+        fake_client.models.generate_content.side_effect = APIError(400)
+        llm_gateway.set_client(fake_client)
+        with self.assertRaises(APIError):
+            llm_gateway.generate("整形して", call_site="structure", use_cache=False)
+        self.assertEqual(fake_client.models.generate_content.call_count, 1)
+
+    def test_save_stats_only_when_changed(self):
+        """記録に変更があるときだけ保存し、保存した記録を次の実行で読み込めること"""
+        path = os.path.join(self.tmp_dir, "model_stats.json")
+        self.assertFalse(model_router.save_stats(path))
+        model_router.record("fast-b", 0.3, True)
+        self.assertTrue(model_router.save_stats(path))
+        self.assertFalse(model_router.save_stats(path))
+        with open(path, encoding="utf-8") as f:
+            saved = json.load(f)
+        self.assertEqual(saved["models"]["fast-b"]["avg_seconds"], 0.3)
+
+        with patch.object(model_router, "STATS_PATH", path):
+            model_router.reset_stats(None)
+            self.assertEqual(model_router.candidates("structure"), ["fast-b", "fast-a"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+# test/test_outbox.py
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+for key in ("GEMINI_API_KEY", "X_API_KEY", "X_API_SECRET", "X_ACCESS_TOKEN", "X_ACCESS_TOKEN_SECRET"):
+    os.environ.setdefault(key, "test-key")
+
+from src import x_poster
+from src.outbox import Outbox, RateLimitScheduler
+from test.fakes import FakeXServer
+
+
+class TestOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.outbox = Outbox(os.path.join(self.tmp_dir, 'outbox.jsonl'))
+        self.outbox.enqueue([{"text": f"ツイート{i}", "theme": "テーマ"} for i in range(3)])
+        self.server = FakeXServer().start()
+        self.send = lambda text: x_poster.send_tweet(text, url=self.server.url)
+        self.sleeps = []
+
+    def tearDown(self):
+        self.server.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def drain(self, **kwargs):
+        return self.outbox.drain(self.send, sleep=self.sleeps.append, **kwargs)
+
+    def test_enqueue_is_idempotent(self):
+        """同じ本文のツイートは二重にキューに積まれないこと"""
+        self.assertEqual(self.outbox.enqueue([{"text": "ツイート0"}, {"text": "新しいツイート"}]), 1)
+        self.assertEqual(len(Outbox(self.outbox.path).pending()), 4)
+
+    def test_drain_posts_in_order(self):
+        """指定件数だけ古い順に投稿され、残りはキューに残ること"""
+        self.assertEqual(self.drain(max_posts=2), 2)
+        self.assertEqual([r["text"] for r in self.server.received], ["ツイート0", "ツイート1"])
+        self.assertEqual([i["text"] for i in self.outbox.pending()], ["ツイート2"])
+        # 投稿済みのツイートを再度積んでも投稿されない
+        self.assertEqual(self.outbox.enqueue([{"text": "ツイート0"}]), 0)
+
+    def test_buffered_outbox_writes_on_flush(self):
+        """buffered の場合は、投稿・追加の結果を flush するまでファイルに書き出さないこと"""
+        box = Outbox(self.outbox.path, buffered=True)
+        self.assertEqual(box.drain(self.send, sleep=self.sleeps.append, max_posts=1), 1)
+        self.assertEqual(box.enqueue([{"text": "新しいツイート"}]), 1)
+        self.assertEqual(len(box.pending()), 3)
+        self.assertEqual(len(Outbox(self.outbox.path).pending()), 3)
+        self.assertTrue(box.flush())
+        self.assertFalse(box.flush())
+        self.assertEqual([i["text"] for i in Outbox(self.outbox.path).pending()],
+                         ["ツイート1", "ツイート2", "新しいツイート"])
+
+    def test_rate_limit_headers_space_out_posts(self):
+        """残り回数とリセット時刻に合わせて投稿間隔が空けられること"""
+        reset = str(int(time.time()) + 100)
+        self.server.responses = [(201, {"x-rate-limit-remaining": "4", "x-rate-limit-reset": reset})] * 3
+        self.assertEqual(self.drain(), 3)
+        self.assertEqual(len(self.sleeps), 2)
+        for slept in self.sleeps:
+            self.assertAlmostEqual(slept, 25, delta=2)
+
+    def test_429_keeps_item_for_next_run(self):
+        """429応答のツイートは破棄されず、リセット時刻以降に再試行されること"""
+        reset = int(time.time()) + 900
+        self.server.responses = [(429, {"x-rate-limit-remaining": "0", "x-rate-limit-reset": str(reset)})]
+        self.assertEqual(self.drain(), 0)
+        pending = self.outbox.pending()
+        self.assertEqual(len(pending), 3)
+        self.assertEqual(pending[0]["next_attempt_at"], reset)
+
+    def test_duplicate_is_treated_as_sent(self):
+        """中断後の再実行で重複と判定されたものは、投稿済みとして扱われること"""
+        items = self.outbox._load()
+        items[0]["status"] = "sending"
+        self.outbox._save(items)
+        self.server.responses = [(403, {}, "You are not allowed to create a Tweet with duplicate content.")]
+        self.assertEqual(self.drain(max_posts=1), 1)
+        first = [i for i in self.outbox._load() if i["text"] == "ツイート0"][0]
+        self.assertEqual(first["status"], "sent")
+        self.assertEqual(len(self.outbox.pending()), 1)
+
+    def test_server_error_backs_off(self):
+        """5xx応答では再試行回数を記録し、バックオフ後に再試行されること"""
+        self.server.responses = [(503, {})]
+        self.assertEqual(self.drain(max_posts=1), 1)
+        failed = [i for i in self.outbox._load() if i["text"] == "ツイート0"][0]
+        self.assertEqual(failed["status"], "pending")
+        self.assertEqual(failed["attempts"], 1)
+        self.assertIn("next_attempt_at", failed)
+
+
+class TestRateLimitScheduler(unittest.TestCase):
+
+    def test_state_persists(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp_dir, 'rate.json')
+            RateLimitScheduler(path).update({"x-rate-limit-remaining": "0", "x-rate-limit-reset": "2000"})
+            scheduler = RateLimitScheduler(path)
+            self.assertEqual(scheduler.delay(now=1900), 100)
+            self.assertEqual(scheduler.delay(now=2100), 0)
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_rate_limited_response_delays_drain(self):
+        """429応答のヘッダ（retry-after）から記録した時刻まで、同じ実行の投稿も待つこと"""
+        tmp_dir = tempfile.mkdtemp()
+        server = FakeXServer().start()
+        try:
+            path = os.path.join(tmp_dir, 'rate.json')
+            RateLimitScheduler(path).mark_rate_limited({"retry-after": "60"}, fallback=1)
+            box = Outbox(os.path.join(tmp_dir, 'outbox.jsonl'))
+            box.enqueue([{"text": "ツイート"}])
+            sleeps = []
+            send = lambda text: x_poster.send_tweet(text, url=server.url)
+            self.assertEqual(box.drain(send, RateLimitScheduler(path), sleep=sleeps.append), 1)
+            self.assertAlmostEqual(sleeps[0], 60, delta=2)
+            # リセットが遠い場合は待たずに次回の実行に回す
+            RateLimitScheduler(path).mark_rate_limited({"x-rate-limit-reset": str(int(time.time()) + 900)}, 1)
+            box.enqueue([{"text": "次のツイート"}])
+            self.assertEqual(box.drain(send, RateLimitScheduler(path), sleep=sleeps.append), 0)
+            self.assertEqual(len(server.received), 1)
+        finally:
+            server.stop()
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+# test/test_resilience.py
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+from google.genai import errors
+from src import resilience, llm_gateway, llm_cache
+
+
+def _server_error(code: int = 503, details: dict | None = None, headers: dict | None = None):
+    response = MagicMock(headers=headers or {})
+    return errors.ServerError(code, details or {"error": {"code": code, "status": "UNAVAILABLE"}}, response)
+
+
+class _Flaky:
+    """先頭から順に例外を送出し、尽きたら "ok" を返す関数"""
+
+    def __init__(self, *failures):
+        self.failures = list(failures)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.failures:
+            raise self.failures.pop(0)
+        return "ok"
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.waits = []
+        self.policy = resilience.RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=10.0, sleep=self.waits.append)
+
+    def test_transient_errors_are_retried_with_backoff(self):
+        func = _Flaky(_server_error(503), _server_error(500))
+        self.assertEqual(self.policy.call(func), "ok")
+        self.assertEqual(func.calls, 3)
+        self.assertEqual(len(self.waits), 2)
+        self.assertTrue(0 <= self.waits[0] <= 1.0 and 0 <= self.waits[1] <= 2.0)
+
+    def test_non_transient_errors_are_not_retried(self):
+        func = _Flaky(errors.ClientError(400, {"error": {"code": 400}}))
+        with self.assertRaises(errors.ClientError):
+            self.policy.call(func)
+        self.assertEqual(func.calls, 1)
+
+    def test_retry_after_is_respected(self):
+        """Retry-After ヘッダや RetryInfo の待機時間に従い、上限を超える指定なら待たずに失敗すること"""
+        rate_limited = errors.ClientError(429, {"error": {"code": 429, "details": [{"retryDelay": "4s"}]}})
+        self.assertEqual(self.policy.call(_Flaky(_server_error(503, headers={"Retry-After": "3"}), rate_limited)), "ok")
+        self.assertEqual(self.waits, [3.0, 4.0])
+        func = _Flaky(_server_error(503, headers={"retry-after": "120"}))
+        with self.assertRaises(errors.ServerError):
+            self.policy.call(func)
+        self.assertEqual(func.calls, 1)
+
+    def test_budget_limits_retries_across_calls(self):
+        self.policy.budget = resilience.RetryBudget(max_retries=1, max_wait=100)
+        self.assertEqual(self.policy.call(_Flaky(_server_error())), "ok")
+        func = _Flaky(_server_error())
+        with self.assertRaises(errors.ServerError):
+            self.policy.call(func)
+        self.assertEqual(func.calls, 1)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_path = os.path.join(self.tmp_dir, "circuit.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _policy(self):
+        breaker = resilience.CircuitBreaker("Gemini", self.state_path, failure_threshold=2, cooldown=60)
+        return resilience.RetryPolicy(max_attempts=2, base_delay=0, breaker=breaker, sleep=lambda s: None)
+
+    def test_opens_and_persists_across_runs(self):
+        """失敗が続くと開き、次の実行（新しいインスタンス）でも呼び出さずにすぐ失敗すること"""
+        policy = self._policy()
+        for _ in range(2):
+            with self.assertRaises(errors.ServerError):
+                policy.call(_Flaky(_server_error(), _server_error()))
+        func = _Flaky()
+        next_run = self._policy()
+        self.assertTrue(next_run.breaker.is_open())
+        with self.assertRaises(resilience.CircuitOpenError):
+            next_run.call(func)
+        self.assertEqual(func.calls, 0)
+
+    def test_half_open_trial_after_cooldown(self):
+        """cooldown が過ぎたら1回だけ試し、失敗すれば再試行せずに開き直し、成功すれば閉じること"""
+        policy = self._policy()
+        policy.breaker.record_failure(now=0)
+        policy.breaker.record_failure(now=0)
+        failing = _Flaky(_server_error(), _server_error())
+        with self.assertRaises(errors.ServerError):
+            policy.call(failing)
+        self.assertEqual(failing.calls, 1)
+        self.assertTrue(policy.breaker.is_open())
+        policy.breaker.state["opened_at"] = 0
+        self.assertEqual(policy.call(_Flaky()), "ok")
+        self.assertEqual(self._policy().breaker.state["state"], "closed")
+
+
+class TestGatewayResilience(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        llm_cache.set_cache(llm_cache.ResponseCache(self.tmp_dir))
+        self.client = MagicMock()
+        llm_gateway.set_client(self.client)
+        breaker = resilience.CircuitBreaker("Gemini", os.path.join(self.tmp_dir, "circuit.json"), failure_threshold=1)
+        llm_gateway.set_retry_policy(resilience.RetryPolicy(max_attempts=3, breaker=breaker, sleep=lambda s: None))
+
+    def tearDown(self):
+        llm_gateway.set_client(None)
+        llm_gateway.set_retry_policy(None)
+        llm_cache.set_cache(None)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_generate_retries_then_fails_fast(self):
+        """一時的なエラーは再試行し、不調と判断した後は呼び出さずに失敗すること"""
+        self.client.models.generate_content.side_effect = [_server_error(), MagicMock(text="応答")]
+        self.assertEqual(llm_gateway.generate("質問", model="m", call_site="research"), "応答")
+        self.client.models.generate_content.side_effect = _server_error()
+        with self.assertRaises(errors.ServerError):
+            llm_gateway.generate("質問", model="m", call_site="research")
+        self.assertEqual(self.client.models.generate_content.call_count, 5)
+        self.assertTrue(llm_gateway.circuit_open())
+        with self.assertRaises(resilience.CircuitOpenError):
+            llm_gateway.generate("質問", model="m", call_site="research")
+        self.assertEqual(self.client.models.generate_content.call_count, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+# test/test_sqlite_store.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src import sqlite_store
+
+
+class TestSQLiteKnowledgeStore(unittest.TestCase):
+
+    def setUp(self):
+        """既存形式のJSONファイル群を一時ディレクトリに用意する"""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.paths = {name: os.path.join(self.tmp_dir, name) for name in (
+            'all_knowledge_log.json', 'recent_knowledge.json', 'high_level_concepts.json', 'activity_clusters.json')}
+        entries = [
+            {"theme": f"テーマ{i % 2}", "tweet": f"ツイート{i}", "created_at": f"2025-08-0{i + 1}T00:00:00"}
+            for i in range(5)
+        ]
+        self._dump('all_knowledge_log.json', {"knowledge_entries": entries})
+        self._dump('recent_knowledge.json', {"knowledge_entries": entries[-2:]})
+        self._dump('high_level_concepts.json', {"concept_name": "概念", "summary": "要約"})
+        self._dump('activity_clusters.json', {"clusters": [{"cluster_id": 1, "theme": "テーマ0", "keywords": []}]})
+        self.store = sqlite_store.SQLiteKnowledgeStore(os.path.join(self.tmp_dir, 'knowledge.db'))
+        self.store.import_json(*self.paths.values())
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _dump(self, name, data):
+        with open(os.path.join(self.tmp_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+
+    def test_import(self):
+        """JSONファイル群が取り込まれ、短期記憶の件数が再現されること"""
+        self.assertEqual(self.store.count(), 5)
+        self.assertEqual(self.store.count_recent(), 2)
+        self.assertEqual(self.store.latest()["tweet"], "ツイート4")
+        self.assertEqual(self.store.latest_concept()["concept_name"], "概念")
+        self.assertEqual(len(self.store.current_clusters()["clusters"]), 1)
+        # 2回目の取り込みは行われない
+        self.assertEqual(self.store.import_json(*self.paths.values()), 0)
+
+    def test_indexed_queries(self):
+        """テーマ・期間による検索ができること"""
+        self.assertEqual(len(self.store.entries_by_theme("テーマ0")), 3)
+        between = self.store.entries_between("2025-08-02", "2025-08-04")
+        self.assertEqual([e["tweet"] for e in between], ["ツイート1", "ツイート2"])
+
+    def test_recent_window(self):
+        """追記で短期記憶が増え、reset_recent()で0件に戻ること"""
+        self.store.extend([{"theme": "新規", "tweet": "A"}, {"theme": "新規", "tweet": "B"}])
+        self.assertEqual(self.store.count_recent(), 4)
+        self.store.reset_recent()
+        self.assertEqual(self.store.count_recent(), 0)
+        self.assertEqual(self.store.count(), 7)
+
+    def test_export(self):
+        """ストアの内容が既存形式のJSONファイル群に書き出されること"""
+        self.store.append({"theme": "新規", "tweet": "C"})
+        self.store.replace_clusters({"clusters": [{"cluster_id": 1, "theme": "新"}, {"cluster_id": 2, "theme": "新2"}]})
+        self.store.export_json(*self.paths.values())
+        with open(self.paths['all_knowledge_log.json'], 'r', encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)["knowledge_entries"]), 6)
+        with open(self.paths['recent_knowledge.json'], 'r', encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)["knowledge_entries"]), 3)
+        with open(self.paths['activity_clusters.json'], 'r', encoding='utf-8') as f:
+            self.assertEqual(len(json.load(f)["clusters"]), 2)
+
+    def test_rebuild_from_exported_json(self):
+        """書き出したJSONファイル群から、テーマ選択の状態を含めてDBを作り直せること（DBはgitで管理しないため）"""
+        state_path = os.path.join(self.tmp_dir, 'topic_state.json')
+        self.store.update_theme_stats([{"theme": "テーマ0", "research_count": 3, "last_researched_at": "2025-08-05",
+                                        "reward_sum": 1.5, "reward_count": 2, "wrr_current": 0.5}])
+        self.store.record_posts([("100", "テーマ0", "2025-08-05T00:00:00"), ("101", "テーマ1", "2025-08-06T00:00:00")])
+        self.store.mark_rewarded(["100"])
+        self.store.export_json(*self.paths.values(), topic_state_path=state_path)
+
+        with sqlite_store.SQLiteKnowledgeStore(os.path.join(self.tmp_dir, 'rebuilt.db')) as rebuilt:
+            self.assertEqual(rebuilt.import_json(*self.paths.values(), topic_state_path=state_path), 5)
+            self.assertEqual(rebuilt.count_recent(), 2)
+            self.assertEqual(rebuilt.latest_concept()["concept_name"], "概念")
+            self.assertEqual(rebuilt.theme_stats("テーマ0")["reward_sum"], 1.5)
+            self.assertEqual(rebuilt.unrewarded_posts("2025-09-01"), [("101", "テーマ1")])
+
+
+if __name__ == '__main__':
+    unittest.main()
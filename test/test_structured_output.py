@@ -0,0 +1,76 @@
+# test/test_structured_output.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+from src import structured_output, llm_gateway, llm_cache
+
+CONCEPT = {"concept_name": "概念", "summary": "要約", "components": ["要素A"], "implication": "課題"}
+
+
+class TestParse(unittest.TestCase):
+
+    def test_fenced_json_with_prose(self):
+        """説明文やコードフェンスに囲まれたJSONを取り出すこと"""
+        text = "調査結果は以下の通りです[1]。\n```json\n{\"overview\": \"概要\", \"tweet\": \"ツイート}です\"}\n```\n以上です。"
+        self.assertEqual(structured_output.parse(text, "research")["tweet"], "ツイート}です")
+
+    def test_skips_values_that_do_not_match_schema(self):
+        """スキーマに合わないJSON（例示や部分的なオブジェクト）は読み飛ばすこと"""
+        text = '例: {"concept_name": "例"} 壊れた {"summary": ] 本番: ' + json.dumps(CONCEPT, ensure_ascii=False)
+        self.assertEqual(structured_output.parse(text, "structure"), CONCEPT)
+
+    def test_native_json(self):
+        self.assertEqual(structured_output.parse(json.dumps(CONCEPT), "concept_fold"), CONCEPT)
+
+    def test_parse_error(self):
+        with self.assertRaises(structured_output.ParseError):
+            structured_output.parse("JSONではない", "research")
+        with self.assertRaises(structured_output.ParseError):
+            structured_output.parse('{"clusters": [{"summary": "テーマがない"}]}', "cluster")
+
+    def test_native_config(self):
+        """ツールを使う呼び出しでは、JSON出力を指定しないこと"""
+        schema = structured_output.schema_for("structure")
+        self.assertEqual(structured_output.native_config(schema)["response_mime_type"], "application/json")
+        tools = {"tools": [{"google_search": {}}]}
+        self.assertEqual(structured_output.native_config(schema, tools), tools)
+
+
+class TestGenerateJson(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        llm_cache.set_cache(llm_cache.ResponseCache(self.tmp_dir))
+        self.client = MagicMock()
+        llm_gateway.set_client(self.client)
+
+    def tearDown(self):
+        llm_gateway.set_client(None)
+        llm_cache.set_cache(None)
+        shutil.rmtree(self.tmp_dir)
+
+    def test_repairs_invalid_output_without_caching_it(self):
+        """スキーマに合わない応答は整形だけを依頼し、元の応答はキャッシュしないこと"""
+        self.client.models.generate_content.side_effect = lambda model, contents, **kw: MagicMock(
+            text=json.dumps(CONCEPT) if "【JSONスキーマ】" in contents else "概念名は「概念」です。")
+        self.assertEqual(llm_gateway.generate_json("プロンプト", "model", call_site="structure"), CONCEPT)
+        calls = self.client.models.generate_content.call_args_list
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0].kwargs["config"]["response_mime_type"], "application/json")
+        # 整形後の応答はキャッシュされ、元の（読めなかった）応答はキャッシュされていない
+        llm_gateway.generate_json("プロンプト", "model", call_site="structure")
+        self.assertEqual(self.client.models.generate_content.call_count, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
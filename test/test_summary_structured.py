@@ -0,0 +1,84 @@
+# test/test_summary_structured.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+from src import concept_generator, llm_gateway, llm_cache
+
+CONCEPT = {"concept_name": "概念", "summary": "要約", "components": ["要素A"], "implication": "課題"}
+REPORT = "# 研究報告書：概念\n\n## 4. 結果 (Results)\n- **要素A**: 説明"
+
+
+class TestSummaryStructured(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        llm_cache.set_cache(llm_cache.ResponseCache(os.path.join(self.tmp_dir, 'cache')))
+        self.client = MagicMock()
+        llm_gateway.set_client(self.client)
+        self.summary_file = os.path.join(self.tmp_dir, "summary.md")
+        self.concept_file = os.path.join(self.tmp_dir, "concept.json")
+
+    def tearDown(self):
+        llm_gateway.set_client(None)
+        llm_cache.set_cache(None)
+        shutil.rmtree(self.tmp_dir)
+
+    def _respond(self, single_call_text: str):
+        """1回の呼び出しには single_call_text を、2回に分けた呼び出しにはそれぞれ正しい応答を返す"""
+        def generate_content(model, contents, config=None):
+            if "【出力形式】" in contents:
+                return MagicMock(text=single_call_text, usage_metadata=None)
+            if "【変換対象の研究報告書】" in contents:
+                return MagicMock(text=json.dumps(CONCEPT, ensure_ascii=False), usage_metadata=None)
+            return MagicMock(text=REPORT, usage_metadata=None)
+        self.client.models.generate_content.side_effect = generate_content
+
+    def _run(self):
+        return concept_generator.summarize_and_structure_to_file("テーマ: A\nツイート: B", self.summary_file,
+                                                                 self.concept_file)
+
+    def _calls(self) -> list[str]:
+        return [call.kwargs["contents"] for call in self.client.models.generate_content.call_args_list]
+
+    def test_single_call_writes_summary_and_concept(self):
+        """要約と概念データを1回の呼び出しで生成し、スキーマで出力を制約すること"""
+        self._respond(json.dumps({"report": REPORT, "concept": CONCEPT}, ensure_ascii=False))
+        self.assertEqual(self._run(), CONCEPT)
+        calls = self.client.models.generate_content.call_args_list
+        self.assertEqual(len(calls), 1)
+        self.assertIn("concept", calls[0].kwargs["config"]["response_schema"]["properties"])
+        with open(self.summary_file, encoding="utf-8") as f:
+            self.assertEqual(f.read(), REPORT)
+        with open(self.concept_file, encoding="utf-8") as f:
+            self.assertEqual(json.load(f), CONCEPT)
+
+    def test_invalid_concept_reuses_report(self):
+        """概念データが検証に通らない場合は、取り出せた要約を使ってJSON変換だけを行うこと"""
+        self._respond(json.dumps({"report": REPORT, "concept": {"concept_name": "概念"}}, ensure_ascii=False))
+        self.assertEqual(self._run(), CONCEPT)
+        calls = self._calls()
+        self.assertEqual(len(calls), 2)
+        self.assertIn(REPORT, calls[1])
+
+    def test_unparsable_response_falls_back_to_two_calls(self):
+        """応答が読めない場合は、要約 → JSON変換の2回の呼び出しに切り替え、読めない応答はキャッシュしないこと"""
+        self._respond("JSONではない応答")
+        self.assertEqual(self._run(), CONCEPT)
+        self.assertEqual(len(self._calls()), 3)
+        self._run()
+        # 2回に分けた呼び出しの結果はキャッシュから応答し、1回の呼び出しだけやり直す
+        self.assertEqual(len(self._calls()), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
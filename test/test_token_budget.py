@@ -0,0 +1,88 @@
+# test/test_token_budget.py
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from unittest.mock import MagicMock, patch
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+
+from src import token_budget, llm_gateway, llm_cache
+
+SMALL_BUDGETS = {
+    "trunc_head": {"max_prompt_tokens": 30, "policy": "truncate", "keep": "head"},
+    "trunc_tail": {"max_prompt_tokens": 30, "policy": "truncate", "keep": "tail"},
+    "chunked": {"max_prompt_tokens": 30, "policy": "chunk", "keep": "head"},
+}
+TEXT = "\n".join(f"行{i:02d}の本文です" for i in range(20))
+
+
+class TestTokenBudget(unittest.TestCase):
+
+    def test_estimate_tokens(self):
+        """英数字は約4文字で1トークン、日本語は1文字で1トークンとして概算すること"""
+        self.assertEqual(token_budget.estimate_tokens(""), 0)
+        self.assertEqual(token_budget.estimate_tokens("abcdefgh"), 2)
+        self.assertEqual(token_budget.estimate_tokens("日本語"), 3)
+
+    @patch.dict('src.token_budget.BUDGETS', SMALL_BUDGETS)
+    def test_truncate_keeps_head_or_tail(self):
+        """truncate方針では上限内に切り詰め、指定した側の行を残すこと"""
+        head = token_budget.fit_text(TEXT, "trunc_head", reserved_tokens=0)
+        tail = token_budget.fit_text(TEXT, "trunc_tail", reserved_tokens=0)
+        self.assertLessEqual(token_budget.estimate_tokens(head), 30)
+        self.assertTrue(head.startswith("行00"))
+        self.assertTrue(tail.endswith("行19の本文です"))
+
+    @patch.dict('src.token_budget.BUDGETS', SMALL_BUDGETS)
+    def test_chunk_covers_all_lines(self):
+        """chunk方針では各チャンクが上限内に収まり、全行がいずれかのチャンクに含まれること"""
+        chunks = token_budget.apply_budget(TEXT, "chunked", reserved_tokens=0)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(token_budget.estimate_tokens(c) <= 30 for c in chunks))
+        self.assertEqual("\n".join(chunks), TEXT)
+
+    def test_within_budget_is_unchanged(self):
+        self.assertEqual(token_budget.apply_budget("短い本文", "cluster"), ["短い本文"])
+
+
+class TestTokenMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        llm_cache.set_cache(llm_cache.ResponseCache(os.path.join(self.tmp_dir, 'cache')))
+
+    def tearDown(self):
+        llm_gateway.set_client(None)
+        llm_cache.set_cache(None)
+        shutil.rmtree(self.tmp_dir)
+
+    @patch('src.llm_gateway._call_stats', [])
+    def test_metrics_file(self):
+        """APIが返した実際のトークン数を集計し、実行ごとに1行追記すること"""
+        fake_client = MagicMock()
+        response = MagicMock(text="応答")
+        response.usage_metadata.prompt_token_count = 120
+        response.usage_metadata.candidates_token_count = 7
+        fake_client.models.generate_content.return_value = response
+        llm_gateway.set_client(fake_client)
+        llm_gateway.generate("プロンプト", model="m", call_site="cluster")
+        llm_gateway.generate("プロンプト", model="m", call_site="cluster")  # キャッシュ応答は合計に含めない
+
+        metrics_path = os.path.join(self.tmp_dir, 'metrics', 'token_usage.jsonl')
+        llm_gateway.write_token_metrics(metrics_path, run_name="test")
+        with open(metrics_path, encoding='utf-8') as f:
+            record = json.loads(f.readline())
+        self.assertEqual(record["run"], "test")
+        self.assertEqual(record["prompt_tokens"], 120)
+        self.assertEqual(record["response_tokens"], 7)
+        self.assertEqual(record["call_sites"]["cluster"]["calls"], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# test/test_topic_scheduler.py
+import os
+import sys
+import random
+import shutil
+import tempfile
+import unittest
+from collections import Counter
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src import topic_scheduler
+from src.sqlite_store import SQLiteKnowledgeStore
+
+CLUSTERS = [{"theme": "テーマA"}, {"theme": "テーマB"}, {"theme": "テーマC"}]
+
+
+class TestTopicScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db = SQLiteKnowledgeStore(os.path.join(self.tmp_dir, 'knowledge.db'))
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def _run(self, scheduler, clusters, n):
+        picks = []
+        for _ in range(n):
+            topic = scheduler.rank(clusters)[0]
+            scheduler.record(topic, clusters)
+            picks.append(topic["theme"])
+        return picks
+
+    def test_least_recent_covers_all_themes(self):
+        """最後の調査から最も時間が経ったテーマを選び、すべてのテーマを順に調査すること"""
+        self.db.extend([{"theme": "テーマA", "tweet": "t", "created_at": "2025-01-02T00:00:00"},
+                        {"theme": "テーマB", "tweet": "t", "created_at": "2025-01-01T00:00:00"}])
+        scheduler = topic_scheduler.get_scheduler("least_recent", self.db, random.Random(0))
+        # 未調査のC → 最も古いB → A の順
+        self.assertEqual(self._run(scheduler, CLUSTERS, 3), ["テーマC", "テーマB", "テーマA"])
+        self.assertEqual(self.db.theme_stats("テーマA")["research_count"], 2)
+
+    def test_weighted_round_robin(self):
+        """重みに比例した回数だけ、偏りなく選ぶこと"""
+        clusters = [{"theme": "テーマA", "weight": 2}, {"theme": "テーマB"}, {"theme": "テーマC"}]
+        scheduler = topic_scheduler.get_scheduler("round_robin", self.db, random.Random(0))
+        picks = self._run(scheduler, clusters, 8)
+        self.assertEqual(Counter(picks), {"テーマA": 4, "テーマB": 2, "テーマC": 2})
+        self.assertTrue(all(a != b for a, b in zip(picks, picks[1:]) if a != "テーマA"))
+
+    def test_bandit_prefers_engaging_theme(self):
+        """未試行のテーマを先に試し、その後は反応の良いテーマを多く選ぶこと"""
+        self.db.record_posts([("1", "テーマA", "2025-01-01T00:00:00"), ("2", "テーマB", "2025-01-01T00:00:00"),
+                              ("3", "テーマC", "2025-01-01T00:00:00")])
+        metrics = {"1": {"like_count": 50}, "2": {"like_count": 0}, "3": {"like_count": 1}}
+        collected = topic_scheduler.collect_engagement(self.db, lambda ids: metrics, "2025-02-01T00:00:00")
+        self.assertEqual(collected, 3)
+        self.assertEqual(self.db.unrewarded_posts("2025-02-01T00:00:00"), [])
+        scheduler = topic_scheduler.get_scheduler("bandit", self.db, random.Random(0))
+        self.assertEqual(scheduler.rank(CLUSTERS)[0]["theme"], "テーマA")
+        self.assertEqual(scheduler.rank(CLUSTERS + [{"theme": "新テーマ"}])[0]["theme"], "新テーマ")
+
+    def test_unknown_strategy(self):
+        with self.assertRaises(ValueError):
+            topic_scheduler.get_scheduler("unknown", self.db)
+
+    def test_scheduler_without_score_cannot_be_instantiated(self):
+        """_score を実装していないスケジューラは、使う前（生成時）にエラーになること"""
+        class NoScoreScheduler(topic_scheduler.TopicScheduler):
+            pass
+
+        with self.assertRaises(TypeError):
+            NoScoreScheduler(self.db)
+
+
+if __name__ == '__main__':
+    unittest.main()
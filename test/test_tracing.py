@@ -0,0 +1,81 @@
+# test/test_tracing.py
+import os
+import sys
+import json
+import asyncio
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+
+from src import tracing, async_pipeline, atomic_io
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.trace_path = os.path.join(self.temp_dir, "trace.jsonl")
+        tracing.start_run()
+
+    def tearDown(self):
+        tracing.start_run()
+        shutil.rmtree(self.temp_dir)
+
+    @patch('src.tracing.ENABLED', False)
+    def test_disabled_records_nothing(self):
+        """無効なときは何もしないスパンを返し、記録もファイルも残さないこと"""
+        with tracing.span("llm", call_site="summary") as s:
+            s.add("bytes", 10)
+        self.assertIs(s, tracing.current())
+        self.assertEqual(tracing.get_spans(), [])
+        self.assertIsNone(tracing.write_run(self.trace_path, "normal"))
+        self.assertFalse(os.path.exists(self.trace_path))
+
+    @patch('src.tracing.ENABLED', True)
+    def test_nested_spans_and_run_record(self):
+        """入れ子のスパン・失敗・数値の合計が、実行ごとに1行のJSONとして書き出されること"""
+        @tracing.traced("cycle")
+        def cycle():
+            with tracing.span("llm", call_site="research") as s:
+                s.set(prompt_tokens=100, response_tokens=20)
+                tracing.current().add("retries")
+            atomic_io.write_json(os.path.join(self.temp_dir, "out.json"), {"a": 1})
+            with self.assertRaises(ValueError), tracing.span("json_parse"):
+                raise ValueError("壊れたJSON")
+
+        cycle()
+        record = tracing.write_run(self.trace_path, "normal")
+        with open(self.trace_path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])["run"], "normal")
+        spans = {s["name"]: s for s in record["spans"]}
+        self.assertIsNone(spans["cycle"]["parent"])
+        self.assertEqual(spans["llm"]["parent"], spans["cycle"]["id"])
+        self.assertEqual(spans["store_write"]["attrs"]["bytes"], len('{\n  "a": 1\n}'))
+        self.assertEqual(spans["json_parse"]["error"], "ValueError")
+        self.assertFalse(spans["json_parse"]["ok"])
+        self.assertEqual(record["totals"]["llm"],
+                         {"count": 1, "seconds": spans["llm"]["seconds"], "retries": 1,
+                          "prompt_tokens": 100, "response_tokens": 20})
+
+    @patch('src.tracing.ENABLED', True)
+    def test_spans_follow_pipeline_stages(self):
+        """スレッドで実行されるステージの中のスパンが、そのステージのスパンの子になること"""
+        def load():
+            with tracing.span("docx_load"):
+                return "本文"
+
+        asyncio.run(async_pipeline.run_dag([async_pipeline.Stage("load", load)]))
+        spans = {s["name"]: s for s in tracing.get_spans()}
+        self.assertEqual(spans["stage"]["attrs"], {"stage": "load"})
+        self.assertEqual(spans["docx_load"]["parent"], spans["stage"]["id"])
+
+
+if __name__ == '__main__':
+    unittest.main()
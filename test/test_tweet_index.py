@@ -0,0 +1,86 @@
+# test/test_tweet_index.py
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+for key in ("GEMINI_API_KEY", "X_API_KEY", "X_API_SECRET", "X_ACCESS_TOKEN", "X_ACCESS_TOKEN_SECRET"):
+    os.environ.setdefault(key, "test")
+
+from src import tweet_index
+from src.sqlite_store import SQLiteKnowledgeStore
+
+TWEET_A = "デジタル自己成熟とは、デジタル社会で自律的に成長する力。自己認識、自己制御、適応力が重要です。"
+TWEET_A_NEAR = "デジタル自己成熟とは、デジタル社会で自律的に成長する力です。自己認識・自己制御・適応力が大切です。"
+TWEET_B = "オリヴァー・サックスは、テクノロジーと人間性の関係を深く考察しました。"
+
+
+class TestTweetIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.tmp_dir, 'tweet_index.npy')
+        self.db = SQLiteKnowledgeStore(os.path.join(self.tmp_dir, 'knowledge.db'))
+        self.db.extend([{"theme": "デジタル自己成熟", "tweet": TWEET_A}, {"theme": "人間性", "tweet": TWEET_B}])
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_near_duplicate_scores_high(self):
+        """言い回しだけが違うツイートは、別の話題のツイートより類似度が高いこと"""
+        index = tweet_index.TweetIndex(self.index_path)
+        index.sync(self.db)
+        score, similar = index.most_similar(TWEET_A_NEAR)
+        self.assertEqual(similar, TWEET_A)
+        self.assertGreater(score, 0.7)
+        self.assertLess(index.most_similar("今日は晴れて気持ちの良い一日でした。")[0], 0.3)
+
+    def test_incremental_sync_and_reload(self):
+        """保存したインデックスを読み込み直し、新しいエントリだけを追加すること"""
+        self.assertEqual(tweet_index.TweetIndex(self.index_path).sync(self.db), 2)
+        self.db.append({"theme": "人間性", "tweet": "新しいツイートです。"})
+        index = tweet_index.TweetIndex(self.index_path)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.sync(self.db), 1)
+        self.assertEqual(tweet_index.TweetIndex(self.index_path).matrix.shape, (3, tweet_index.DIM))
+
+    def test_recent_theme_count(self):
+        index = tweet_index.TweetIndex(self.index_path)
+        index.sync(self.db)
+        self.assertEqual(index.recent_theme_count("デジタル自己成熟", window=2), 1)
+        self.assertEqual(index.recent_theme_count("デジタル自己成熟", window=1), 0)
+
+
+class TestDuplicateRegeneration(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.index = tweet_index.TweetIndex(os.path.join(self.tmp_dir, 'tweet_index.npy'))
+        self.index.add([(1, "デジタル自己成熟", TWEET_A)])
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_regenerates_then_skips(self):
+        """重複したツイートは過去のツイートを避けるよう作り直し、それでも重複なら投稿しないこと"""
+        from src import main as bot_main
+        with patch('src.research_topic.research_and_summarize_with_gemini',
+                   return_value='{"tweet": "%s"}' % TWEET_A_NEAR) as mock_research:
+            self.assertEqual(bot_main.research_unique_tweet({"theme": "デジタル自己成熟"}, self.index), "")
+        self.assertEqual(mock_research.call_count, bot_main.MAX_TWEET_REGENERATIONS + 1)
+        self.assertEqual(mock_research.call_args.kwargs["avoid_texts"], [TWEET_A])
+
+    def test_unique_tweet_is_returned(self):
+        from src import main as bot_main
+        with patch('src.research_topic.research_and_summarize_with_gemini', return_value='{"tweet": "%s"}' % TWEET_B):
+            self.assertEqual(bot_main.research_unique_tweet({"theme": "人間性"}, self.index), TWEET_B)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+# test/test_x_poster_session.py
+import os
+import sys
+import unittest
+
+# プロジェクトのルートディレクトリをシステムパスに追加
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(project_root)
+for key in ("GEMINI_API_KEY", "X_API_KEY", "X_API_SECRET", "X_ACCESS_TOKEN", "X_ACCESS_TOKEN_SECRET"):
+    os.environ.setdefault(key, "test-key")
+
+from src.x_poster import XPoster
+from test.fakes import FakeXServer
+
+
+class TestXPoster(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeXServer().start()
+        self.poster = XPoster(url=self.server.url)
+
+    def tearDown(self):
+        self.poster.close()
+        self.server.stop()
+
+    def test_connection_is_reused(self):
+        """複数の投稿で同じ接続が再利用されること"""
+        self.assertEqual(self.poster.post_many(["投稿1", "投稿2", "投稿3"]), 3)
+        stats = self.poster.stats()
+        self.assertEqual(stats["requests"], 3)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["connections_reused"], 2)
+        self.assertGreater(stats["avg_latency_seconds"], 0)
+
+    def test_post_thread(self):
+        """スレッドの2件目以降は直前のツイートへの返信として投稿されること"""
+        self.assertEqual(self.poster.post_thread(["1/2", "2/2"]), ["1", "2"])
+        self.assertNotIn("reply", self.server.received[0])
+        self.assertEqual(self.server.received[1]["reply"], {"in_reply_to_tweet_id": "1"})
+
+    def test_thread_stops_on_failure(self):
+        self.server.responses = [(201, {}), (429, {})]
+        self.assertEqual(self.poster.post_thread(["1/3", "2/3", "3/3"]), ["1"])
+        self.assertEqual(len(self.server.received), 2)
+
+    def test_publish_classifies_failures(self):
+        """レート制限・サーバーエラーは再試行対象、重複（403）や認証エラーは再試行対象外とし、ヘッダを返すこと"""
+        self.server.responses = [(429, {"x-rate-limit-reset": "2000", "x-rate-limit-remaining": "0"}),
+                                 (503, {}), (403, {}, "duplicate content"), (401, {})]
+        rate_limited = self.poster.publish("1")
+        self.assertFalse(rate_limited.ok)
+        self.assertTrue(rate_limited.retryable)
+        self.assertEqual(rate_limited.headers["x-rate-limit-reset"], "2000")
+        self.assertTrue(self.poster.publish("2").retryable)
+        self.assertFalse(self.poster.publish("3").retryable)
+        self.assertFalse(self.poster.publish("4").retryable)
+        self.assertEqual(self.poster.publish("5").tweet_id, "5")
+
+
+if __name__ == '__main__':
+    unittest.main()